@@ -33,6 +33,7 @@ Module.register("MMM-PictureVerse", {
     this.cameraImages = [];
     this.cameraIndex = 0;
     this.motionVideos = [];
+    this.motionPosters = {};
     this.videoIndex = 0;
     this.loaded = false;
     this.showingMotion = false;
@@ -268,6 +269,7 @@ Module.register("MMM-PictureVerse", {
       // Store motion videos and images if available
       if (payload.videos && payload.videos.length > 0) {
         this.motionVideos = payload.videos.filter(v => v.endsWith(".mp4"));
+        this.motionPosters = payload.posters || {};
         console.log(`Received ${this.motionVideos.length} motion videos`);
         
         // Update images too if available
@@ -438,6 +440,102 @@ Module.register("MMM-PictureVerse", {
       this.checkAllLoaded();
       this.updateDom();
     }
+
+    if (notification === "FAMILY_IMAGES_DELTA") {
+      console.log(`Received family image changes: ${payload.added.length} added, ${payload.removed.length} removed, ${payload.changed.length} changed${payload.newUpload ? " with new upload" : ""}`);
+      this.applyFamilyDelta(payload);
+      this.checkAllLoaded();
+    }
+  },
+  /**
+   * Apply FAMILY_IMAGES_DELTA from node_helper.js to the slideshow in place:
+   * the random order keeps its place in the current cycle instead of being
+   * reshuffled, and the DOM is only redrawn if the photo on screen changed.
+   * @param {Object} delta - { added (newest first), removed, changed: [{from, to}], newUpload }
+   */
+  applyFamilyDelta(delta) {
+    const onScreen = this.familyImages[this.familyIndex];
+    let redraw = false;
+
+    // A new rendition or a modified photo keeps its slot under its new path
+    if (delta.changed.length > 0) {
+      const slots = new Map(this.familyImages.map((image, i) => [image, i]));
+      delta.changed.forEach(({ from, to }) => {
+        if (!slots.has(from)) return;
+        this.familyImages[slots.get(from)] = to;
+        redraw = redraw || from === onScreen;
+      });
+    }
+
+    if (delta.removed.length > 0) {
+      const gone = new Set(delta.removed);
+      const remap = [];  // Old index -> new index, or -1 if removed
+      const kept = [];
+      let keptBefore = 0;
+      this.familyImages.forEach((image, i) => {
+        remap.push(gone.has(image) ? -1 : kept.length);
+        if (gone.has(image)) return;
+        if (i < this.familyIndex) keptBefore++;
+        kept.push(image);
+      });
+      this.familyImages = kept;
+
+      if (this.familyRandomOrder) {
+        // Drop removed photos from the cycle; if the current one went, the
+        // next timer tick moves on to the photo after it
+        const order = [];
+        let position = -1;
+        this.familyRandomOrder.forEach((index, p) => {
+          if (remap[index] === -1) return;
+          if (p <= this.familyRandomIndex) position = order.length;
+          order.push(remap[index]);
+        });
+        this.familyRandomOrder = order;
+        this.familyRandomIndex = position;
+      }
+
+      if (remap[this.familyIndex] !== -1 && remap[this.familyIndex] !== undefined) {
+        this.familyIndex = remap[this.familyIndex];
+      } else {
+        this.familyIndex = Math.max(0, keptBefore - 1);
+        redraw = redraw || gone.has(onScreen);
+      }
+    }
+
+    if (delta.added.length > 0) {
+      // New photos go first (newest first) and are fitted into what is left
+      // of the current cycle at random positions
+      const count = delta.added.length;
+      this.familyImages = delta.added.concat(this.familyImages);
+      this.familyIndex = Math.min(this.familyIndex + count, this.familyImages.length - 1);
+
+      if (this.familyRandomOrder) {
+        this.familyRandomOrder = this.familyRandomOrder.map(index => index + count);
+        for (let i = 0; i < count; i++) {
+          const start = Math.min(this.familyRandomIndex + 1, this.familyRandomOrder.length);
+          const at = start + Math.floor(Math.random() * (this.familyRandomOrder.length - start + 1));
+          this.familyRandomOrder.splice(at, 0, i);
+        }
+      }
+    }
+
+    if (this.familyImages.length === 0) {
+      this.familyIndex = 0;
+    }
+
+    // Show newly uploaded photos immediately
+    if (delta.newUpload && this.familyImages.length > 0 && this.lastShownNewest !== this.familyImages[0]) {
+      console.log("NEW UPLOAD DETECTED - Showing immediately!");
+      this.lastShownNewest = this.familyImages[0];
+      this.familyIndex = 0;
+
+      this.clearTimers();
+      this.currentDisplay = "family";
+      this.updateDom();
+      this.startFamilyTimer();
+    } else if (redraw && this.currentDisplay === "family") {
+      this.updateDom();
+    }
   },
   /**
    * Create a perfectly shuffled array using Fisher-Yates algorithm
@@ -670,6 +768,12 @@ Module.register("MMM-PictureVerse", {
           video.playsInline = true;
           video.preload = "auto";
           video.className = "blessed-image visible";
+
+          // Show the clip's first frame while it loads
+          const poster = this.motionPosters && this.motionPosters[currentVideoPath];
+          if (poster) {
+            video.poster = poster;
+          }
           
           // Store reference for event handlers
           const self = this;
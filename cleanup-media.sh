@@ -60,7 +60,7 @@ echo "Running CleanUpMedia.py (images + videos)..." >> "$LOG_FILE"
 
 if [ -f "${PYTHON_DIR}/CleanUpMedia.py" ]; then
     chmod +x "${PYTHON_DIR}/CleanUpMedia.py"
-    $PYTHON "${PYTHON_DIR}/CleanUpMedia.py" >> "$LOG_FILE" 2>&1
+    $PYTHON "${PYTHON_DIR}/CleanUpMedia.py" "$@" >> "$LOG_FILE" 2>&1
     
     EXIT_CODE=$?
     if [ $EXIT_CODE -eq 0 ]; then
@@ -1,48 +1,75 @@
 const NodeHelper = require("node_helper");
 const fs = require("fs");
+const net = require("net");
 const path = require("path");
-const { exec } = require("child_process");
+const readline = require("readline");
+const { exec, spawn } = require("child_process");
 const chokidar = require("chokidar"); // For watching file system changes
 
+// Metrics files not rewritten for this long belong to a process that has
+// stopped (python/metrics.py writes every EXPORT_INTERVAL = 15 seconds)
+const METRICS_MAX_AGE = 60 * 1000;
+
 module.exports = NodeHelper.create({
   start() {
     console.log("MMM-PictureVerse helper started");
 
     this.knownFiles = new Set();
     this.isInitialScan = true;
+    this.familyPaths = null; // filename -> served path, as last sent to the frontend
+    this.blinkMedia = null; // { images: camera -> newest snapshot, videos: newest first }
 
     this.setupWatchers();
 
-    // Set up the motion detection monitor
-    this.startBlinkMonitor();
-
-    // Set up periodic Dropbox sync (every 1 minute)
-    this.dropboxInterval = setInterval(() => {
-      this.syncDropbox((newFilesDownloaded) => {
-        this.loadFamilyImages(newFilesDownloaded);
-      });
-    }, 1 * 60 * 1000); // 1 minute
-    
-    // Set up hourly cleanup of Blink images
-    this.cleanupInterval = setInterval(() => {
-      this.cleanupBlinkImages();
-    }, 60 * 60 * 1000); // Run every hour
-    
-    // Run initial cleanup
-    this.cleanupBlinkImages();
+    // Python announces Blink media as it is saved (see python/media_events.py)
+    this.startMediaEventServer();
+
+    // The motion monitor, Dropbox sync and media cleanup run together in
+    // python/PictureVerseService.py; fall back to separate processes if it
+    // can't be started
+    this.serviceRestartDelay = 30 * 1000;
+    this.dropboxDaemonRestartDelay = 30 * 1000;
+    this.cleanupWatcherRestartDelay = 30 * 1000;
+    if (!this.startService()) {
+      this.startSeparateProcesses();
+    }
 
     // Set up the remote reboot/update page
     this.setupRemote();
   },
 
   stop() {
+    this.stopping = true;
+
+    if (this.serviceRestartTimer) {
+      clearTimeout(this.serviceRestartTimer);
+    }
+    if (this.service) {
+      this.service.kill();
+    }
+
     // Clear all intervals when module stops
     if (this.dropboxInterval) {
       clearInterval(this.dropboxInterval);
     }
+    if (this.dropboxDaemonRestartTimer) {
+      clearTimeout(this.dropboxDaemonRestartTimer);
+    }
+    if (this.dropboxDaemon) {
+      this.dropboxDaemon.kill();
+    }
     if (this.cleanupInterval) {
       clearInterval(this.cleanupInterval);
     }
+    if (this.cleanupWatcherRestartTimer) {
+      clearTimeout(this.cleanupWatcherRestartTimer);
+    }
+    if (this.cleanupWatcher) {
+      this.cleanupWatcher.kill();
+    }
+    if (this.mediaEventServer) {
+      this.mediaEventServer.close();
+    }
     
     // Stop the Blink monitor
     this.stopBlinkMonitor();
@@ -116,6 +143,65 @@ module.exports = NodeHelper.create({
         }
       });
     });
+
+    // Metrics for Prometheus, written by the Python processes (see python/metrics.py)
+    this.expressApp.get("/pictureverse/metrics", (req, res) => {
+      if (!checkToken(req)) {
+        res.status(403).send("Forbidden");
+        return;
+      }
+      res.set("Content-Type", "text/plain; version=0.0.4; charset=utf-8");
+      res.send(this.readMetrics());
+    });
+  },
+
+  /**
+   * Merge the python/metrics/*.prom files into one exposition. A family can
+   * appear in several files (one per process); its HELP/TYPE lines are kept
+   * once and its samples, which carry a process label, are put together.
+   * Files older than METRICS_MAX_AGE are left out.
+   * @returns {string} Metrics in the Prometheus text format
+   */
+  readMetrics() {
+    const dir = path.join(__dirname, "python", "metrics");
+    const families = new Map(); // name -> { header: [lines], samples: [lines] }
+    let files = [];
+    try {
+      files = fs.readdirSync(dir).filter((f) => f.endsWith(".prom")).sort();
+    } catch (e) {
+      return "";
+    }
+
+    for (const file of files) {
+      const filePath = path.join(dir, file);
+      let text;
+      try {
+        if (Date.now() - fs.statSync(filePath).mtimeMs > METRICS_MAX_AGE) continue;
+        text = fs.readFileSync(filePath, "utf8");
+      } catch (e) {
+        continue;
+      }
+      let family = null;
+      for (const line of text.split("\n")) {
+        if (!line.trim()) continue;
+        const header = line.match(/^# (HELP|TYPE) (\S+)/);
+        if (header) {
+          if (!families.has(header[2])) families.set(header[2], { header: [], samples: [] });
+          family = families.get(header[2]);
+          if (family.header.length < 2 && !family.header.some((h) => h.startsWith(`# ${header[1]} `))) {
+            family.header.push(line);
+          }
+        } else if (family && !line.startsWith("#")) {
+          family.samples.push(line);
+        }
+      }
+    }
+
+    const lines = [];
+    for (const { header, samples } of families.values()) {
+      lines.push(...header, ...samples);
+    }
+    return lines.length ? lines.join("\n") + "\n" : "";
   },
 
   renderRemotePage(token) {
@@ -156,6 +242,130 @@ module.exports = NodeHelper.create({
 </html>`;
   },
 
+  /**
+   * Start python/PictureVerseService.py, which runs the Blink motion monitor,
+   * the Dropbox sync daemon and the media cleanup in one process and takes
+   * commands on its control socket (see sendServiceCommand). Its stdout
+   * carries the Dropbox daemon's JSON event lines. Restarted with a growing
+   * delay if it exits.
+   * @returns {boolean} Whether the service was started
+   */
+  startService() {
+    const script = path.join(__dirname, "python", "PictureVerseService.py");
+    const pythonExec = path.join(__dirname, "python", "venv", "bin", "python");
+
+    if (!fs.existsSync(script) || !fs.existsSync(pythonExec)) {
+      console.error("PictureVerseService.py or the Python venv not found, service not started");
+      return false;
+    }
+
+    console.log("Starting PictureVerse service...");
+    this.service = spawn(pythonExec, ["-u", script], { cwd: __dirname });
+    this.serviceStartedAt = Date.now();
+
+    readline.createInterface({ input: this.service.stdout })
+      .on("line", (line) => this.handleServiceLine(line));
+
+    this.service.stderr.on("data", (data) => {
+      console.error(`[PictureVerse service] ${data.toString().trim()}`);
+    });
+
+    this.service.on("error", (error) => {
+      console.error(`Error starting PictureVerse service: ${error}`);
+    });
+
+    this.service.on("exit", (code, signal) => {
+      this.service = null;
+      if (this.stopping) return;
+
+      // A service that ran for a while starts over with the shortest delay
+      if (Date.now() - this.serviceStartedAt > 10 * 60 * 1000) {
+        this.serviceRestartDelay = 30 * 1000;
+      }
+      const delay = this.serviceRestartDelay;
+      console.error(`PictureVerse service exited (code ${code}, signal ${signal}), restarting in ${delay / 1000}s`);
+      this.serviceRestartTimer = setTimeout(() => this.startService(), delay);
+      this.serviceRestartDelay = Math.min(delay * 2, 10 * 60 * 1000);
+    });
+
+    return true;
+  },
+
+  /**
+   * One line of service output: Dropbox event lines are handled as from the
+   * Dropbox daemon, everything else is passed through to the log
+   */
+  handleServiceLine(line) {
+    if (line.startsWith('{"event"')) {
+      this.handleDropboxDaemonLine(line);
+    } else if (line.trim()) {
+      console.log(`[PictureVerse service] ${line}`);
+    }
+  },
+
+  /**
+   * Send one command to the control socket of the service (or a standalone
+   * BlinkMonitor.py) and pass its JSON answer to callback(error, response)
+   * @param {Object} command - e.g. { command: "capture" }
+   * @param {number} timeout - Milliseconds to wait for the answer
+   */
+  sendServiceCommand(command, timeout, callback) {
+    const socketPath = path.join(__dirname, "python", ".blink_monitor.sock");
+    const connection = net.createConnection(socketPath);
+    let buffer = "";
+    let done = false;
+
+    const finish = (error, response) => {
+      if (done) return;
+      done = true;
+      connection.destroy();
+      callback(error, response);
+    };
+
+    connection.setTimeout(timeout, () => finish(new Error(`no answer to ${command.command} within ${timeout / 1000}s`)));
+    connection.on("connect", () => connection.write(JSON.stringify(command) + "\n"));
+    connection.on("data", (data) => {
+      buffer += data.toString();
+      const end = buffer.indexOf("\n");
+      if (end === -1) return;
+      try {
+        finish(null, JSON.parse(buffer.slice(0, end)));
+      } catch (e) {
+        finish(e);
+      }
+    });
+    connection.on("error", (error) => finish(error));
+    connection.on("end", () => finish(new Error("control socket closed without an answer")));
+  },
+
+  /**
+   * Without the service: the motion monitor via run-monitor.sh, the Dropbox
+   * daemon and the cleanup watcher as their own processes
+   */
+  startSeparateProcesses() {
+    // Set up the motion detection monitor
+    this.startBlinkMonitor();
+
+    // Keep Dropbox in sync with a long-running Dropbox.py --daemon; fall back
+    // to running a one-off sync every minute if it can't be started
+    if (!this.startDropboxDaemon()) {
+      this.dropboxInterval = setInterval(() => {
+        this.syncDropbox((newFilesDownloaded) => {
+          this.loadFamilyImages(newFilesDownloaded);
+        });
+      }, 1 * 60 * 1000); // 1 minute
+    }
+
+    // Blink media retention runs in python/CleanUpMedia.py --watch, which
+    // cleans up as files arrive or the disk fills; fall back to an hourly
+    // one-off run if it can't be started
+    if (!this.startCleanupWatcher()) {
+      this.cleanupInterval = setInterval(() => {
+        this.requestCleanup();
+      }, 60 * 60 * 1000); // Run every hour
+    }
+  },
+
   startBlinkMonitor() {
     // Path to the run script
     const runScript = path.join(__dirname, "run-monitor.sh");
@@ -208,6 +418,93 @@ module.exports = NodeHelper.create({
     });
   },
 
+  /**
+   * Start python/Dropbox.py in daemon mode. It keeps one Dropbox connection
+   * open, waits on Dropbox's longpoll endpoint for changes and prints a
+   * {"event": "sync", ...} JSON line after every sync. Restarted with a
+   * growing delay if it exits.
+   * @returns {boolean} Whether the daemon was started
+   */
+  startDropboxDaemon() {
+    const script = path.join(__dirname, "python", "Dropbox.py");
+    const pythonExec = path.join(__dirname, "python", "venv", "bin", "python");
+
+    if (!fs.existsSync(script) || !fs.existsSync(pythonExec)) {
+      console.error("Dropbox.py or the Python venv not found, Dropbox daemon not started");
+      return false;
+    }
+
+    console.log("Starting Dropbox sync daemon...");
+    this.dropboxDaemon = spawn(pythonExec, ["-u", script, "--daemon"], { cwd: __dirname });
+
+    readline.createInterface({ input: this.dropboxDaemon.stdout })
+      .on("line", (line) => this.handleDropboxDaemonLine(line));
+
+    this.dropboxDaemon.stderr.on("data", (data) => {
+      console.error(`[Dropbox daemon] ${data.toString().trim()}`);
+    });
+
+    this.dropboxDaemon.on("error", (error) => {
+      console.error(`Error starting Dropbox daemon: ${error}`);
+    });
+
+    this.dropboxDaemon.on("exit", (code, signal) => {
+      this.dropboxDaemon = null;
+      if (this.stopping) return;
+
+      const delay = this.dropboxDaemonRestartDelay;
+      console.error(`Dropbox daemon exited (code ${code}, signal ${signal}), restarting in ${delay / 1000}s`);
+      this.dropboxDaemonRestartTimer = setTimeout(() => this.startDropboxDaemon(), delay);
+      this.dropboxDaemonRestartDelay = Math.min(delay * 2, 10 * 60 * 1000);
+    });
+
+    return true;
+  },
+
+  /**
+   * Handle one line of Dropbox daemon output: JSON event lines drive
+   * image reloads, everything else is passed through to the log
+   */
+  handleDropboxDaemonLine(line) {
+    if (!line.startsWith('{"event"')) {
+      if (line.trim()) console.log(`[Dropbox daemon] ${line}`);
+      return;
+    }
+
+    let event;
+    try {
+      event = JSON.parse(line);
+    } catch (e) {
+      console.error(`Invalid Dropbox daemon event: ${line}`);
+      return;
+    }
+
+    if (event.event === "sync") {
+      if (!event.ok) {
+        console.error("Dropbox daemon sync failed");
+        return;
+      }
+
+      // A successful sync means the daemon is healthy again
+      this.dropboxDaemonRestartDelay = 30 * 1000;
+
+      const added = event.added || [];
+      const modified = event.modified || [];
+      const removed = event.removed || [];
+      if (added.length + modified.length + removed.length > 0) {
+        console.log(`Dropbox sync: ${added.length} added, ${modified.length} modified, ${removed.length} removed`);
+      }
+      // Renditions made or evicted for unchanged photos change their path too
+      this.applyFamilyChanges({
+        added,
+        removed,
+        changed: modified.concat(event.restyled || [])
+      }, added.length > 0);
+    } else if (event.event === "error") {
+      console.error(`Dropbox daemon error: ${event.message}`);
+    }
+  },
+
   setupWatchers() {
     // Set up a watcher for the motion detection folder
     const mediaPath = path.join(__dirname, "python", "media");
@@ -221,6 +518,10 @@ module.exports = NodeHelper.create({
     this.watcher = chokidar.watch(mediaPath, {
       persistent: true,
       ignoreInitial: true,
+      // Clips being downloaded or processed have hidden names, and display
+      // copies in media/display/ are announced with their original
+      ignored: (filePath) => path.basename(filePath).startsWith("."),
+      depth: 0,
       awaitWriteFinish: {
         stabilityThreshold: 2000,
         pollInterval: 100
@@ -228,9 +529,19 @@ module.exports = NodeHelper.create({
     });
     
     this.watcher.on("add", (filePath) => {
+      if (this.isMediaFile(filePath)) {
+        this.recordLatencyEvent(filePath, "watcher_add");
+      }
       if (filePath.endsWith(".mp4")) {
+        const filename = path.basename(filePath);
+        // Clips announced over the media event socket have been sent already
+        if (this.blinkMedia && this.blinkMedia.videos.includes(filename)) return;
+
         console.log("Motion clip detected:", filePath);
-        this.notifyMotionDetection();
+        this.notifyMotionDetection(filePath);
+        if (this.blinkMedia) {
+          this.blinkMedia.videos = this.sortNewestFirst([filename, ...this.blinkMedia.videos]).slice(0, 50);
+        }
       }
     });
     
@@ -243,9 +554,11 @@ module.exports = NodeHelper.create({
     }
     
     // Watch for changes in the Pictures directory
+    // (Dropbox.py streams downloads to *.part files and renames them when done)
     this.picturesWatcher = chokidar.watch(picturesPath, {
       persistent: true,
       ignoreInitial: true,
+      ignored: /\.part$/,
       awaitWriteFinish: {
         stabilityThreshold: 2000,
         pollInterval: 100
@@ -267,10 +580,10 @@ module.exports = NodeHelper.create({
       if (!this.knownFiles.has(filename) && this.isImageFile(filename)) {
         console.log(`NEW upload detected: ${filename}`);
         this.knownFiles.add(filename);
-        this.loadFamilyImages(true);  // TRUE = new upload
+        this.applyFamilyChanges({ added: [filename] }, true);  // TRUE = new upload
       } else {
         console.log(`Known file re-detected: ${filename}`);
-        this.loadFamilyImages(false);  // FALSE = just refresh
+        this.applyFamilyChanges({ changed: [filename] }, false);  // FALSE = just refresh
       }
     });
 
@@ -279,7 +592,7 @@ module.exports = NodeHelper.create({
       const filename = path.basename(filePath);
       console.log(`File removed from Pictures: ${filename}`);
       this.knownFiles.delete(filename);
-      this.loadFamilyImages(false);  // Not a new upload, just refresh
+      this.applyFamilyChanges({ removed: [filename] }, false);  // Not a new upload, just refresh
     });
   },
   
@@ -307,118 +620,88 @@ module.exports = NodeHelper.create({
   },
   
   /**
-   * Helper function to check if file is a video
+   * Helper function to check if file is a video. Hidden ".Camera_...mp4"
+   * files are clips python/clip_processing.py is still working on
    */
   isVideoFile(filename) {
-    return filename.toLowerCase().endsWith(".mp4");
+    return !filename.startsWith(".") && filename.toLowerCase().endsWith(".mp4");
   },
   
   /**
-   * Cleans up Blink camera images, retaining only one image per camera per hour
-   * This helps prevent accumulation of too many files while keeping the latest snapshot for each hour
+   * Start python/CleanUpMedia.py --watch, the only thing that deletes Blink
+   * media. It applies the retention policy when new files land in media/ or
+   * free space runs low, instead of on a timer. Restarted with a growing
+   * delay if it exits.
+   * @returns {boolean} Whether the watcher was started
    */
-  cleanupBlinkImages() {
-    const mediaPath = path.join(__dirname, "python", "media");
-    const RETAIN_HOURS = 2; // keep last 2 hour-buckets per camera
+  startCleanupWatcher() {
+    const script = path.join(__dirname, "python", "CleanUpMedia.py");
+    const pythonExec = path.join(__dirname, "python", "venv", "bin", "python");
 
-    if (!fs.existsSync(mediaPath)) {
-      console.log("Media directory not found, nothing to clean up");
-      return;
+    if (!fs.existsSync(script) || !fs.existsSync(pythonExec)) {
+      console.error("CleanUpMedia.py or the Python venv not found, media cleanup watcher not started");
+      return false;
     }
 
-    const files = fs.readdirSync(mediaPath).filter(f => this.isMediaFile(f));
+    console.log("Starting media cleanup watcher...");
+    this.cleanupWatcher = spawn(pythonExec, ["-u", script, "--watch"], { cwd: __dirname });
 
-    if (files.length === 0) {
-      console.log("No media files found to clean up");
-      return;
-    }
+    this.cleanupWatcher.stdout.on("data", (data) => {
+      console.log(`[Media cleanup] ${data.toString().trim()}`);
+    });
 
-    // Parse: CameraName_YYYYMMDD_HHMMSS.jpg/jpeg/mp4 → groups by (camera, hour)
-    const rx = /^(.+?)_(\d{8})_(\d{2})(\d{4})\.(jpg|jpeg|mp4)$/i;
-    const byHour = {}; // key: `${camera}_${YYYYMMDD}_${HH}` → files[]
+    this.cleanupWatcher.stderr.on("data", (data) => {
+      console.error(`[Media cleanup] ${data.toString().trim()}`);
+    });
 
-    for (const filename of files) {
-      const m = filename.match(rx);
-      if (!m) {
-        console.log(`File ${filename} doesn't match expected format, skipping`);
-        continue;
-      }
-      const camera = m[1];
-      const yyyymmdd = m[2];
-      const HH = m[3];
-      const mmss = m[4]; // MMSS
-      const ts = `${yyyymmdd}_${HH}${mmss}`; // YYYYMMDD_HHMMSS (as string; lexicographic works)
-      const key = `${camera}_${yyyymmdd}_${HH}`;
-
-      if (!byHour[key]) byHour[key] = [];
-      byHour[key].push({
-        filename,
-        fullPath: path.join(mediaPath, filename),
-        ts
-      });
-    }
+    this.cleanupWatcher.on("error", (error) => {
+      console.error(`Error starting media cleanup watcher: ${error}`);
+    });
 
-    let deleted = 0;
-    let kept = 0;
+    this.cleanupWatcher.on("exit", (code, signal) => {
+      this.cleanupWatcher = null;
+      if (this.stopping) return;
 
-    // 1) Dedup within each hour-bucket: keep newest ts
-    for (const key of Object.keys(byHour)) {
-      const bucketFiles = byHour[key];
-      if (bucketFiles.length <= 1) { kept++; continue; }
+      const delay = this.cleanupWatcherRestartDelay;
+      console.error(`Media cleanup watcher exited (code ${code}, signal ${signal}), restarting in ${delay / 1000}s`);
+      this.cleanupWatcherRestartTimer = setTimeout(() => this.startCleanupWatcher(), delay);
+      this.cleanupWatcherRestartDelay = Math.min(delay * 2, 10 * 60 * 1000);
+    });
 
-      bucketFiles.sort((a, b) => b.ts.localeCompare(a.ts)); // newest first
-      kept++;
-      for (let i = 1; i < bucketFiles.length; i++) {
-        try {
-          fs.unlinkSync(bucketFiles[i].fullPath);
-          console.log(`Deleted older file: ${bucketFiles[i].filename}`);
-          deleted++;
-        } catch (e) {
-          console.error(`Error deleting ${bucketFiles[i].filename}: ${e}`);
-        }
-      }
-      // shrink array to only the newest
-      byHour[key] = [bucketFiles[0]];
-    }
-
-    // 2) Retention: keep only last N hour-buckets per camera
-    // Build per-camera list of hour keys, newest→oldest by key suffix (YYYYMMDD_HH)
-    const byCamera = {};
-    for (const key of Object.keys(byHour)) {
-      // key format camera_YYYYMMDD_HH → split last two underscores
-      const lastUnderscore = key.lastIndexOf("_");
-      const secondUnderscore = key.lastIndexOf("_", lastUnderscore - 1);
-      const camera = key.substring(0, secondUnderscore);
-      const hourKey = key.substring(secondUnderscore + 1); // YYYYMMDD_HH
-  
-      if (!byCamera[camera]) byCamera[camera] = [];
-      byCamera[camera].push({ key, hourKey });
+    return true;
+  },
+
+  /**
+   * Ask the service or the cleanup watcher to run now, or run a one-off
+   * cleanup if neither is running
+   */
+  requestCleanup() {
+    if (this.service) {
+      this.sendServiceCommand({ command: "cleanup" }, 5000, (error) => {
+        if (error) console.error(`Could not request media cleanup: ${error.message}`);
+      });
+      return;
     }
-  
-    // For each camera, sort hour keys descending, keep only top RETAIN_HOURS
-    for (const camera of Object.keys(byCamera)) {
-      const hourBuckets = byCamera[camera];
-      hourBuckets.sort((a, b) => b.hourKey.localeCompare(a.hourKey));
-  
-      if (hourBuckets.length <= RETAIN_HOURS) continue;
-  
-      // Remove everything beyond RETAIN_HOURS
-      for (let i = RETAIN_HOURS; i < hourBuckets.length; i++) {
-        const oldKey = hourBuckets[i].key;
-        const fileInfo = byHour[oldKey][0]; // We only have one file per hour-bucket now
-        try {
-          fs.unlinkSync(fileInfo.fullPath);
-          console.log(`Deleted old hour-bucket file: ${fileInfo.filename}`);
-          deleted++;
-        } catch (e) {
-          console.error(`Error deleting ${fileInfo.filename}: ${e}`);
-        }
-      }
+    if (this.cleanupWatcher) {
+      this.cleanupWatcher.kill("SIGUSR1");
+      return;
     }
-  
-    console.log(`Cleanup complete: Kept ${kept} files, deleted ${deleted} files`);
+
+    const script = path.join(__dirname, "python", "CleanUpMedia.py");
+    const pythonExec = path.join(__dirname, "python", "venv", "bin", "python");
+    if (!fs.existsSync(script) || !fs.existsSync(pythonExec)) {
+      console.error("CleanUpMedia.py or the Python venv not found, cannot clean up media");
+      return;
+    }
+
+    exec(`"${pythonExec}" "${script}" --once`, (error, stdout, stderr) => {
+      if (error) {
+        console.error(`Error running CleanUpMedia.py: ${error}`);
+        if (stderr) console.error(stderr);
+      }
+    });
   },
-  
+
   /**
    * Load family images from the Pictures folder
    * @param {boolean} newUploadDetected - Whether this refresh was triggered by a new file upload
@@ -433,23 +716,25 @@ module.exports = NodeHelper.create({
     }
 
     const fileList = fs.readdirSync(picturesPath).filter(f => this.isImageFile(f));
-    
-    // Get file stats to sort by creation time (newest first)
-    const fileStats = fileList.map(filename => {
-      const fullPath = path.join(picturesPath, filename);
-      const stats = fs.statSync(fullPath);
-      return {
-        filename: filename,
-        path: `modules/MMM-PictureVerse/python/Pictures/${filename}`,
-        ctime: stats.ctimeMs  // Creation time in milliseconds
-      };
+    const renditions = this.loadRenditionIndex();
+
+    // Order newest first from the media catalog's index instead of stat'ing
+    // every photo; files it doesn't know yet are the newest of all
+    const photos = this.loadPhotoIndex();
+    let ordered = fileList;
+    if (photos) {
+      const onDisk = new Set(fileList);
+      const known = new Set(photos);
+      ordered = fileList.filter(f => !known.has(f))
+        .concat(photos.filter(f => onDisk.has(f)));
+    }
+
+    this.familyPaths = new Map();
+    const files = ordered.map(filename => {
+      const served = this.familyImagePath(filename, renditions);
+      this.familyPaths.set(filename, served);
+      return served;
     });
-    
-    // Sort files by creation time, newest first
-    fileStats.sort((a, b) => b.ctime - a.ctime);
-    
-    // Extract just the paths for sending to the client
-    const files = fileStats.map(file => file.path);
 
     console.log(`Found ${files.length} family images`);
     
@@ -460,31 +745,353 @@ module.exports = NodeHelper.create({
     });
   },
   
-  notifyMotionDetection() {
+  /**
+   * Path the frontend loads a family photo from
+   * @param {string} filename - Photo name in Pictures/
+   * @param {Object} renditions - Rendition index from loadRenditionIndex()
+   */
+  familyImagePath(filename, renditions) {
+    const rendition = renditions[filename] && renditions[filename].file;
+    // Serve the screen-sized copy when the sync has made one
+    return rendition
+      ? `modules/MMM-PictureVerse/python/Renditions/${rendition}`
+      : `modules/MMM-PictureVerse/python/Pictures/${filename}`;
+  },
+
+  /**
+   * Send the frontend only what changed in Pictures/ instead of the whole
+   * list, so it can update its slideshow order in place. Names it already
+   * has (e.g. a file reported by both the watcher and the daemon) are skipped.
+   * @param {Object} changes - { added, removed, changed } photo names
+   * @param {boolean} newUploadDetected - Whether to show the newest addition now
+   */
+  applyFamilyChanges({ added = [], removed = [], changed = [] }, newUploadDetected = false) {
+    if (!this.familyPaths) {
+      // Nothing sent yet to apply changes to
+      this.loadFamilyImages(newUploadDetected);
+      return;
+    }
+
+    const picturesPath = path.join(__dirname, "python", "Pictures");
+    const renditions = added.length + changed.length > 0 ? this.loadRenditionIndex() : {};
+    const delta = { added: [], removed: [], changed: [] };
+
+    removed.forEach(filename => {
+      if (this.familyPaths.has(filename)) {
+        delta.removed.push(this.familyPaths.get(filename));
+        this.familyPaths.delete(filename);
+      }
+    });
+
+    added.concat(changed).forEach(filename => {
+      if (!this.isImageFile(filename) || !fs.existsSync(path.join(picturesPath, filename))) return;
+
+      const served = this.familyImagePath(filename, renditions);
+      const previous = this.familyPaths.get(filename);
+      if (previous === undefined) {
+        delta.added.push(served);
+      } else if (previous !== served) {
+        delta.changed.push({ from: previous, to: served });
+      }
+      this.familyPaths.set(filename, served);
+    });
+
+    if (delta.added.length + delta.removed.length + delta.changed.length === 0) return;
+
+    console.log(`Family images: ${delta.added.length} added, ${delta.removed.length} removed, ${delta.changed.length} changed`);
+    this.sendSocketNotification("FAMILY_IMAGES_DELTA", {
+      ...delta,
+      newUpload: newUploadDetected && delta.added.length > 0
+    });
+  },
+
+  /**
+   * Read python/Renditions/index.json, written by the Dropbox sync, which maps
+   * each photo in Pictures/ to its display-size copy
+   * @returns {Object} filename -> { file, key }
+   */
+  loadRenditionIndex() {
+    const indexPath = path.join(__dirname, "python", "Renditions", "index.json");
+    if (!fs.existsSync(indexPath)) return {};
+
+    try {
+      return JSON.parse(fs.readFileSync(indexPath, "utf8")).files || {};
+    } catch (e) {
+      console.error(`Error reading rendition index: ${e}`);
+      return {};
+    }
+  },
+
+  /**
+   * Read python/media_index.json, written by python/media_catalog.py after
+   * every change to media/
+   * @returns {Object|null} { images, videos }, or null if unavailable
+   */
+  loadMediaIndex() {
+    const indexPath = path.join(__dirname, "python", "media_index.json");
+    if (!fs.existsSync(indexPath)) return null;
+
+    try {
+      const index = JSON.parse(fs.readFileSync(indexPath, "utf8"));
+      return { images: index.images || [], videos: index.videos || [] };
+    } catch (e) {
+      console.error(`Error reading media index: ${e}`);
+      return null;
+    }
+  },
+
+  /**
+   * Read python/photo_index.json, written by python/media_catalog.py after
+   * every change to Pictures/
+   * @returns {string[]|null} Photo names newest first, or null if unavailable
+   */
+  loadPhotoIndex() {
+    const indexPath = path.join(__dirname, "python", "photo_index.json");
+    if (!fs.existsSync(indexPath)) return null;
+
+    try {
+      return JSON.parse(fs.readFileSync(indexPath, "utf8")).photos || [];
+    } catch (e) {
+      console.error(`Error reading photo index: ${e}`);
+      return null;
+    }
+  },
+
+  /**
+   * Sort Blink media file names (Camera_YYYYMMDD_HHMMSS.ext) newest first by
+   * the timestamp in the name, without touching the files
+   */
+  sortNewestFirst(files) {
+    const timestamp = (f) => {
+      const match = f.match(/_(\d{8}_\d{6})\.[^.]+$/);
+      return match ? match[1] : "";
+    };
+    return files.sort((a, b) => timestamp(b).localeCompare(timestamp(a)));
+  },
+
+  /**
+   * Newest snapshot per camera and the newest videos in the media folder,
+   * from the media index when there is one, otherwise from the file names
+   * @returns {Object} { images, videos } as file names
+   */
+  newestBlinkMedia(mediaPath) {
+    const index = this.loadMediaIndex();
+    if (index) {
+      // Files may have been deleted since the index was written
+      const exists = (f) => fs.existsSync(path.join(mediaPath, f));
+      return { images: index.images.filter(exists), videos: index.videos.filter(exists) };
+    }
+
+    const files = fs.readdirSync(mediaPath);
+    const imageFiles = this.sortNewestFirst(files.filter(f => this.isImageFile(f)));
+    const videoFiles = this.sortNewestFirst(files.filter(f => this.isVideoFile(f)));
+
+    // Group images by camera name to ensure we get one per camera
+    const imagesByCamera = {};
+
+    imageFiles.forEach(filename => {
+      const cameraName = this.blinkCameraName(filename);
+      // Keep only the newest image per camera
+      if (cameraName && !imagesByCamera[cameraName]) {
+        imagesByCamera[cameraName] = filename;
+      }
+    });
+
+    return { images: Object.values(imagesByCamera), videos: videoFiles };
+  },
+
+  /**
+   * Camera name from a Blink media file name
+   * (e.g., "Garage_20241203_143022.jpg" -> "Garage"), or null
+   */
+  blinkCameraName(filename) {
+    const match = filename.match(/^(.+?)_\d{8}_\d{6}/);
+    return match ? match[1] : null;
+  },
+
+  /**
+   * Listen on python/media_events.sock for the JSON lines python/media_events.py
+   * sends as Blink media is saved or deleted. Each connection carries one
+   * batch (e.g. a capture's snapshot and clip), handled when it closes.
+   */
+  startMediaEventServer() {
+    const socketPath = path.join(__dirname, "python", "media_events.sock");
+    fs.rmSync(socketPath, { force: true });
+
+    this.mediaEventServer = net.createServer((connection) => {
+      const events = [];
+      readline.createInterface({ input: connection })
+        .on("line", (line) => {
+          try {
+            events.push(JSON.parse(line));
+          } catch (e) {
+            console.error(`Invalid media event: ${line}`);
+          }
+        })
+        .on("close", () => this.handleMediaEvents(events));
+      connection.on("error", (error) => console.error(`Media event connection error: ${error}`));
+    });
+
+    this.mediaEventServer.on("error", (error) => {
+      console.error(`Media event socket error, falling back to the media watcher: ${error}`);
+      this.mediaEventsListening = false;
+    });
+    this.mediaEventServer.on("close", () => {
+      this.mediaEventsListening = false;
+      fs.rmSync(socketPath, { force: true });
+    });
+    this.mediaEventServer.listen(socketPath, () => {
+      // Load what is already on disk before the first event arrives
+      this.currentBlinkMedia();
+      this.mediaEventsListening = true;
+      console.log(`Listening for media events on ${socketPath}`);
+    });
+  },
+
+  /**
+   * Newest snapshot per camera and newest clips, kept up to date from media
+   * events; loaded from the media index when the event socket starts
+   */
+  currentBlinkMedia() {
+    if (!this.blinkMedia) {
+      const mediaPath = path.join(__dirname, "python", "media");
+      const { images, videos } = fs.existsSync(mediaPath)
+        ? this.newestBlinkMedia(mediaPath)
+        : { images: [], videos: [] };
+      this.blinkMedia = {
+        images: new Map(images.map(f => [this.blinkCameraName(f), f])),
+        videos
+      };
+    }
+    return this.blinkMedia;
+  },
+
+  /**
+   * Apply one batch of media events and forward what changed: a new
+   * snapshot updates the camera images, a new clip is sent with the clips
+   * so the mirror shows it
+   */
+  handleMediaEvents(events) {
+    const media = this.currentBlinkMedia();
+    let newImage = false;
+    let newVideo = null;
+
+    events.forEach(event => {
+      if (event.folder !== "media") return;
+      const camera = this.blinkCameraName(event.file);
+
+      if (event.event === "media_saved" && event.kind === "image" && camera) {
+        const current = media.images.get(camera);
+        if (!current || this.sortNewestFirst([current, event.file])[0] === event.file) {
+          media.images.set(camera, event.file);
+          newImage = true;
+        }
+      } else if (event.event === "media_saved" && event.kind === "video") {
+        if (!media.videos.includes(event.file)) {
+          // Same limit as NEWEST_VIDEOS in python/media_catalog.py
+          media.videos = this.sortNewestFirst([event.file, ...media.videos]).slice(0, 50);
+          newVideo = event.file;
+        }
+      } else if (event.event === "media_removed") {
+        media.videos = media.videos.filter(f => f !== event.file);
+        if (camera && media.images.get(camera) === event.file) {
+          media.images.delete(camera);
+        }
+      }
+    });
+
+    if (newVideo) {
+      console.log(`Motion clip announced: ${newVideo}`);
+      this.sendBlinkMedia(true);
+      this.recordLatencyEvent(newVideo, "media_ready");
+    } else if (newImage) {
+      this.sendBlinkMedia(false);
+    }
+  },
+
+  /**
+   * Send the camera images (and the clips, if includeVideos) from
+   * currentBlinkMedia() without listing the media folder
+   */
+  sendBlinkMedia(includeVideos) {
+    const mediaPath = path.join(__dirname, "python", "media");
+    const media = this.currentBlinkMedia();
+    // Files may have been deleted without an event
+    const exists = (f) => fs.existsSync(path.join(mediaPath, f));
+
+    const images = this.sortNewestFirst(Array.from(media.images.values()).filter(exists));
+    const payload = { images: images.map(f => `modules/MMM-PictureVerse/python/media/${f}`) };
+    if (includeVideos) {
+      Object.assign(payload, this.displayVideos(mediaPath, media.videos.filter(exists)));
+    }
+    this.sendSocketNotification("BLINK_MEDIA_READY", payload);
+  },
+
+  /**
+   * Module paths for motion clips, preferring the faststart/downscaled copy
+   * BlinkMonitor leaves in media/display/ (see python/clip_processing.py),
+   * plus the poster frame made alongside it
+   * @returns {Object} { videos: [path], posters: { videoPath: posterPath } }
+   */
+  displayVideos(mediaPath, videoFiles) {
+    const displayPath = path.join(mediaPath, "display");
+    const urlBase = "modules/MMM-PictureVerse/python/media";
+    const posters = {};
+
+    const videos = videoFiles.map(filename => {
+      if (!fs.existsSync(path.join(displayPath, filename))) {
+        return `${urlBase}/${filename}`;
+      }
+
+      const video = `${urlBase}/display/${filename}`;
+      const poster = filename.replace(/\.mp4$/i, ".jpg");
+      if (fs.existsSync(path.join(displayPath, poster))) {
+        posters[video] = `${urlBase}/display/${poster}`;
+      }
+      return video;
+    });
+
+    return { videos, posters };
+  },
+
+  /**
+   * Append a node-side event for a Blink media file to the motion latency
+   * log, where python/motion_latency.py joins it with BlinkMonitor's trace
+   * for the same file
+   */
+  recordLatencyEvent(filePath, event) {
+    const logPath = path.join(__dirname, "python", "logs", "motion_latency.jsonl");
+    const record = { source: "node", file: path.basename(filePath), event, at: Date.now() / 1000 };
+
+    fs.mkdir(path.dirname(logPath), { recursive: true }, () => {
+      fs.appendFile(logPath, JSON.stringify(record) + "\n", (error) => {
+        if (error) console.error(`Error writing latency log: ${error}`);
+      });
+    });
+  },
+
+  notifyMotionDetection(triggerFile) {
     // Scan the media folder and send the latest media
     const mediaPath = path.join(__dirname, "python", "media");
     if (fs.existsSync(mediaPath)) {
       const files = fs.readdirSync(mediaPath);
 
-      const imageFiles = files.filter(f => this.isImageFile(f));
-      const videoFiles = files.filter(f => this.isVideoFile(f));
-      
-      // Sort by creation time (newest first)
-      const sortByCreationTime = (a, b) => {
-        const statsA = fs.statSync(path.join(mediaPath, a));
-        const statsB = fs.statSync(path.join(mediaPath, b));
-        return statsB.birthtime - statsA.birthtime;
-      };
-      
-      imageFiles.sort(sortByCreationTime);
-      videoFiles.sort(sortByCreationTime);
+      // Newest first by the timestamp in the name. This runs as the file
+      // lands, before the monitor has recorded it in the media index, so it
+      // lists the folder rather than reading the index
+      const imageFiles = this.sortNewestFirst(files.filter(f => this.isImageFile(f)));
+      const videoFiles = this.sortNewestFirst(files.filter(f => this.isVideoFile(f)));
       
       const latestImage = imageFiles.length > 0 ? imageFiles[0] : null;
       
       this.sendSocketNotification("BLINK_MEDIA_READY", {
         image: latestImage ? `modules/MMM-PictureVerse/python/media/${latestImage}` : null,
-        videos: videoFiles.map(v => `modules/MMM-PictureVerse/python/media/${v}`)
+        ...this.displayVideos(mediaPath, videoFiles)
       });
+
+      if (triggerFile) {
+        this.recordLatencyEvent(triggerFile, "media_ready");
+      }
     }
   },
 
@@ -499,96 +1106,47 @@ module.exports = NodeHelper.create({
     }
 
     if (notification === "REQUEST_BLINK") {
-      // Clean up old images first
-      this.cleanupBlinkImages();
-
-      const script = path.join(__dirname, "python", "Blink.py");
-      const pythonExec = path.join(__dirname, "python", "venv", "bin", "python");
-
-      if (!fs.existsSync(script)) {
-        console.error(`Blink.py not found at: ${script}`);
-        this.sendSocketNotification("BLINK_MEDIA_READY", { images: [], videos: [] });
+      if (!this.service) {
+        this.runBlinkScript();
         return;
       }
 
-      if (!fs.existsSync(pythonExec)) {
-        console.error(`Python executable not found at: ${pythonExec}`);
-        this.sendSocketNotification("BLINK_MEDIA_READY", { images: [], videos: [] });
-        return;
-      }
-
-      exec(`"${pythonExec}" "${script}"`, (error, stdout, stderr) => {
-        if (error) {
-          console.error(`Error executing Blink.py: ${error}`);
-          console.error(stderr);
-          this.sendSocketNotification("BLINK_MEDIA_READY", { images: [], videos: [] });
+      // Capture with the service's Blink session
+      this.sendServiceCommand({ command: "capture" }, 120 * 1000, (error, result) => {
+        if (error || result.unavailable) {
+          console.error(`Blink capture request failed (${error ? error.message : result.error}), running Blink.py`);
+          this.runBlinkScript();
           return;
         }
-
-        console.log("Blink.py output:", stdout);
-        this.cleanupBlinkImages(); // Clean up after new images are fetched
-
-        const mediaPath = path.join(__dirname, "python", "media");
-        if (!fs.existsSync(mediaPath)) {
-          console.log("Media directory not found");
-          this.sendSocketNotification("BLINK_MEDIA_READY", { images: [], videos: [] });
-          return;
-        }
-
-        const files = fs.readdirSync(mediaPath);
-
-        // Get all image and video files
-        const imageFiles = files.filter(f => this.isImageFile(f));
-        const videoFiles = files.filter(f => this.isVideoFile(f));
-
-        // Sort by filename (which contains timestamp) - newest first
-        imageFiles.sort().reverse();
-        videoFiles.sort().reverse();
-
-        // Group images by camera name to ensure we get one per camera
-        const imagesByCamera = {};
-
-        imageFiles.forEach(filename => {
-          // Extract camera name from filename (e.g., "Garage_20241203_143022.jpg" -> "Garage")
-          const match = filename.match(/^(.+?)_\d{8}_\d{6}/);
-          if (match) {
-            const cameraName = match[1];
-            // Keep only the newest image per camera
-            if (!imagesByCamera[cameraName]) {
-              imagesByCamera[cameraName] = filename;
-            }
-          }
-        });
-
-        // Get the list of newest images (one per camera)
-        const newestImages = Object.values(imagesByCamera);
-
-        console.log(`Found ${newestImages.length} camera images (one per camera)`);
-        console.log(`Camera names: ${Object.keys(imagesByCamera).join(', ')}`);
-
-        this.sendSocketNotification("BLINK_MEDIA_READY", {
-          images: newestImages.map(f => `modules/MMM-PictureVerse/python/media/${f}`),
-          videos: videoFiles.map(v => `modules/MMM-PictureVerse/python/media/${v}`)
-        });
+        console.log(`Blink capture: ${result.saved}/${result.cameras} cameras${result.error ? ` (${result.error})` : ""}`);
+        this.sendNewestBlinkMedia();
       });
     }
 
     if (notification === "SYNC_DROPBOX") {
-      // Directly sync with Dropbox without waiting for loadFamilyImages
-      console.log("Performing immediate Dropbox sync on startup");
-      this.syncDropbox();
+      // The daemon syncs as soon as it starts, so only sync here without it
+      if (!this.dropboxDaemon && !this.service) {
+        console.log("Performing immediate Dropbox sync on startup");
+        this.syncDropbox();
+      }
     }
 
     if (notification === "REQUEST_IMAGES") {
-      // First, ensure the Dropbox sync is fresh
-      this.syncDropbox(() => {
+      if (this.dropboxDaemon || this.service) {
+        // The daemon keeps Pictures up to date already
         this.loadFamilyImages();
-      });
+      } else {
+        // First, ensure the Dropbox sync is fresh
+        this.syncDropbox(() => {
+          this.loadFamilyImages();
+        });
+      }
     }
 
     // Add these new handlers
     if (notification === "START_BLINK_MONITOR") {
-      this.startBlinkMonitor();
+      // The service runs its own monitor
+      if (!this.service) this.startBlinkMonitor();
     }
     
     if (notification === "STOP_BLINK_MONITOR") {
@@ -598,10 +1156,71 @@ module.exports = NodeHelper.create({
     // Handle cleanup request
     if (notification === "CLEANUP_BLINK_IMAGES") {
       console.log("Received request to clean up Blink images");
-      this.cleanupBlinkImages();
+      this.requestCleanup();
     }
   },
 
+  /**
+   * Capture with python/Blink.py, which logs in by itself if no monitor
+   * answers on the control socket
+   */
+  runBlinkScript() {
+    const script = path.join(__dirname, "python", "Blink.py");
+    const pythonExec = path.join(__dirname, "python", "venv", "bin", "python");
+
+    if (!fs.existsSync(script)) {
+      console.error(`Blink.py not found at: ${script}`);
+      this.sendSocketNotification("BLINK_MEDIA_READY", { images: [], videos: [] });
+      return;
+    }
+
+    if (!fs.existsSync(pythonExec)) {
+      console.error(`Python executable not found at: ${pythonExec}`);
+      this.sendSocketNotification("BLINK_MEDIA_READY", { images: [], videos: [] });
+      return;
+    }
+
+    exec(`"${pythonExec}" "${script}"`, (error, stdout, stderr) => {
+      if (error) {
+        console.error(`Error executing Blink.py: ${error}`);
+        console.error(stderr);
+        this.sendSocketNotification("BLINK_MEDIA_READY", { images: [], videos: [] });
+        return;
+      }
+
+      console.log("Blink.py output:", stdout);
+      this.sendNewestBlinkMedia();
+    });
+  },
+
+  /**
+   * Send the newest snapshot per camera and the newest clips after a capture
+   */
+  sendNewestBlinkMedia() {
+    if (this.mediaEventsListening) {
+      // The capture announced its files as it saved them
+      this.sendBlinkMedia(true);
+      return;
+    }
+
+    const mediaPath = path.join(__dirname, "python", "media");
+    if (!fs.existsSync(mediaPath)) {
+      console.log("Media directory not found");
+      this.sendSocketNotification("BLINK_MEDIA_READY", { images: [], videos: [] });
+      return;
+    }
+
+    // Captures record their files in the media index as they save them
+    const { images: newestImages, videos: videoFiles } = this.newestBlinkMedia(mediaPath);
+
+    console.log(`Found ${newestImages.length} camera images (one per camera)`);
+
+    this.sendSocketNotification("BLINK_MEDIA_READY", {
+      images: newestImages.map(f => `modules/MMM-PictureVerse/python/media/${f}`),
+      ...this.displayVideos(mediaPath, videoFiles)
+    });
+  },
+
   syncDropbox(callback) {
     const script = path.join(__dirname, "python", "Dropbox.py");
     const pythonExec = path.join(__dirname, "python", "venv", "bin", "python");
@@ -626,9 +1245,18 @@ module.exports = NodeHelper.create({
         console.error(stderr);
         if (callback) callback(false);
       } else {
-        console.log("Dropbox sync output:", stdout);
-        // Check if any files were downloaded
-        const filesDownloaded = stdout.includes("Downloaded") && !stdout.includes("Downloaded 0 new files");
+        // Warnings and errors; everything else is in python/logs/dropbox_sync.jsonl
+        if (stderr.trim()) console.error(`[Dropbox sync] ${stderr.trim()}`);
+        // Dropbox.py ends with the same {"event": "sync", ...} line as the daemon
+        const line = stdout.split("\n").reverse().find((l) => l.startsWith('{"event"'));
+        let filesDownloaded = false;
+        try {
+          const event = line ? JSON.parse(line) : null;
+          filesDownloaded = Boolean(event && ((event.added || []).length || (event.modified || []).length));
+        } catch (e) {
+          console.error("Could not parse Dropbox sync result:", e.message);
+        }
+        console.log(`Dropbox sync finished${filesDownloaded ? " with new files" : ""}`);
         if (callback) callback(filesDownloaded);
       }
     });
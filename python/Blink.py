@@ -1,6 +1,10 @@
 """
 Blink Camera Snapshot Script
 Fetches snapshots and videos from all Blink cameras
+
+If BlinkMonitor.py is running, the capture is handed to it over its control
+socket so no second login is needed; otherwise this script starts its own
+session, reusing the token saved in creds.json when it is still valid.
 """
 
 import json
@@ -15,14 +19,23 @@ from blinkpy.auth import Auth
 from blink_common import (
     MEDIA_FOLDER,
     CREDS_FILE,
+    CONTROL_SOCKET,
+    CONTROL_TIMEOUT,
     WAIT_TIME_WIRED,
     WAIT_TIME_WIRELESS,
     DOWNLOAD_TIMEOUT_WIRED,
     DOWNLOAD_TIMEOUT_WIRELESS,
+    MAX_CONCURRENT_CAMERAS,
     MIN_FILE_SIZE,
     is_wired_camera,
     get_media_path,
+    download_clip,
+    start_blink,
+    save_creds,
 )
+from media_catalog import record_media
+from io_scheduler import SNAPSHOT
+from structured_logging import setup_logging
 
 
 def validate_file(filepath: Path, min_size: int = MIN_FILE_SIZE) -> bool:
@@ -63,36 +76,56 @@ async def save_snapshot(camera, filepath: Path) -> bool:
 
 async def save_video(camera, filepath: Path, is_wired: bool) -> bool:
     """
-    Save motion video with timeout and validation
+    Stream the motion clip to disk, resuming once if the download stalls
     Returns True if successful, False otherwise
     """
     timeout = DOWNLOAD_TIMEOUT_WIRED if is_wired else DOWNLOAD_TIMEOUT_WIRELESS
-    
-    try:
-        print(f"  Downloading video (timeout: {timeout}s)...")
-        
-        await asyncio.wait_for(
-            camera.video_to_file(str(filepath)),
-            timeout=timeout
-        )
-        
-        if validate_file(filepath):
-            file_size = filepath.stat().st_size
-            print(f"  [OK] Video saved: {filepath.name} ({file_size:,} bytes)")
+
+    print(f"  Downloading video (timeout: {timeout}s)...")
+    if await download_clip(camera, filepath, timeout, attempts=2, priority=SNAPSHOT):
+        file_size = filepath.stat().st_size
+        print(f"  [OK] Video saved: {filepath.name} ({file_size:,} bytes)")
+        return True
+    return False
+
+
+async def trigger_snapshot(name, cam, semaphore) -> bool:
+    """Ask a camera to take a new snapshot. Returns True if the request was accepted"""
+    async with semaphore:
+        try:
+            await cam.snap_picture()
+            print(f"  [OK] {name}: snapshot triggered")
             return True
-        else:
-            print(f"  [ERROR] Video validation failed")
-            if filepath.exists():
-                filepath.unlink()
+        except Exception as e:
+            print(f"  [ERROR] {name}: failed to trigger snapshot: {e}")
             return False
-            
-    except asyncio.TimeoutError:
-        print(f"  [ERROR] Video download timeout after {timeout}s")
-        return False
-        
-    except Exception as e:
-        print(f"  [ERROR] Video error: {e}")
-        return False
+
+
+async def download_camera_media(name, cam, timestamp, semaphore) -> list:
+    """
+    Save the latest snapshot and cached video for one camera
+    Returns the paths that were saved (empty if neither was)
+    """
+    async with semaphore:
+        is_wired = is_wired_camera(cam)
+        print(f"\nCamera: {name} ({'Wired' if is_wired else 'Wireless'})")
+
+        # Prepare file paths
+        img_path = get_media_path(name, timestamp, "jpg")
+        vid_path = get_media_path(name, timestamp, "mp4")
+
+        # Save snapshot
+        snapshot_success = await save_snapshot(cam, img_path)
+
+        # Try to save video if available
+        video_success = False
+        if cam.video_from_cache:
+            print(f"  {name}: video available in cache")
+            video_success = await save_video(cam, vid_path, is_wired)
+        else:
+            print(f"  [INFO] {name}: no video in cache (this is normal for some cameras)")
+
+        return [path for path, ok in ((img_path, snapshot_success), (vid_path, video_success)) if ok]
 
 
 # ==================== MAIN FUNCTION ====================
@@ -111,10 +144,12 @@ async def fetch_blink_media(session):
     
     # Initialize Blink
     blink = Blink(session=session)
-    blink.auth = Auth(creds, no_prompt=True)
+    blink.auth = Auth(creds, no_prompt=True, session=session)
 
     print("Connecting to Blink servers...")
-    await blink.start()
+    if not await start_blink(blink):
+        print("[ERROR] Could not connect to Blink")
+        return False
     await blink.refresh()
     
     # Create media folder
@@ -123,63 +158,83 @@ async def fetch_blink_media(session):
     # Get timestamp for this batch
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
-    print(f"\nFound {len(blink.cameras)} camera(s)")
+    cameras = list(blink.cameras.items())
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CAMERAS)
+
+    print(f"\nFound {len(cameras)} camera(s)")
     print("=" * 60)
     
-    success_count = 0
-    
-    # Process each camera
-    for name, cam in blink.cameras.items():
-        print(f"\nCamera: {name}")
-        
-        # Check camera type
-        is_wired = is_wired_camera(cam)
-        camera_type = "Wired" if is_wired else "Wireless"
-        print(f"  Type: {camera_type}")
-        
-        # Trigger snapshot
-        print("  Triggering snapshot...")
-        try:
-            await cam.snap_picture()
-        except Exception as e:
-            print(f"  [ERROR] Failed to trigger snapshot: {e}")
-            continue
-        
-        # Wait for camera to process (camera-specific time)
-        wait_time = WAIT_TIME_WIRED if is_wired else WAIT_TIME_WIRELESS
-        print(f"  Waiting {wait_time}s for processing...")
-        await asyncio.sleep(wait_time)
-        
-        # Refresh to get latest data
-        await blink.refresh()
-        
-        # Prepare file paths
-        img_path = get_media_path(name, timestamp, "jpg")
-        vid_path = get_media_path(name, timestamp, "mp4")
-        
-        # Save snapshot
-        snapshot_success = await save_snapshot(cam, img_path)
+    # Trigger every camera at once so their processing time overlaps
+    print("\nTriggering snapshots...")
+    triggered = await asyncio.gather(
+        *(trigger_snapshot(name, cam, semaphore) for name, cam in cameras)
+    )
+    ready = [(name, cam) for (name, cam), ok in zip(cameras, triggered) if ok]
+    if not ready:
+        print(f"\nCompleted: 0/{len(cameras)} cameras successful")
+        return False
 
-        # Try to save video if available
-        video_success = False
-        if cam.video_from_cache:
-            print("  Video available in cache")
-            video_success = await save_video(cam, vid_path, is_wired)
-        else:
-            print("  [INFO] No video in cache (this is normal for some cameras)")
-        
-        # Track success
-        if snapshot_success or video_success:
-            success_count += 1
-        
-        print("-" * 60)
+    # One wait long enough for the slowest camera, then a single refresh
+    wait_time = max(
+        WAIT_TIME_WIRED if is_wired_camera(cam) else WAIT_TIME_WIRELESS
+        for name, cam in ready
+    )
+    print(f"Waiting {wait_time}s for processing...")
+    await asyncio.sleep(wait_time)
+    # The refresh after connecting was moments ago, so bypass the refresh_rate throttle
+    await blink.refresh(force_cache=True)
+
+    # Download snapshots and videos in parallel
+    results = await asyncio.gather(
+        *(download_camera_media(name, cam, timestamp, semaphore) for name, cam in ready)
+    )
+    success_count = sum(1 for saved in results if saved)
+
+    # Index the new files for cleanup and node_helper.js
+    record_media("media", [path for saved in results for path in saved])
+
+    # Keep refreshed tokens for the next run
+    if save_creds(blink.auth):
+        print("Saved refreshed Blink credentials")
     
-    print(f"\nCompleted: {success_count}/{len(blink.cameras)} cameras successful")
+    print("-" * 60)
+    print(f"\nCompleted: {success_count}/{len(cameras)} cameras successful")
     print("=" * 60)
     
     return success_count > 0
 
 
+async def request_from_monitor():
+    """
+    Ask a running BlinkMonitor to capture from all cameras
+    Returns its result dict, or None if no monitor answered
+    """
+    if not hasattr(asyncio, "open_unix_connection") or not CONTROL_SOCKET.exists():
+        return None
+
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(str(CONTROL_SOCKET)), timeout=2
+        )
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+    try:
+        writer.write(json.dumps({"command": "capture"}).encode() + b"\n")
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout=CONTROL_TIMEOUT)
+        result = json.loads(line) if line else None
+        # The service answers even while its monitor is down (re)starting
+        if result and result.get("unavailable"):
+            return None
+        return result
+    except (OSError, ValueError, asyncio.TimeoutError) as e:
+        print(f"[WARNING] No answer from Blink monitor: {e}")
+        return None
+    finally:
+        writer.close()
+
+
 async def main():
     """Main entry point"""
     print("=" * 60)
@@ -187,6 +242,18 @@ async def main():
     print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Media folder: {MEDIA_FOLDER}")
     print("=" * 60)
+
+    result = await request_from_monitor()
+    if result is not None:
+        print("Capture handled by the running Blink monitor")
+        for filename in result.get("files", []):
+            print(f"  [OK] Saved: {filename}")
+        print(f"\nCompleted: {result.get('saved', 0)}/{result.get('cameras', 0)} cameras successful")
+        if result.get("ok"):
+            print("\n[OK] Snapshot fetch completed successfully")
+            return 0
+        print(f"\n[ERROR] {result.get('error', 'No snapshots were saved')}")
+        return 1
     
     async with ClientSession() as session:
         try:
@@ -208,5 +275,7 @@ async def main():
 
 if __name__ == "__main__":
     import sys
+    # Download and catalog messages from the shared modules (see structured_logging.py)
+    setup_logging("blink")
     exit_code = asyncio.run(main())
     sys.exit(exit_code)
\ No newline at end of file
@@ -4,7 +4,9 @@ Monitors Blink cameras for motion and saves snapshots/videos
 """
 
 import asyncio
+import logging
 import sys
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict
@@ -17,15 +19,40 @@ from blinkpy.helpers.util import json_load
 from blink_common import (
     MEDIA_FOLDER,
     CREDS_FILE,
-    CAPTURE_WAIT_WIRED,
-    CAPTURE_WAIT_WIRELESS,
+    CONTROL_SOCKET,
+    WAIT_TIME_WIRED,
+    WAIT_TIME_WIRELESS,
     DOWNLOAD_TIMEOUT_WIRED,
     DOWNLOAD_TIMEOUT_WIRELESS,
+    MAX_CONCURRENT_CAMERAS,
     MIN_FILE_SIZE,
     is_wired_camera,
     validate_file as _validate_file,
     get_media_path,
+    download_clip,
+    start_blink,
+    start_control_server,
+    save_creds,
 )
+from motion_latency import MotionTrace
+from clip_processing import ClipProcessor, staging_path
+from media_catalog import record_media
+from io_scheduler import MOTION, SNAPSHOT, scheduler
+from structured_logging import get_logger, limited, set_level, setup_logging
+from metrics import Counter, Histogram, start_exporter
+
+log = get_logger("monitor")
+
+# Metrics (see metrics.py)
+MOTION_EVENTS = Counter("pictureverse_blink_motion_events_total", "Motion events per camera", ["camera"])
+SNAPSHOTS = Counter("pictureverse_blink_snapshots_total", "Snapshot downloads per camera by result",
+                    ["camera", "result"])
+VIDEOS = Counter("pictureverse_blink_videos_total", "Motion clip downloads per camera by result",
+                 ["camera", "result"])
+CLIP_RETRIES = Counter("pictureverse_blink_clip_retries_total",
+                       "Clip download attempts after the first, per camera", ["camera"])
+REFRESH_SECONDS = Histogram("pictureverse_blink_refresh_seconds", "Time taken by each Blink motion check refresh")
+REFRESH_ERRORS = Counter("pictureverse_blink_refresh_errors_total", "Motion checks that failed")
 
 
 # ==================== CONFIGURATION ====================
@@ -44,65 +71,38 @@ class Config:
     RETRY_DELAY = 3
 
     # Wait times after capturing (in seconds)
-    CAPTURE_WAIT_WIRED = CAPTURE_WAIT_WIRED
-    CAPTURE_WAIT_WIRELESS = CAPTURE_WAIT_WIRELESS
-
-    # Monitoring
-    CHECK_INTERVAL = 30  # How often to check for motion
-    STATUS_LOG_INTERVAL = 60  # How often to log "no motion" status
+    CAPTURE_WAIT_WIRED = WAIT_TIME_WIRED
+    CAPTURE_WAIT_WIRELESS = WAIT_TIME_WIRELESS
 
-    # File size validation
-    MIN_IMAGE_SIZE = MIN_FILE_SIZE
-    MIN_VIDEO_SIZE = MIN_FILE_SIZE
+    # Concurrent captures: each camera with motion is handled in its own
+    # task, at most MAX_CONCURRENT_CAPTURES at a time. Captures that finish
+    # waiting within REFRESH_BATCH_WINDOW of each other share one refresh.
+    MAX_CONCURRENT_CAPTURES = MAX_CONCURRENT_CAMERAS
+    REFRESH_BATCH_WINDOW = 1
 
-    # Debug mode
-    DEBUG = True  # Set to False to reduce verbose logging
+    # Monitoring: the check interval adapts (see PollScheduler)
+    CHECK_INTERVAL = 30  # Interval when a quiet period starts
+    MIN_CHECK_INTERVAL = 5  # Interval while there is activity
+    MAX_CHECK_INTERVAL = 300  # Longest interval on quiet nights
+    ACTIVE_WINDOW = 300  # Keep polling fast this long after the last motion
+    QUIET_BACKOFF_FACTOR = 1.5  # Growth of the interval per quiet check
+    THROTTLE_INTERVAL = 60  # Minimum wait after a failed/throttled refresh
+    STATUS_LOG_INTERVAL = 60  # Log "no motion" (at debug level) at most this often per camera
 
+    # Display-ready clips (see clip_processing.py; needs ffmpeg): each clip
+    # is remuxed for fast start, or downscaled when CLIP_MAX_WIDTH/HEIGHT
+    # are set, and gets a poster frame before it is published
+    PROCESS_CLIPS = True
+    CLIP_WORKERS = 1  # ffmpeg processes at a time
+    CLIP_QUEUE_LIMIT = 4  # Clips waiting beyond this are published as downloaded
+    CLIP_MAX_WIDTH = 0  # 0 = keep the camera's resolution
+    CLIP_MAX_HEIGHT = 0
+    CLIP_VIDEO_CODEC = "libx264"  # Used when downscaling
+    CLIP_PROCESS_TIMEOUT = 15  # Longest a clip is held back for processing
+    CLIP_KILL_TIMEOUT = 300  # ffmpeg runs longer than this are killed
 
-# ==================== LOGGING ====================
-class Logger:
-    """Simple logger with different levels"""
-    
-    @staticmethod
-    def info(message: str, indent: int = 0):
-        """Standard info message"""
-        prefix = "  " * indent
-        print(f"{prefix}{message}")
-    
-    @staticmethod
-    def success(message: str, indent: int = 0):
-        """Success message with checkmark"""
-        prefix = "  " * indent
-        print(f"{prefix}[OK] {message}")
-    
-    @staticmethod
-    def error(message: str, indent: int = 0):
-        """Error message with X"""
-        prefix = "  " * indent
-        print(f"{prefix}[ERROR] {message}")
-    
-    @staticmethod
-    def warning(message: str, indent: int = 0):
-        """Warning message"""
-        prefix = "  " * indent
-        print(f"{prefix}[WARNING] {message}")
-    
-    @staticmethod
-    def debug(message: str, indent: int = 0):
-        """Debug message (only if DEBUG is True)"""
-        if Config.DEBUG:
-            prefix = "  " * indent
-            print(f"{prefix}[DEBUG] {message}")
-    
-    @staticmethod
-    def separator(char: str = "=", length: int = 60):
-        """Print separator line"""
-        print(char * length)
-    
-    @staticmethod
-    def timestamp() -> str:
-        """Get formatted timestamp"""
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # File size validation
+    MIN_IMAGE_SIZE = MIN_FILE_SIZE
 
 
 # ==================== CAMERA UTILITIES ====================
@@ -142,13 +142,14 @@ class CameraInfo:
 # ==================== FILE OPERATIONS ====================
 class MediaHandler:
     """Handles saving and validating media files"""
+    clip_processor: Optional[ClipProcessor] = None  # Set by MotionMonitor
     
     @staticmethod
     def validate_file(filepath: Path, min_size: int) -> bool:
         """Validate that file exists and meets minimum size"""
         valid = _validate_file(filepath, min_size)
         if not valid and filepath.exists():
-            Logger.debug(f"File too small: {filepath.stat().st_size} bytes (min: {min_size})", indent=2)
+            log.debug(f"File too small: {filepath.stat().st_size} bytes (min: {min_size})")
         return valid
 
     @staticmethod
@@ -157,66 +158,121 @@ class MediaHandler:
         return get_media_path(camera_info.name, timestamp, extension)
     
     @staticmethod
-    async def save_snapshot(camera, camera_info: CameraInfo, timestamp: str) -> Optional[Path]:
-        """Save camera snapshot"""
+    async def save_snapshot(camera, camera_info: CameraInfo, timestamp: str,
+                            priority: int = MOTION) -> Optional[Path]:
+        """Save camera snapshot (as an io_scheduler transfer of priority)"""
         img_path = MediaHandler.get_file_path(camera_info, timestamp, "jpg")
         
         try:
-            await camera.image_to_file(str(img_path))
+            with scheduler.transfer(priority):
+                await camera.image_to_file(str(img_path))
             
             if MediaHandler.validate_file(img_path, Config.MIN_IMAGE_SIZE):
                 file_size = img_path.stat().st_size
-                Logger.success(f"Snapshot saved: {img_path.name} ({file_size:,} bytes)", indent=1)
+                scheduler.record(priority, file_size)
+                SNAPSHOTS.inc(camera=camera_info.name, result="ok")
+                log.info(f"Snapshot saved: {img_path.name} ({file_size:,} bytes)",
+                         extra={"camera": camera_info.name, "file": img_path.name, "size": file_size})
                 return img_path
             else:
-                Logger.error("Snapshot validation failed", indent=1)
+                log.error(f"{camera_info.name}: snapshot validation failed")
+                SNAPSHOTS.inc(camera=camera_info.name, result="invalid")
                 if img_path.exists():
                     img_path.unlink()
                 return None
                 
         except Exception as e:
-            Logger.error(f"Snapshot error: {e}", indent=1)
+            log.error(f"{camera_info.name}: snapshot error: {e}")
+            SNAPSHOTS.inc(camera=camera_info.name, result="failed")
             return None
     
     @staticmethod
-    async def save_video(camera, camera_info: CameraInfo, timestamp: str) -> Optional[Path]:
-        """Save motion video with retry logic"""
+    async def save_video(camera, camera_info: CameraInfo, timestamp: str,
+                         trace: Optional[MotionTrace] = None, priority: int = MOTION) -> Optional[Path]:
+        """
+        Stream the motion clip to disk, resuming on retry (each attempt is
+        timed in trace, if given), as an io_scheduler transfer of priority so
+        Dropbox sync and cleanup back off meanwhile. With a clip processor
+        the clip is downloaded under a hidden name and only published once
+        its display copies are made (or CLIP_PROCESS_TIMEOUT passes).
+        """
         video_path = MediaHandler.get_file_path(camera_info, timestamp, "mp4")
-        max_retries = camera_info.get_max_retries()
-        timeout = camera_info.get_timeout()
-        
-        for attempt in range(1, max_retries + 1):
-            try:
-                Logger.debug(f"Video download attempt {attempt}/{max_retries}", indent=1)
-                
-                # Download with timeout
-                await asyncio.wait_for(
-                    camera.video_to_file(str(video_path)),
-                    timeout=timeout
-                )
-                
-                # Validate file
-                if MediaHandler.validate_file(video_path, Config.MIN_VIDEO_SIZE):
-                    file_size = video_path.stat().st_size
-                    Logger.success(f"Video saved: {video_path.name} ({file_size:,} bytes)", indent=1)
-                    return video_path
-                else:
-                    Logger.error(f"Video validation failed (attempt {attempt})", indent=1)
-                    if video_path.exists():
-                        video_path.unlink()
-                        
-            except asyncio.TimeoutError:
-                Logger.error(f"Download timeout after {timeout}s (attempt {attempt})", indent=1)
-                
-            except Exception as e:
-                Logger.error(f"Download error (attempt {attempt}): {e}", indent=1)
-            
-            # Wait before retry
-            if attempt < max_retries:
-                await asyncio.sleep(Config.RETRY_DELAY)
-        
-        Logger.error("All video download attempts failed", indent=1)
-        return None
+        processor = MediaHandler.clip_processor
+        download_path = staging_path(video_path) if processor else video_path
+
+        def on_attempt(attempt: int, seconds: float):
+            if attempt > 1:
+                CLIP_RETRIES.inc(camera=camera_info.name)
+            if trace:
+                trace.add_span(f"video_attempt_{attempt}", seconds)
+
+        if not await download_clip(camera, download_path, camera_info.get_timeout(),
+                                   attempts=camera_info.get_max_retries(),
+                                   retry_delay=Config.RETRY_DELAY, on_attempt=on_attempt,
+                                   priority=priority):
+            log.error(f"{camera_info.name}: all video download attempts failed")
+            VIDEOS.inc(camera=camera_info.name, result="failed")
+            return None
+
+        if processor:
+            started = time.monotonic()
+            if await processor.process(download_path, video_path):
+                log.info(f"Display copy and poster ready for {video_path.name}")
+            if trace:
+                trace.add_span("process", time.monotonic() - started)
+            processor.publish(download_path, video_path)
+
+        file_size = video_path.stat().st_size
+        VIDEOS.inc(camera=camera_info.name, result="ok")
+        log.info(f"Video saved: {video_path.name} ({file_size:,} bytes)",
+                 extra={"camera": camera_info.name, "file": video_path.name, "size": file_size})
+        return video_path
+
+
+# ==================== POLL SCHEDULING ====================
+class PollScheduler:
+    """
+    Picks the delay before the next motion check: MIN_CHECK_INTERVAL for
+    ACTIVE_WINDOW seconds after motion, then growing from CHECK_INTERVAL by
+    QUIET_BACKOFF_FACTOR per quiet check up to MAX_CHECK_INTERVAL. Failed or
+    throttled refreshes double the interval (at least THROTTLE_INTERVAL).
+    """
+
+    def __init__(self):
+        self.interval = Config.CHECK_INTERVAL
+        self.reason = "startup"
+        self.last_motion: Optional[float] = None
+        self.last_latency: Optional[float] = None
+
+    def next_interval(self, motion: bool, latency: Optional[float] = None,
+                      throttled: bool = False) -> float:
+        """Record the outcome of a check and return the delay before the next one"""
+        now = time.monotonic()
+        previous = self.interval
+        if latency is not None:
+            self.last_latency = latency
+        if motion:
+            self.last_motion = now
+
+        if throttled:
+            self.interval = max(self.interval * 2, Config.THROTTLE_INTERVAL)
+            self.reason = "throttled"
+        elif self.last_motion is not None and now - self.last_motion < Config.ACTIVE_WINDOW:
+            self.interval = Config.MIN_CHECK_INTERVAL
+            self.reason = "active"
+        elif self.reason != "quiet" or self.interval < Config.CHECK_INTERVAL:
+            self.interval = Config.CHECK_INTERVAL
+            self.reason = "quiet"
+        else:
+            self.interval = self.interval * Config.QUIET_BACKOFF_FACTOR
+            self.reason = "quiet"
+        self.interval = min(self.interval, Config.MAX_CHECK_INTERVAL)
+
+        latency_text = f"{self.last_latency:.2f}s" if self.last_latency is not None else "n/a"
+        message = f"Next check in {self.interval:.0f}s ({self.reason}, refresh took {latency_text})"
+        log.log(logging.INFO if self.interval != previous else logging.DEBUG, message,
+                extra={"interval": round(self.interval, 1), "reason": self.reason})
+        return self.interval
 
 
 # ==================== MOTION MONITORING ====================
@@ -226,70 +282,231 @@ class MotionMonitor:
     def __init__(self, blink: Blink):
         self.blink = blink
         self.cameras: Dict[str, CameraInfo] = {}
-        self.last_status_log = 0
+        self.capture_limit = asyncio.Semaphore(Config.MAX_CONCURRENT_CAPTURES)
+        self.in_flight: Dict[str, asyncio.Task] = {}  # camera name -> running capture
+        self.pending_refresh: Optional[asyncio.Task] = None
+        self.scheduler = PollScheduler()
+        self.last_refresh_latency: Optional[float] = None
+        self.last_check_at: Optional[float] = None  # Wall-clock time of the last motion check
+
+        MediaHandler.clip_processor = None
+        if Config.PROCESS_CLIPS:
+            processor = ClipProcessor(
+                workers=Config.CLIP_WORKERS,
+                max_queue=Config.CLIP_QUEUE_LIMIT,
+                max_width=Config.CLIP_MAX_WIDTH,
+                max_height=Config.CLIP_MAX_HEIGHT,
+                video_codec=Config.CLIP_VIDEO_CODEC,
+                timeout=Config.CLIP_PROCESS_TIMEOUT,
+                kill_timeout=Config.CLIP_KILL_TIMEOUT,
+            )
+            if processor.enabled:
+                MediaHandler.clip_processor = processor
+            else:
+                log.warning("ffmpeg not found, motion clips are shown as downloaded")
     
     def initialize_cameras(self):
         """Initialize camera info objects"""
-        Logger.info("\nInitializing cameras...")
         for name, camera in self.blink.cameras.items():
             cam_info = CameraInfo(camera, name)
             self.cameras[name] = cam_info
-            Logger.info(f"  - {name} ({cam_info.type_name})")
-        Logger.info("")
+        log.info("Cameras: " + ", ".join(f"{name} ({info.type_name})" for name, info in self.cameras.items()))
     
-    async def handle_motion(self, name: str, camera, camera_info: CameraInfo):
-        """Handle motion detection for a single camera"""
+    async def shared_refresh(self):
+        """
+        Refresh camera data after a capture. Callers that arrive before the
+        pending refresh has started join it, so concurrent captures cause one
+        refresh instead of one each.
+        """
+        if self.pending_refresh is None:
+            self.pending_refresh = asyncio.ensure_future(self._run_refresh())
+        await asyncio.shield(self.pending_refresh)
+
+    async def _run_refresh(self):
+        await asyncio.sleep(Config.REFRESH_BATCH_WINDOW)
+        # Anyone asking from here on needs a newer refresh than this one
+        self.pending_refresh = None
+        # force_cache bypasses the refresh_rate throttle without clearing motion flags
+        await self.blink.refresh(force_cache=True)
+
+    def start_capture(self, name: str, camera, camera_info: CameraInfo):
+        """Handle motion on a camera in its own task, unless a capture is already running for it"""
+        if name in self.in_flight:
+            log.debug(f"Capture already in progress for {name}, skipping")
+            return
+
+        trace = MotionTrace(name, self.last_check_at)
+        trace.add_span("detection", self.last_refresh_latency)
+        self._track(name, self._run_capture(name, camera, camera_info, trace))
+
+    def _track(self, name: str, coro) -> asyncio.Task:
+        """Run a capture for a camera as its in_flight task"""
+        task = asyncio.create_task(coro)
+        self.in_flight[name] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(name, None))
+        return task
+
+    async def _run_capture(self, name: str, camera, camera_info: CameraInfo, trace: MotionTrace) -> list:
+        """Motion capture under capture_limit; returns the names of the files saved"""
+        with trace.span("queue"):
+            await self.capture_limit.acquire()
+        try:
+            await self.handle_motion(name, camera, camera_info, trace)
+        except Exception as e:
+            log.error(f"Motion capture failed for {name}: {e}", extra={"camera": name})
+        finally:
+            self.capture_limit.release()
+            trace.write(ok=bool(trace.files))
+        return trace.files
+
+    async def handle_motion(self, name: str, camera, camera_info: CameraInfo,
+                            trace: Optional[MotionTrace] = None):
+        """Handle motion detection for a single camera, timing each step in trace"""
+        trace = trace or MotionTrace(name)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        Logger.separator()
-        Logger.info(f"Motion detected: {name}")
-        Logger.info(f"Time: {Logger.timestamp()}")
-        Logger.info(f"Type: {camera_info.type_name}")
-        Logger.separator()
+        MOTION_EVENTS.inc(camera=name)
+        log.info(f"Motion detected: {name} ({camera_info.type_name})",
+                 extra={"camera": name, "wired": camera_info.is_wired})
         
         # Step 1: Trigger snapshot
-        Logger.info("Capturing snapshot...", indent=1)
+        log.debug(f"{name}: capturing snapshot")
         try:
-            await camera.snap_picture()
+            with trace.span("snap_trigger"):
+                await camera.snap_picture()
         except Exception as e:
-            Logger.error(f"Failed to trigger snapshot: {e}", indent=1)
+            log.error(f"{name}: failed to trigger snapshot: {e}")
             return
         
         # Step 2: Wait for camera to process
         wait_time = camera_info.get_capture_wait()
-        Logger.debug(f"Waiting {wait_time}s for camera processing...", indent=1)
-        await asyncio.sleep(wait_time)
+        log.debug(f"{name}: waiting {wait_time}s for camera processing")
+        with trace.span("capture_wait"):
+            await asyncio.sleep(wait_time)
         
-        # Step 3: Refresh to get latest data
-        Logger.debug("Refreshing camera data...", indent=1)
-        await self.blink.refresh()
+        # Step 3: Refresh to get latest data (shared with other captures)
+        log.debug(f"{name}: refreshing camera data")
+        with trace.span("refresh"):
+            await self.shared_refresh()
         
         # Step 4: Save snapshot
-        snapshot_path = await MediaHandler.save_snapshot(camera, camera_info, timestamp)
+        with trace.span("snapshot_download"):
+            snapshot_path = await MediaHandler.save_snapshot(camera, camera_info, timestamp)
+        trace.add_file(snapshot_path)
+        if snapshot_path:
+            # Announce the snapshot now rather than after the video download
+            await asyncio.to_thread(record_media, "media", [snapshot_path])
         
         # Step 5: Check for video
-        Logger.info("Checking for motion video...", indent=1)
-        Logger.debug(f"video_from_cache: {camera.video_from_cache}", indent=2)
-        
-        if hasattr(camera, 'last_record'):
-            Logger.debug(f"last_record: {camera.last_record}", indent=2)
+        log.debug(f"{name}: checking for motion video (video_from_cache: {camera.video_from_cache}, "
+                  f"last_record: {getattr(camera, 'last_record', None)})")
         
         if camera.video_from_cache:
-            video_path = await MediaHandler.save_video(camera, camera_info, timestamp)
+            video_path = await MediaHandler.save_video(camera, camera_info, timestamp, trace)
+            trace.add_file(video_path)
+            if video_path:
+                await asyncio.to_thread(record_media, "media", [video_path])
             
             if not video_path and snapshot_path:
-                Logger.warning("Video failed, but snapshot is available", indent=1)
+                log.warning(f"{name}: video failed, but snapshot is available")
         else:
-            Logger.warning("No video in cache (snapshot saved)", indent=1)
-            Logger.debug("This is normal for some cameras/configurations", indent=2)
-        
-        Logger.separator("-")
-        Logger.info("")
+            # Normal for some cameras/configurations
+            VIDEOS.inc(camera=name, result="not_cached")
+            log.warning(f"{name}: no video in cache (snapshot saved)")
     
-    async def check_motion(self):
-        """Check all cameras for motion"""
+    async def capture_all(self) -> dict:
+        """
+        Capture a snapshot (and cached video) from every camera, for
+        snapshot requests from Blink.py. Each camera goes through the same
+        guard as motion: a camera that is already capturing is not captured
+        again (its running capture's files are reported instead), and at most
+        MAX_CONCURRENT_CAPTURES run at once. Captures share refreshes.
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        cameras = [
+            (name, camera, self.cameras[name])
+            for name, camera in self.blink.cameras.items()
+            if name in self.cameras
+        ]
+        log.info(f"Snapshot request for {len(cameras)} camera(s)")
+
+        tasks = []
+        for name, camera, info in cameras:
+            if name in self.in_flight:
+                log.info(f"Capture already in progress for {name}, using its files")
+                # Shielded, so a dropped request doesn't cancel the motion capture
+                tasks.append(asyncio.shield(self.in_flight[name]))
+            else:
+                tasks.append(self._track(name, self._run_request_capture(name, camera, info, timestamp)))
+
+        saved = await asyncio.gather(*tasks)
+        files = [name for names in saved for name in names]
+        success_count = sum(1 for names in saved if names)
+        if not success_count:
+            return {"ok": False, "cameras": len(cameras), "saved": 0, "files": [],
+                    "error": "No snapshots were saved"}
+        return {"ok": True, "cameras": len(cameras), "saved": success_count, "files": files}
+
+    async def _run_request_capture(self, name: str, camera, camera_info: CameraInfo, timestamp: str) -> list:
+        """One camera of a snapshot request; returns the names of the files saved"""
+        async with self.capture_limit:
+            try:
+                await camera.snap_picture()
+            except Exception as e:
+                log.error(f"{name}: failed to trigger snapshot: {e}")
+                return []
+
+            try:
+                await asyncio.sleep(camera_info.get_capture_wait())
+                await self.shared_refresh()
+                paths = [await MediaHandler.save_snapshot(camera, camera_info, timestamp, SNAPSHOT)]
+                if camera.video_from_cache:
+                    paths.append(await MediaHandler.save_video(camera, camera_info, timestamp, priority=SNAPSHOT))
+            except Exception as e:
+                log.error(f"Snapshot request failed for {name}: {e}", extra={"camera": name})
+                return []
+
+        files = [path.name for path in paths if path]
+        await asyncio.to_thread(record_media, "media", files)
+        return files
+
+    async def control_command(self, request: dict) -> dict:
+        """Answer one request on the control socket"""
+        command = request.get("command")
+        if command == "capture":
+            return await self.capture_all()
+        if command == "log_level":
+            try:
+                return {"ok": True, "level": set_level(request.get("level", "INFO"))}
+            except ValueError as e:
+                return {"ok": False, "error": str(e)}
+        if command == "ping":
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown command: {command}"}
+
+    async def start_control_server(self):
+        """Listen on CONTROL_SOCKET so Blink.py can reuse this session"""
+        server = await start_control_server(self.control_command)
+        if server:
+            log.info(f"Listening for snapshot requests on {CONTROL_SOCKET}")
+        return server
+
+    def is_throttled(self) -> bool:
+        """Whether the last refresh got an error body (e.g. rate limiting) instead of homescreen data"""
+        homescreen = self.blink.homescreen
+        return isinstance(homescreen, dict) and "message" in homescreen and "networks" not in homescreen
+
+    async def check_motion(self) -> bool:
+        """
+        Check all cameras for motion and start a capture task for each one that has it
+        Returns True if any camera reported motion
+        """
         try:
+            started = time.monotonic()
             await self.blink.refresh()
+            self.last_refresh_latency = time.monotonic() - started
+            REFRESH_SECONDS.observe(self.last_refresh_latency)
+            self.last_check_at = time.time()
             motion_detected = False
             
             for name, camera in self.blink.cameras.items():
@@ -299,87 +516,89 @@ class MotionMonitor:
                 
                 if camera.motion_detected:
                     motion_detected = True
-                    await self.handle_motion(name, camera, camera_info)
+                    self.start_capture(name, camera, camera_info)
                 else:
-                    # Periodic status logging
-                    current_time = datetime.now().second
-                    if current_time - self.last_status_log >= Config.STATUS_LOG_INTERVAL:
-                        Logger.debug(f"[{datetime.now().strftime('%H:%M:%S')}] No motion on {name}")
-            
-            # Update last status log time
-            if not motion_detected:
-                self.last_status_log = datetime.now().second
+                    log.debug(f"No motion on {name}",
+                              extra=limited(f"no-motion:{name}", Config.STATUS_LOG_INTERVAL))
+
+            return motion_detected
             
         except Exception as e:
-            Logger.error(f"Error during motion check: {e}")
-            Logger.debug(f"Full error: {repr(e)}")
+            REFRESH_ERRORS.inc()
+            log.error(f"Error during motion check: {e}")
+            log.debug(f"Full error: {repr(e)}")
             raise
     
     async def monitor_loop(self):
         """Main monitoring loop"""
-        Logger.info("Starting motion monitoring...\n")
+        log.info("Starting motion monitoring")
         
         while True:
             try:
-                await self.check_motion()
-                await asyncio.sleep(Config.CHECK_INTERVAL)
+                motion = await self.check_motion()
+
+                # Keep refreshed tokens so restarts and Blink.py can reuse them
+                if save_creds(self.blink.auth):
+                    log.debug("Saved refreshed Blink credentials")
+
+                # Captures in progress count as activity
+                interval = self.scheduler.next_interval(
+                    motion or bool(self.in_flight), self.last_refresh_latency, self.is_throttled()
+                )
+                await asyncio.sleep(interval)
                 
             except Exception as e:
-                Logger.separator("!")
-                Logger.error(f"Error in monitoring loop: {e}")
-                Logger.separator("!")
-                Logger.info("Retrying in 60 seconds...\n")
-                await asyncio.sleep(60)
+                interval = self.scheduler.next_interval(False, throttled=True)
+                log.error(f"Error in monitoring loop: {e}, retrying in {interval:.0f} seconds")
+                await asyncio.sleep(interval)
 
 
 # ==================== MAIN APPLICATION ====================
 async def initialize_blink(session: ClientSession) -> Blink:
     """Initialize and authenticate with Blink"""
-    Logger.info("Loading credentials...")
+    log.info("Loading credentials")
     creds = await json_load(str(Config.CREDS_FILE))
     
-    blink = Blink(session=session)
-    blink.auth = Auth(creds, no_prompt=True)
+    # blinkpy skips refreshes closer together than refresh_rate, so allow the
+    # fastest adaptive interval
+    blink = Blink(session=session, refresh_rate=Config.MIN_CHECK_INTERVAL)
+    blink.auth = Auth(creds, no_prompt=True, session=session)
 
-    Logger.info("Connecting to Blink servers...")
-    await blink.start()
+    log.info("Connecting to Blink servers")
+    if not await start_blink(blink):
+        raise RuntimeError("Could not connect to Blink")
     await blink.refresh()
+    save_creds(blink.auth)
     
     # Log connection info
     email = blink.auth.login_attributes.get('email', 'Unknown')
-    Logger.success(f"Connected as: {email}")
+    log.info(f"Connected as: {email}")
     
     # Log sync modules
-    Logger.info(f"\nSync Modules: {len(blink.sync)}")
     for sync_name, sync in blink.sync.items():
-        Logger.info(f"  - {sync_name}: {sync.status}")
-        if hasattr(sync, 'cameras'):
-            Logger.info(f"    Cameras: {', '.join(sync.cameras.keys())}")
-    
-    Logger.info(f"\nTotal cameras: {len(blink.cameras)}")
+        cameras = ", ".join(sync.cameras.keys()) if hasattr(sync, 'cameras') else ""
+        log.info(f"Sync module {sync_name}: {sync.status}" + (f" (cameras: {cameras})" if cameras else ""))
+    log.info(f"Total cameras: {len(blink.cameras)}")
     
     return blink
 
 
 async def main():
     """Main application entry point"""
-    # Print header
-    Logger.separator()
-    Logger.info("Blink Motion Monitor - Refactored")
-    Logger.info(f"Started: {Logger.timestamp()}")
-    Logger.info(f"Media folder: {Config.MEDIA_FOLDER}")
-    Logger.info(f"Debug mode: {'ON' if Config.DEBUG else 'OFF'}")
-    Logger.separator()
-    Logger.info("")
+    log_file = setup_logging("blink_monitor")
+    start_exporter("blink_monitor")
+    log.info(f"Blink Motion Monitor started (media folder: {Config.MEDIA_FOLDER}, log: {log_file})")
     
     # Check credentials file
     if not Config.CREDS_FILE.exists():
-        Logger.error(f"Credentials file not found: {Config.CREDS_FILE}")
-        Logger.info("Please run BlinkSetup.py first.")
+        log.error(f"Credentials file not found: {Config.CREDS_FILE}. Please run BlinkSetup.py first.")
         return
     
     # Create media folder
     Config.MEDIA_FOLDER.mkdir(exist_ok=True)
+
+    # Make sure media_index.json exists (the catalog rebuilds itself if missing)
+    record_media("media")
     
     # Initialize Blink connection
     async with ClientSession() as session:
@@ -389,13 +608,18 @@ async def main():
             # Start monitoring
             monitor = MotionMonitor(blink)
             monitor.initialize_cameras()
-            
-            await monitor.monitor_loop()
+
+            server = await monitor.start_control_server()
+            try:
+                await monitor.monitor_loop()
+            finally:
+                if server:
+                    server.close()
+                    if CONTROL_SOCKET.exists():
+                        CONTROL_SOCKET.unlink()
             
         except Exception as e:
-            Logger.error(f"Fatal error: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"Fatal error: {e}")
             sys.exit(1)
 
 
@@ -404,12 +628,7 @@ if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        Logger.info("\n")
-        Logger.separator()
-        Logger.info("Monitor stopped by user")
-        Logger.separator()
+        log.info("Monitor stopped by user")
     except Exception as e:
-        Logger.error(f"\nUnexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"Unexpected error: {e}")
         sys.exit(1)
\ No newline at end of file
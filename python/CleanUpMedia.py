@@ -1,40 +1,68 @@
 #!/usr/bin/env python3
 import os
-import re
+import sys
 import time
-import logging
-import schedule
+import heapq
+import signal
+import argparse
+import sqlite3
+
+from blink_common import parse_media_name
+from clip_processing import display_paths
+from media_catalog import MediaCatalog, announce_media
+from io_scheduler import CLEANUP, scheduler
+from structured_logging import get_logger, setup_logging
+from metrics import Counter, Gauge, start_exporter
+
+log = get_logger("cleanup")
 
 MEDIA_DIR = os.path.join(os.path.dirname(__file__), "media")
-LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
-LOG_FILE = os.path.join(LOG_DIR, "blink_cleanup.log")
 
 # Keep this many hours of history per camera/type
 MAX_HOURS_TO_KEEP = 2  # 72 adjust as needed
 
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+# Byte budgets (0 = no limit). Past a budget the oldest kept files go
+# first, but the newest image and video of each camera are never deleted
+MAX_TOTAL_MB = 0       # Everything in media/
+MAX_CAMERA_MB = 0      # Each camera
 
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
+# Delete in batches with a pause in between, so a large backlog doesn't
+# saturate the SD card while the mirror is drawing
+DELETE_BATCH_SIZE = 200
+DELETE_PAUSE = 0.05  # seconds
 
-def parse_filename(filename):
-    """
-    Expect: CameraName_YYYYMMDD_HHMMSS.ext
-    Supports: jpg, jpeg, mp4
-    """
-    match = re.match(r'^(.+?)_(\d{8})_(\d{2})(\d{2})(\d{2})\.(jpg|jpeg|mp4)$', filename, re.I)
-    if not match:
+# Log each deleted file up to this many per run, then only the totals
+LOG_EACH_LIMIT = 100
+
+# Each run picks up files the catalog missed by name; rescan media/ fully
+# (sizes included) this often
+CATALOG_RESCAN_INTERVAL = 24 * 3600
+
+# Watch mode (--watch): clean up when files arrive or free space runs low
+WATCH_INTERVAL = 2          # seconds between checks of media/ and free space
+CLEANUP_DEBOUNCE = 10       # run once media/ has been quiet this long...
+CLEANUP_MAX_DELAY = 120     # ...or this long after the first new file
+MIN_FREE_MB = 500           # below this, clean up now and trim to make room
+PRESSURE_RETRY_INTERVAL = 60  # seconds between low-space cleanups
+
+# Metrics (see metrics.py)
+CLEANUP_RUNS = Counter("pictureverse_cleanup_runs_total", "Media cleanup runs")
+FILES_DELETED = Counter("pictureverse_cleanup_files_deleted_total", "Blink media files deleted by cleanup")
+BYTES_DELETED = Counter("pictureverse_cleanup_bytes_deleted_total", "Bytes of Blink media deleted by cleanup")
+
+
+def media_bytes():
+    """Size of the Blink captures in media/, from the catalog rather than a disk scan"""
+    try:
+        with MediaCatalog() as catalog:
+            return catalog.total_size("media")
+    except sqlite3.Error:
         return None
-    camera, ymd, HH, MM, SS, ext = match.groups()
-    hour_key = f"{ymd}_{HH}"
-    ts_key = f"{ymd}_{HH}{MM}{SS}"
-    ext = ext.lower()
-    kind = "video" if ext == "mp4" else "image"
-    return camera, hour_key, ts_key, kind
+
+
+# Only cleanup (and the service, which runs it) reports this
+MEDIA_BYTES = Gauge("pictureverse_media_dir_bytes", "Bytes of Blink captures in python/media", media_bytes)
+
 
 def format_file_size(size_bytes):
     for unit in ["B", "KB", "MB", "GB"]:
@@ -43,70 +71,322 @@ def format_file_size(size_bytes):
         size_bytes /= 1024
     return f"{size_bytes:.1f}TB"
 
-def cleanup_blink_media():
-    logging.info("Starting Blink media cleanup...")
+def scan_media():
+    """(name, camera, taken, kind, size) for every Blink file, read with os.scandir"""
+    with os.scandir(MEDIA_DIR) as entries:
+        for entry in entries:
+            parts = parse_media_name(entry.name)
+            if parts and entry.is_file():
+                camera, taken, kind = parts
+                yield entry.name, camera, taken, kind, entry.stat().st_size
 
-    if not os.path.exists(MEDIA_DIR):
-        logging.warning(f"Media directory not found: {MEDIA_DIR}")
-        return False
+def plan_retention(files, hours=MAX_HOURS_TO_KEEP, max_total_bytes=0, max_camera_bytes=0):
+    """
+    Decide what to delete in one pass over (name, camera, taken, kind, size).
+    For each camera/kind only the newest file of each of its newest `hours`
+    hours is kept: a min-heap of those hour keys means each file is either
+    kept, replaces the file it beats, or is rejected straight away, without
+    sorting the whole folder. Byte budgets are then applied to the few
+    files that are left.
+
+    Returns (keep, delete): keep is a list of (name, camera, taken, kind, size),
+    delete a list of (name, size, reason).
+    """
+    hour_heaps = {}  # (camera, kind) -> min-heap of the newest hour keys
+    kept = {}  # (camera, kind, hour_key) -> newest file in that hour
+    delete = []
 
-    files = [f for f in os.listdir(MEDIA_DIR) if re.search(r'\.(jpg|jpeg|mp4)$', f, re.I)]
-    logging.info(f"Found {len(files)} media files to analyze for cleanup")
+    for item in files:
+        name, camera, taken, kind, size = item
+        hour_key = taken[:11]
+        group = (camera, kind)
+        bucket = (camera, kind, hour_key)
 
-    buckets = {}  # key: (camera, hour_key, kind) → list of (filename, ts_key, full_path, size)
-    for f in files:
-        parts = parse_filename(f)
-        if not parts:
-            logging.warning(f"Skipping non-matching file: {f}")
+        current = kept.get(bucket)
+        if current is not None:
+            # Hour already kept: keep only its newest file
+            if taken > current[2]:
+                kept[bucket] = item
+                delete.append((current[0], current[4], "older in hour"))
+            else:
+                delete.append((name, size, "older in hour"))
             continue
-        camera, hour_key, ts_key, kind = parts
-        full = os.path.join(MEDIA_DIR, f)
-        try:
-            size = os.path.getsize(full)
-        except Exception as e:
-            logging.error(f"Error stat'ing {f}: {e}")
+
+        heap = hour_heaps.setdefault(group, [])
+        if len(heap) < hours:
+            heapq.heappush(heap, hour_key)
+        elif heap and hour_key > heap[0]:
+            # Newer than the oldest kept hour, which drops out of retention
+            evicted = kept.pop((camera, kind, heapq.heapreplace(heap, hour_key)))
+            delete.append((evicted[0], evicted[4], "beyond retention"))
+        else:
+            delete.append((name, size, "beyond retention"))
             continue
-        buckets.setdefault((camera, hour_key, kind), []).append((f, ts_key, full, size))
+        kept[bucket] = item
 
-    deleted = 0
-    kept = 0
-    kept_by_camera_kind = {}
+    keep = sorted(kept.values(), key=lambda f: f[2], reverse=True)  # newest first
 
-    # Deduplicate within each hour bucket
-    for key, items in buckets.items():
-        camera, hour_key, kind = key
-        items.sort(key=lambda x: x[1], reverse=True)  # newest ts_key first
-        newest = items[0]
-        kept += 1
-        kept_by_camera_kind.setdefault((camera, kind), []).append((hour_key, newest[0], newest[2]))
+    if max_camera_bytes or max_total_bytes:
+        # The newest image and video of each camera are never over budget
+        protected = set()
+        seen = set()
+        for name, camera, taken, kind, size in keep:
+            if (camera, kind) not in seen:
+                seen.add((camera, kind))
+                protected.add(name)
 
-        for stale in items[1:]:
-            try:
-                os.remove(stale[2])
-                logging.info(f"Deleted older {kind}: {stale[0]} ({format_file_size(stale[3])})")
-                deleted += 1
-            except Exception as e:
-                logging.error(f"Error deleting {stale[0]}: {e}")
+        camera_bytes = {}
+        total_bytes = 0
+        within = []
+        for item in keep:
+            name, camera, taken, kind, size = item
+            used = camera_bytes.get(camera, 0) + size
+            if name not in protected and (
+                (max_camera_bytes and used > max_camera_bytes)
+                or (max_total_bytes and total_bytes + size > max_total_bytes)
+            ):
+                delete.append((name, size, "over byte budget"))
+                continue
+            camera_bytes[camera] = used
+            total_bytes += size
+            within.append(item)
+        keep = within
 
-    # Enforce retention per camera/kind
-    for (camera, kind), entries in kept_by_camera_kind.items():
-        entries.sort(key=lambda x: x[0], reverse=True)  # newest hour first
-        for old in entries[MAX_HOURS_TO_KEEP:]:
+    return keep, delete
+
+def delete_files(names, batch_size=None, pause=None):
+    """
+    Delete names from MEDIA_DIR in batches, with the display copy and poster
+    of clips; returns the names that are now gone. A batch doesn't start
+    while anything with a higher I/O priority is running (see io_scheduler.py).
+    """
+    batch_size = batch_size or DELETE_BATCH_SIZE
+    pause = DELETE_PAUSE if pause is None else pause
+    removed = []
+    with scheduler.transfer(CLEANUP):
+        for i, name in enumerate(names):
+            if i and i % batch_size == 0 and pause:
+                time.sleep(pause)
+            if i % batch_size == 0:
+                scheduler.wait_turn(CLEANUP)
             try:
-                os.remove(old[2])
-                logging.info(f"Deleted old {kind} (beyond retention): {old[1]}")
-                deleted += 1
+                os.remove(os.path.join(MEDIA_DIR, name))
+                removed.append(name)
+            except FileNotFoundError:
+                removed.append(name)
             except Exception as e:
-                logging.error(f"Error deleting {old[1]}: {e}")
+                log.error(f"Error deleting {name}: {e}")
+                continue
+
+            if name.lower().endswith(".mp4"):
+                for derived in display_paths(os.path.join(MEDIA_DIR, name)):
+                    try:
+                        os.remove(derived)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        log.error(f"Error deleting {derived}: {e}")
+    return removed
+
+def cleanup_blink_media(dry_run=False, hours=None, max_total_bytes=None, max_camera_bytes=None,
+                        free_bytes_needed=0):
+    """
+    Apply the retention policy to media/. With dry_run, print what would be
+    deleted instead of deleting it. Policy arguments default to the
+    constants at the top of this file. If the policy frees less than
+    free_bytes_needed, the oldest kept files go too until it would.
+    """
+    hours = MAX_HOURS_TO_KEEP if hours is None else hours
+    max_total_bytes = MAX_TOTAL_MB * 1024 * 1024 if max_total_bytes is None else max_total_bytes
+    max_camera_bytes = MAX_CAMERA_MB * 1024 * 1024 if max_camera_bytes is None else max_camera_bytes
+
+    log.info("Starting Blink media cleanup...")
+
+    if not os.path.exists(MEDIA_DIR):
+        log.warning(f"Media directory not found: {MEDIA_DIR}")
+        return False
+
+    # Names, sizes and timestamps come from the media catalog (it rebuilds
+    # itself from disk if missing); scan the folder if it can't be opened
+    catalog = None
+    try:
+        catalog = MediaCatalog()
+        if not catalog.rebuild_if_stale("media", CATALOG_RESCAN_INTERVAL):
+            catalog.sync("media")
+        files = catalog.blink_media()
+    except sqlite3.Error as e:
+        log.error(f"Could not read media catalog, scanning {MEDIA_DIR}: {e}")
+        if catalog:
+            catalog.close()
+            catalog = None
+        files = list(scan_media())
 
-    logging.info(f"Cleanup complete: kept {kept} hourly files, deleted {deleted}")
+    keep, delete = plan_retention(files, hours, max_total_bytes, max_camera_bytes)
+    freed = sum(size for name, size, reason in delete)
+
+    if free_bytes_needed > freed:
+        # Tighten the total budget by the shortfall
+        budget = max(1, sum(item[4] for item in keep) - (free_bytes_needed - freed))
+        if not max_total_bytes or budget < max_total_bytes:
+            keep, delete = plan_retention(files, hours, budget, max_camera_bytes)
+            freed = sum(size for name, size, reason in delete)
+
+    if dry_run:
+        for name, size, reason in delete:
+            print(f"  would delete {name} ({format_file_size(size)}, {reason})")
+        print(f"[OK] Dry run: would keep {len(keep)} files, "
+              f"delete {len(delete)} and free {format_file_size(freed)}")
+        if catalog:
+            catalog.close()
+        return True
+
+    for name, size, reason in delete[:LOG_EACH_LIMIT]:
+        log.info(f"Deleting {name} ({format_file_size(size)}, {reason})")
+    if len(delete) > LOG_EACH_LIMIT:
+        log.info(f"Deleting {len(delete) - LOG_EACH_LIMIT} more files")
+    removed = delete_files([name for name, size, reason in delete])
+
+    if catalog:
+        try:
+            catalog.remove("media", removed)
+            catalog.export_index(("media",))
+        except (sqlite3.Error, OSError) as e:
+            log.error(f"Could not update media catalog: {e}")
+        finally:
+            catalog.close()
+    announce_media(removed=removed)
+
+    removed_names = set(removed)
+    freed = sum(size for name, size, reason in delete if name in removed_names)
+    CLEANUP_RUNS.inc()
+    FILES_DELETED.inc(len(removed))
+    BYTES_DELETED.inc(freed)
+
+    log.info(f"Cleanup complete: kept {len(keep)} files, deleted {len(removed)} "
+             f"({format_file_size(freed)})")
     return True
 
+def free_bytes():
+    """Space available on the filesystem holding media/"""
+    path = MEDIA_DIR if os.path.exists(MEDIA_DIR) else os.path.dirname(MEDIA_DIR)
+    stat = os.statvfs(path)
+    return stat.f_bavail * stat.f_frsize
+
+def media_signature():
+    """Changes whenever a file is added to or removed from media/"""
+    try:
+        return os.stat(MEDIA_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+class CleanupTrigger:
+    """
+    Decides when watch mode cleans up: once media/ has been quiet for
+    CLEANUP_DEBOUNCE seconds (or CLEANUP_MAX_DELAY after the first change),
+    when free space drops below MIN_FREE_MB, or when a run was requested.
+    Each check is one stat of the folder and one statvfs.
+    """
+
+    def __init__(self):
+        self.requested = False
+        self.seen = media_signature()
+        self.first_change = self.last_change = None
+        self.last_pressure_run = None
+
+    def check(self):
+        """(reason, bytes to free) if a cleanup is due now, otherwise None"""
+        now = time.monotonic()
+
+        signature = media_signature()
+        if signature != self.seen:
+            self.seen = signature
+            self.last_change = now
+            self.first_change = self.first_change or now
+
+        try:
+            needed = MIN_FREE_MB * 1024 * 1024 - free_bytes()
+        except OSError as e:
+            log.error(f"Could not check free space: {e}")
+            needed = 0
+
+        if self.requested:
+            reason = "requested"
+        elif needed > 0 and (self.last_pressure_run is None
+                             or now - self.last_pressure_run >= PRESSURE_RETRY_INTERVAL):
+            reason = f"low disk space ({format_file_size(MIN_FREE_MB * 1024 * 1024 - needed)} free)"
+            self.last_pressure_run = now
+        elif self.last_change and (now - self.last_change >= CLEANUP_DEBOUNCE
+                                   or now - self.first_change >= CLEANUP_MAX_DELAY):
+            reason = "new files"
+        else:
+            return None
+
+        log.info(f"Cleanup triggered: {reason}")
+        self.requested = False
+        return reason, max(0, needed)
+
+    def done(self):
+        """After a cleanup: our own deletes changed the folder, don't treat them as new files"""
+        self.seen = media_signature()
+        self.first_change = self.last_change = None
+
+def watch_media(**policy):
+    """
+    Clean up when media/ changes or free space runs low (see
+    CleanupTrigger) instead of on a clock, checking every WATCH_INTERVAL.
+    SIGUSR1 asks for a cleanup right away.
+    """
+    trigger = CleanupTrigger()
+    signal.signal(signal.SIGUSR1, lambda signum, frame: setattr(trigger, "requested", True))
+
+    log.info(f"Blink media cleanup watching {MEDIA_DIR} "
+                 f"(debounce {CLEANUP_DEBOUNCE}s, min free {MIN_FREE_MB}MB)")
+    cleanup_blink_media(**policy)
+    trigger.done()
+
+    while True:
+        time.sleep(WATCH_INTERVAL)
+        due = trigger.check()
+        if due:
+            cleanup_blink_media(free_bytes_needed=due[1], **policy)
+            trigger.done()
+
 def main():
-    cleanup_blink_media()
+    parser = argparse.ArgumentParser(description="Apply the Blink media retention policy to media/")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Report what would be deleted, then exit")
+    parser.add_argument("--once", action="store_true", help="Clean up once instead of every hour")
+    parser.add_argument("--watch", action="store_true",
+                        help="Clean up when new files arrive or disk space runs low, instead of every hour")
+    parser.add_argument("--hours", type=int, help=f"Hours to keep per camera/type (default {MAX_HOURS_TO_KEEP})")
+    parser.add_argument("--max-total-mb", type=float, help="Byte budget for all of media/, in MB")
+    parser.add_argument("--max-camera-mb", type=float, help="Byte budget per camera, in MB")
+    args = parser.parse_args()
+    setup_logging("blink_cleanup")
+    if not args.dry_run:
+        start_exporter("blink_cleanup")
+
+    policy = {
+        "hours": args.hours,
+        "max_total_bytes": None if args.max_total_mb is None else int(args.max_total_mb * 1024 * 1024),
+        "max_camera_bytes": None if args.max_camera_mb is None else int(args.max_camera_mb * 1024 * 1024),
+    }
+
+    if args.dry_run or args.once:
+        sys.exit(0 if cleanup_blink_media(dry_run=args.dry_run, **policy) else 1)
+
+    if args.watch:
+        watch_media(**policy)
+        return
+
+    # Only the hourly mode needs schedule; the service and --watch import
+    # this module without it
+    import schedule
+
+    cleanup_blink_media(**policy)
     # Schedule every hour at :45
-    schedule.every().hour.at(":45").do(cleanup_blink_media)
-    logging.info("Blink media cleanup scheduler started (every hour at :45)")
+    schedule.every().hour.at(":45").do(cleanup_blink_media, **policy)
+    log.info("Blink media cleanup scheduler started (every hour at :45)")
     while True:
         schedule.run_pending()
         time.sleep(30)
@@ -1,100 +1,123 @@
 """
-Dropbox sync module - DIAGNOSTIC VERSION
-This version has extra error logging to help identify the issue
+Dropbox sync module: mirrors the configured Dropbox folder into Pictures/,
+once (python Dropbox.py) or continuously (python Dropbox.py --daemon).
+Logs to logs/dropbox_sync.jsonl (see structured_logging.py).
 """
 
 import os
 import json
 import sys
 import time
+import base64
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Print diagnostic info first
-print("=" * 60)
-print("DROPBOX DIAGNOSTIC VERSION")
-print("=" * 60)
-print(f"Python version: {sys.version}")
-print(f"Current directory: {os.getcwd()}")
-print(f"Script location: {os.path.abspath(__file__)}")
+from structured_logging import get_logger, setup_logging
+
+log = get_logger("dropbox")
 
-# Try to import Dropbox modules
 try:
-    print("\nTrying to import dropbox module...")
-    from dropbox.exceptions import ApiError, AuthError
-    print("[OK] dropbox module imported successfully")
+    from dropbox.exceptions import ApiError, AuthError, RateLimitError
+    from dropbox.files import (
+        FileMetadata,
+        DeletedMetadata,
+        ListFolderContinueError,
+        ThumbnailArg,
+        ThumbnailFormat,
+        ThumbnailMode,
+        ThumbnailSize,
+    )
 except ImportError as e:
-    print(f"[ERROR] Failed to import dropbox module: {e}")
-    print("Run: pip install dropbox --break-system-packages")
+    log.error(f"Failed to import dropbox module: {e}. Run: pip install dropbox --break-system-packages")
     sys.exit(1)
 
 try:
-    print("Trying to import DropboxOAuth...")
-    from DropboxOAuth import get_dropbox_client
-    print("[OK] DropboxOAuth imported successfully")
+    from DropboxOAuth import get_dropbox_client, reset_dropbox_client
 except ImportError as e:
-    print(f"[ERROR] Failed to import DropboxOAuth: {e}")
-    print(f"Make sure DropboxOAuth.py exists in: {os.path.dirname(__file__)}")
+    log.error(f"Failed to import DropboxOAuth: {e}. Make sure DropboxOAuth.py exists in: {os.path.dirname(__file__)}")
     sys.exit(1)
 
-# Define paths
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-CONFIG_FILE = os.path.join(SCRIPT_DIR, "dropbox_config.json")
-LOCAL_FOLDER = os.path.join(SCRIPT_DIR, "Pictures")
+from dropbox_common import (
+    CONFIG_FILE,
+    CURSOR_FILE,
+    MANIFEST_FILE,
+    LOCAL_FOLDER,
+    ContentHasher,
+    Manifest,
+    write_json_atomic,
+)
+from renditions import update_renditions
+from io_scheduler import SYNC, scheduler
+from media_catalog import PHOTO_INDEX_FILE, record_media
+from metrics import Counter, Histogram, start_exporter
+
+# Downloads are streamed to "<name>.part" in chunks of this size and renamed
+# into place when complete, so memory use stays flat and the Pictures watcher
+# in node_helper.js never sees a half-written photo
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = ".part"
+
+# sync_mode "display" stores Dropbox-generated thumbnails instead of originals
+SYNC_MODES = ["two-way", "download-only", "display"]
+THUMBNAIL_BATCH_SIZE = 25  # Most files_get_thumbnail_batch accepts per call
+DEFAULT_THUMBNAIL_SIZE = "w2048h1536"
 
-print(f"\nPaths:")
-print(f"  Config file: {CONFIG_FILE}")
-print(f"  Local folder: {LOCAL_FOLDER}")
-print(f"  Config exists: {os.path.exists(CONFIG_FILE)}")
-print(f"  Local folder exists: {os.path.exists(LOCAL_FOLDER)}")
+# Daemon mode (python Dropbox.py --daemon)
+LONGPOLL_TIMEOUT = 300  # Dropbox adds up to 90s of jitter on top of this
+DAEMON_RETRY_DELAY = 60  # Wait after a failed sync or longpoll
+MAX_DAEMON_RETRY_DELAY = 15 * 60  # Longest wait while downloads keep failing
+
+# Metrics (see metrics.py)
+SYNCS = Counter("pictureverse_dropbox_syncs_total", "Dropbox syncs by result", ["result"])
+FILES_DOWNLOADED = Counter("pictureverse_dropbox_files_downloaded_total", "Photos downloaded from Dropbox")
+BYTES_DOWNLOADED = Counter("pictureverse_dropbox_bytes_downloaded_total", "Bytes downloaded from Dropbox")
+FILES_FAILED = Counter("pictureverse_dropbox_files_failed_total", "Photos that failed to download")
+FILES_REMOVED = Counter("pictureverse_dropbox_files_removed_total", "Local photos removed because they left Dropbox")
+RETRIES = Counter("pictureverse_dropbox_retries_total", "Dropbox requests retried after a rate limit")
+LIST_SECONDS = Histogram("pictureverse_dropbox_list_seconds", "Time to list the changes in the Dropbox folder")
 
 def load_config():
     """Load configuration from file"""
-    print(f"\n[STEP 1] Loading config from: {CONFIG_FILE}")
-    
     if not os.path.exists(CONFIG_FILE):
-        print(f"[ERROR] Config file not found at {CONFIG_FILE}")
+        log.error(f"Config file not found at {CONFIG_FILE}")
         raise FileNotFoundError("Please create dropbox_config.json from dropbox_config_template.json")
     
     try:
         with open(CONFIG_FILE, "r") as f:
             config = json.load(f)
-            
-        print(f"[OK] Config loaded successfully")
         
         dropbox_folder = config.get("dropbox_folder", "")
         if not dropbox_folder:
-            print("[WARNING] dropbox_folder is not specified in config")
-        else:
-            print(f"  Dropbox folder: {dropbox_folder}")
+            log.warning("dropbox_folder is not specified in config")
         
         # Check sync mode
         sync_mode = config.get("sync_mode", "two-way")
-        if sync_mode not in ["two-way", "download-only"]:
-            print(f"[WARNING] Invalid sync_mode '{sync_mode}', using 'two-way'")
+        if sync_mode not in SYNC_MODES:
+            log.warning(f"Invalid sync_mode '{sync_mode}', using 'two-way'")
             sync_mode = "two-way"
-        print(f"  Sync mode: {sync_mode}")
+        thumbnail_size = get_thumbnail_size(config) if sync_mode == "display" else None
         
-        # Check rate limiting
-        rate_limit_delay = config.get("rate_limit_delay", 0.5)
-        print(f"  Rate limit delay: {rate_limit_delay}s")
+        # Check download concurrency and rate limiting
+        max_concurrent = get_max_concurrent_downloads(config)
+        requests_per_second = get_requests_per_second(config)
+        log.debug(f"Config loaded from {CONFIG_FILE}: folder '{dropbox_folder}', {sync_mode} sync"
+                  + (f" ({thumbnail_size} thumbnails)" if thumbnail_size else "")
+                  + f", {max_concurrent} worker(s), {requests_per_second or 'unlimited'} requests/s")
             
         return config
     except json.JSONDecodeError as e:
-        print(f"[ERROR] Invalid JSON in config file: {e}")
+        log.error(f"Invalid JSON in config file: {e}")
         raise
     except Exception as e:
-        print(f"[ERROR] Error loading config: {e}")
+        log.error(f"Error loading config: {e}")
         raise
 
 def ensure_local_folder():
     """Ensure local Pictures folder exists and is writable"""
-    print(f"\n[STEP 2] Checking local folder: {LOCAL_FOLDER}")
-    
     if not os.path.exists(LOCAL_FOLDER):
-        print(f"  Creating local folder...")
         os.makedirs(LOCAL_FOLDER)
-        print(f"  [OK] Folder created")
-    else:
-        print(f"  [OK] Folder exists")
+        log.info(f"Created local folder {LOCAL_FOLDER}")
     
     # Test write access
     try:
@@ -102,21 +125,469 @@ def ensure_local_folder():
         with open(test_file, "w") as f:
             f.write("test")
         os.remove(test_file)
-        print(f"  [OK] Folder is writable")
         return True
     except Exception as e:
-        print(f"  [ERROR] Folder not writable: {e}")
+        log.error(f"Local folder {LOCAL_FOLDER} not writable: {e}")
         return False
 
-def download_images():
+def load_cursor(dropbox_folder):
+    """
+    Load the saved list_folder cursor for this Dropbox folder
+    Returns None if there is no usable cursor
+    """
+    if not os.path.exists(CURSOR_FILE):
+        return None
+
+    try:
+        with open(CURSOR_FILE, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not read cursor file, doing a full listing: {e}")
+        return None
+
+    # A cursor is tied to the folder it was created for
+    if state.get("dropbox_folder") != dropbox_folder:
+        log.info("Saved cursor belongs to a different folder, doing a full listing")
+        return None
+
+    return state.get("cursor")
+
+def save_cursor(dropbox_folder, cursor):
+    """Persist the list_folder cursor so the next run only asks for changes"""
+    try:
+        write_json_atomic(CURSOR_FILE, {"dropbox_folder": dropbox_folder, "cursor": cursor})
+    except OSError as e:
+        log.warning(f"Could not save cursor: {e}")
+
+def removes_local_files(sync_mode):
+    """two-way and display mirror the Dropbox folder; download-only never deletes"""
+    return sync_mode in ("two-way", "display")
+
+def get_thumbnail_size(config):
+    """Thumbnail size for display mode, one of Dropbox's ThumbnailSize names"""
+    size = config.get("thumbnail_size", DEFAULT_THUMBNAIL_SIZE)
+    if not hasattr(ThumbnailSize, size) or size.startswith("_"):
+        log.warning(f"Invalid thumbnail_size '{size}', using {DEFAULT_THUMBNAIL_SIZE}")
+        return DEFAULT_THUMBNAIL_SIZE
+    return size
+
+def wants_thumbnail(filename, thumbnail_size):
+    """GIFs are always downloaded in full so they keep their animation"""
+    return bool(thumbnail_size) and not filename.lower().endswith(".gif")
+
+def is_allowed_file(filename, allowed_extensions):
+    """Check whether a filename has one of the allowed image extensions"""
+    return any(filename.lower().endswith(ext) for ext in allowed_extensions)
+
+def list_folder_changes(dbx, dropbox_folder, allowed_extensions, use_cursor=True):
+    """
+    List what changed in the Dropbox folder since the last successful run.
+
+    With a saved cursor this is a single files_list_folder_continue call when
+    nothing changed. Without one (first run, folder changed, or Dropbox reset
+    the cursor) it falls back to a full files_list_folder listing.
+
+    Returns (files, deleted, cursor, full_listing):
+      files        - {name: FileMetadata} for added/changed image files
+      deleted      - set of names removed from Dropbox (incremental runs only)
+      cursor       - cursor to save once the changes have been applied
+      full_listing - True if files holds the complete folder contents
+    """
+    result = None
+    cursor = load_cursor(dropbox_folder) if use_cursor else None
+
+    if cursor:
+        try:
+            log.debug("Checking for changes since last sync")
+            result = dbx.files_list_folder_continue(cursor)
+        except ApiError as e:
+            if isinstance(e.error, ListFolderContinueError) and e.error.is_reset():
+                log.warning("Dropbox reset the cursor, doing a full listing")
+            else:
+                raise
+
+    full_listing = result is None
+    if full_listing:
+        log.debug("Doing a full folder listing")
+        result = dbx.files_list_folder(dropbox_folder)
+
+    files = {}
+    deleted = set()
+
+    while True:
+        # Apply entries in order so a delete followed by a re-add (or the
+        # reverse) ends up in the right state
+        for entry in result.entries:
+            if isinstance(entry, FileMetadata):
+                if is_allowed_file(entry.name, allowed_extensions):
+                    files[entry.name] = entry
+                    deleted.discard(entry.name)
+            elif isinstance(entry, DeletedMetadata):
+                files.pop(entry.name, None)
+                deleted.add(entry.name)
+
+        if not result.has_more:
+            break
+
+        result = dbx.files_list_folder_continue(result.cursor)
+        log.debug(f"Found {len(files)} image files so far (after paging)")
+
+    return files, deleted, result.cursor, full_listing
+
+def get_max_concurrent_downloads(config):
+    """Number of download workers, from max_concurrent_downloads (default 4)"""
+    try:
+        return max(1, int(config.get("max_concurrent_downloads", 4)))
+    except (TypeError, ValueError):
+        log.warning("Invalid max_concurrent_downloads, using 4")
+        return 4
+
+def get_requests_per_second(config):
+    """
+    Download request rate for the token bucket (0 means unlimited).
+    Uses max_requests_per_second if set, otherwise falls back to the older
+    rate_limit_delay setting (one request every rate_limit_delay seconds).
+    """
+    if "max_requests_per_second" in config:
+        return max(0.0, float(config["max_requests_per_second"]))
+
+    rate_limit_delay = float(config.get("rate_limit_delay", 0.5))
+    return 1.0 / rate_limit_delay if rate_limit_delay > 0 else 0.0
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by the download workers.
+
+    Each request takes one token; tokens refill at `rate` per second up to
+    `burst`. When Dropbox answers with a rate limit error, backoff() pauses
+    every worker for the retry_after period and halves the rate, which then
+    recovers a little with each successful request.
+    """
+
+    MIN_RATE = 0.2  # Never throttle below one request every 5 seconds
+    DEFAULT_BACKOFF = 5  # Used when Dropbox doesn't send retry_after
+
+    def __init__(self, rate, burst=1):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.paused_until = 0.0
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request is allowed"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif not self.rate:
+                    return
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+                    self.last_refill = now
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def backoff(self, retry_after=None):
+        """Pause all workers and slow down after a rate limit response"""
+        delay = retry_after if retry_after else self.DEFAULT_BACKOFF
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            # An unlimited bucket starts limiting once Dropbox pushes back
+            current = self.rate or self.burst
+            self.rate = max(self.MIN_RATE, current / 2)
+            self.tokens = 0.0
+        return delay
+
+    def success(self):
+        """Let the rate creep back up after a successful request"""
+        with self.lock:
+            if self.max_rate and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate * 1.1)
+            elif not self.max_rate and self.rate:
+                self.rate = self.rate * 1.1
+                if self.rate >= self.burst * 10:
+                    self.rate = 0.0  # Back to unlimited
+
+def remove_stale_parts():
+    """Remove .part files left behind by an interrupted run"""
+    for filename in os.listdir(LOCAL_FOLDER):
+        if filename.endswith(PART_SUFFIX):
+            try:
+                os.remove(os.path.join(LOCAL_FOLDER, filename))
+                log.info(f"Removed incomplete download: {filename}")
+            except OSError as e:
+                log.warning(f"Could not remove {filename}: {e}")
+
+def stream_to_file(response, local_path, expected_hash=None):
+    """
+    Stream an HTTP response body to local_path via a .part temp file,
+    then atomically rename it into place
+    Returns (bytes written, Dropbox content hash of the data)
+    """
+    part_path = local_path + PART_SUFFIX
+    hasher = ContentHasher()
+    size = 0
+
+    try:
+        with open(part_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    # Slow down while a motion capture is downloading
+                    scheduler.throttle(SYNC, len(chunk))
+
+        content_hash = hasher.hexdigest()
+
+        if size == 0:
+            os.remove(part_path)
+            return 0, content_hash
+
+        if expected_hash and content_hash != expected_hash:
+            raise ValueError("Content hash mismatch, download was corrupted")
+
+        os.replace(part_path, local_path)
+        return size, content_hash
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    finally:
+        response.close()
+
+def write_file_atomic(local_path, data):
+    """
+    Write bytes to local_path via a .part temp file and rename it into place
+    Returns the Dropbox content hash of the data
+    """
+    part_path = local_path + PART_SUFFIX
+    hasher = ContentHasher()
+    hasher.update(data)
+
+    try:
+        with open(part_path, "wb") as f:
+            f.write(data)
+        os.replace(part_path, local_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    return hasher.hexdigest()
+
+def download_file(dbx, entry, local_path, bucket, max_attempts=5):
+    """
+    Download a single Dropbox file, waiting on the shared token bucket
+    before each request and backing off on rate limit errors. Doesn't start
+    while Blink captures are downloading (see io_scheduler.py).
+    Returns (bytes written, content hash), or (0, None) on failure
+    """
+    filename = os.path.basename(local_path)
+
+    for attempt in range(1, max_attempts + 1):
+        scheduler.wait_turn(SYNC)
+        bucket.acquire()
+        try:
+            with scheduler.transfer(SYNC):
+                metadata, response = dbx.files_download(entry.path_lower)
+                size, content_hash = stream_to_file(response, local_path, entry.content_hash)
+
+        except RateLimitError as e:
+            delay = bucket.backoff(e.backoff)
+            RETRIES.inc()
+            log.warning(f"Rate limited on {filename}, backing off {delay}s (attempt {attempt}/{max_attempts})")
+            continue
+
+        except ApiError as e:
+            log.error(f"{filename}: API error: {e}")
+            return 0, None
+
+        except Exception as e:
+            log.error(f"{filename}: {e}")
+            return 0, None
+
+        bucket.success()
+
+        if size > 0:
+            log.debug(f"Downloaded {filename} ({size:,} bytes)", extra={"file": filename, "size": size})
+            return size, content_hash
+
+        log.error(f"{filename}: Downloaded file was empty")
+        return 0, None
+
+    log.error(f"{filename}: Still rate limited after {max_attempts} attempts")
+    return 0, None
+
+def fetch_thumbnails(dbx, batch, bucket, thumbnail_size, max_attempts=5):
+    """
+    Fetch display-size thumbnails for up to THUMBNAIL_BATCH_SIZE files with
+    a single files_get_thumbnail_batch call and save them under the original
+    file names. Files Dropbox can't make a thumbnail for (e.g. over 20 MB)
+    are downloaded in full instead.
+    Returns a list of (entry, bytes written, content hash, thumbnail size or None)
+    """
+    args = [
+        ThumbnailArg(
+            path=entry.path_lower,
+            format=ThumbnailFormat.png if entry.name.lower().endswith(".png") else ThumbnailFormat.jpeg,
+            size=getattr(ThumbnailSize, thumbnail_size),
+            mode=ThumbnailMode.bestfit,
+        )
+        for entry, local_path in batch
+    ]
+    results = []
+    fallback = []
+
+    for attempt in range(1, max_attempts + 1):
+        scheduler.wait_turn(SYNC)
+        bucket.acquire()
+        try:
+            with scheduler.transfer(SYNC):
+                response = dbx.files_get_thumbnail_batch(args)
+        except RateLimitError as e:
+            delay = bucket.backoff(e.backoff)
+            RETRIES.inc()
+            log.warning(f"Rate limited on thumbnail batch, backing off {delay}s (attempt {attempt}/{max_attempts})")
+            continue
+        except Exception as e:
+            log.error(f"Thumbnail batch failed, downloading originals instead: {e}")
+            fallback = list(batch)
+            break
+
+        bucket.success()
+        for (entry, local_path), item in zip(batch, response.entries):
+            if not item.is_success():
+                log.info(f"{entry.name}: no thumbnail available, downloading original")
+                fallback.append((entry, local_path))
+                continue
+
+            try:
+                data = base64.b64decode(item.get_success().thumbnail)
+                content_hash = write_file_atomic(local_path, data)
+                scheduler.record(SYNC, len(data))
+                log.debug(f"Downloaded {entry.name} (thumbnail, {len(data):,} bytes)",
+                          extra={"file": entry.name, "size": len(data)})
+                results.append((entry, len(data), content_hash, thumbnail_size))
+            except Exception as e:
+                log.error(f"{entry.name}: {e}")
+                results.append((entry, 0, None, None))
+        break
+    else:
+        log.error(f"Thumbnail batch still rate limited after {max_attempts} attempts")
+        results.extend((entry, 0, None, None) for entry, local_path in batch)
+
+    for entry, local_path in fallback:
+        size, content_hash = download_file(dbx, entry, local_path, bucket)
+        results.append((entry, size, content_hash, None))
+
+    return results
+
+def download_batch(dbx, batch, bucket, thumbnail_size=None):
+    """
+    Worker job: fetch one batch of (entry, local_path) pairs, as thumbnails
+    in display mode or as full downloads otherwise
+    Returns a list of (entry, bytes written, content hash, thumbnail size or None)
+    """
+    if thumbnail_size:
+        return fetch_thumbnails(dbx, batch, bucket, thumbnail_size)
+
+    results = []
+    for entry, local_path in batch:
+        size, content_hash = download_file(dbx, entry, local_path, bucket)
+        results.append((entry, size, content_hash, None))
+    return results
+
+def reuse_local_copies(dropbox_files, gone, manifest, sync_mode, changes, thumbnail_size=None):
+    """
+    Compare Dropbox entries with the manifest and the files on disk.
+
+    Files whose local content hash already matches Dropbox (or, in display
+    mode, whose thumbnail was made from the current Dropbox content) are
+    skipped, and a new name whose content already exists locally (a rename
+    or a duplicate) is satisfied by a local rename or copy instead of a
+    download. Renames are only done when the old name is going away and the
+    sync mode removes local files. Thumbnails are small, so they are simply
+    fetched again.
+
+    Local renames and copies are recorded in changes["added"]/["removed"].
+    Returns (entries that still need downloading, counts dict)
+    """
+    to_download = []
+    counts = {"unchanged": 0, "changed": 0, "renamed": 0, "copied": 0}
+
+    for filename, entry in dropbox_files.items():
+        local_path = os.path.join(LOCAL_FOLDER, filename)
+
+        if os.path.exists(local_path):
+            record = manifest.get(filename) or {}
+            if wants_thumbnail(filename, thumbnail_size):
+                up_to_date = (record.get("content_hash") == entry.content_hash
+                              and record.get("thumbnail") == thumbnail_size)
+            else:
+                up_to_date = (not record.get("thumbnail")
+                              and manifest.local_hash(filename) == entry.content_hash)
+
+            if up_to_date:
+                manifest.record(filename, entry)
+                counts["unchanged"] += 1
+                continue
+
+            log.debug(f"Changed in Dropbox: {filename}")
+            counts["changed"] += 1
+            to_download.append((entry, local_path))
+            continue
+
+        source = None if wants_thumbnail(filename, thumbnail_size) else manifest.find_local_copy(entry.content_hash)
+        if source and source != filename:
+            source_path = os.path.join(LOCAL_FOLDER, source)
+            try:
+                if removes_local_files(sync_mode) and source in gone:
+                    os.replace(source_path, local_path)
+                    manifest.rename(source, filename)
+                    log.debug(f"Renamed locally: {source} -> {filename}")
+                    counts["renamed"] += 1
+                    changes["removed"].append(source)
+                else:
+                    shutil.copy2(source_path, local_path)
+                    log.debug(f"Copied locally: {source} -> {filename}")
+                    counts["copied"] += 1
+                manifest.record(filename, entry, entry.content_hash)
+                changes["added"].append(filename)
+                continue
+            except OSError as e:
+                log.warning(f"Local copy of {source} failed, downloading instead: {e}")
+
+        to_download.append((entry, local_path))
+
+    return to_download, counts
+
+def download_images(dbx=None, changes=None):
     """
     Main function to download images from Dropbox to local folder
+    dbx: an existing Dropbox client to reuse (a new one is created if None)
+    changes: optional dict that receives the lists of "added", "modified"
+             and "removed" file names, "restyled" for photos whose
+             rendition appeared or went away (see renditions.py), and the
+             number of "failed" downloads
     Returns True if successful, False otherwise
     """
-    print(f"\n{'=' * 60}")
-    print(f"STARTING DROPBOX SYNC")
-    print(f"Time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"{'=' * 60}")
+    if changes is None:
+        changes = {}
+    changes.update({"added": [], "modified": [], "removed": [], "restyled": [], "failed": 0})
+    succeeded = False
+
+    log.info("Starting Dropbox sync")
     
     try:
         # Load configuration
@@ -124,184 +595,336 @@ def download_images():
         
         # Ensure local folder exists and is writable
         if not ensure_local_folder():
-            print("[ERROR] Local folder is not accessible")
+            log.error("Local folder is not accessible")
             return False
         
         # Get settings from config
         allowed_extensions = config.get("allowed_extensions", [".jpg", ".jpeg", ".png", ".gif"])
         sync_mode = config.get("sync_mode", "two-way")
-        rate_limit_delay = config.get("rate_limit_delay", 0.5)
+        max_concurrent = get_max_concurrent_downloads(config)
+        requests_per_second = get_requests_per_second(config)
         
-        print(f"\n[STEP 3] Connecting to Dropbox...")
-        print(f"  Allowed extensions: {', '.join(allowed_extensions)}")
         
         # Get the Dropbox client with OAuth2
         try:
-            dbx = get_dropbox_client()
+            if dbx is None:
+                dbx = get_dropbox_client()
             if not dbx:
-                print("[ERROR] get_dropbox_client() returned None")
+                log.error("get_dropbox_client() returned None")
                 return False
-            print("[OK] Connected to Dropbox")
         except Exception as e:
-            print(f"[ERROR] Failed to connect to Dropbox: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"Failed to connect to Dropbox: {e}")
             return False
         
         # List files in the Dropbox folder
         dropbox_folder = config.get("dropbox_folder", "")
         
         try:
-            print(f"\n[STEP 4] Listing files in Dropbox folder: {dropbox_folder}")
-            result = dbx.files_list_folder(dropbox_folder)
-            
-            # Filter for files (not folders) and allowed extensions
-            dropbox_files = {}
-            for entry in result.entries:
-                if hasattr(entry, 'name') and hasattr(entry, 'path_lower'):
-                    if any(entry.name.lower().endswith(ext) for ext in allowed_extensions):
-                        dropbox_files[entry.name] = entry
-            
-            print(f"  Found {len(dropbox_files)} image files")
-            
-            # Continue listing if there are more files
-            while result.has_more:
-                result = dbx.files_list_folder_continue(result.cursor)
-                for entry in result.entries:
-                    if hasattr(entry, 'name') and hasattr(entry, 'path_lower'):
-                        if any(entry.name.lower().endswith(ext) for ext in allowed_extensions):
-                            dropbox_files[entry.name] = entry
-                print(f"  Found {len(dropbox_files)} total image files (after paging)")
-            
             # Get list of files in local folder
             local_files = set(os.listdir(LOCAL_FOLDER)) if os.path.exists(LOCAL_FOLDER) else set()
-            print(f"  Local files: {len(local_files)}")
+
+            # If the local folder was wiped, the cursor would hide files we no
+            # longer have, so start over with a full listing
+            has_local_images = any(is_allowed_file(f, allowed_extensions) for f in local_files)
+
+            list_start = time.monotonic()
+            dropbox_files, deleted_files, cursor, full_listing = list_folder_changes(
+                dbx, dropbox_folder, allowed_extensions, use_cursor=has_local_images
+            )
+            LIST_SECONDS.observe(time.monotonic() - list_start)
+
+            if full_listing:
+                log.info(f"Found {len(dropbox_files)} image files in {dropbox_folder}")
+                # Anything local that isn't in the complete listing is gone
+                gone = {
+                    f for f in local_files
+                    if not f.startswith('.') and f not in dropbox_files
+                }
+            else:
+                log.info(f"Changes in {dropbox_folder}: {len(dropbox_files)} added/modified, "
+                         f"{len(deleted_files)} deleted")
+                gone = {f for f in deleted_files if f in local_files}
             
             # Download new files
-            print(f"\n[STEP 5] Downloading new files...")
+            remove_stale_parts()
             files_downloaded = 0
             files_failed = 0
-            
-            for filename, entry in dropbox_files.items():
-                local_path = os.path.join(LOCAL_FOLDER, filename)
-                if not os.path.exists(local_path):
-                    print(f"  Downloading: {filename}")
-                    try:
-                        metadata, response = dbx.files_download(entry.path_lower)
-                        
-                        with open(local_path, "wb") as f:
-                            f.write(response.content)
-                        
-                        if os.path.exists(local_path) and os.path.getsize(local_path) > 0:
+            bytes_downloaded = 0
+
+            manifest = Manifest(MANIFEST_FILE, LOCAL_FOLDER)
+            thumbnail_size = get_thumbnail_size(config) if sync_mode == "display" else None
+            to_download, local_counts = reuse_local_copies(
+                dropbox_files, gone, manifest, sync_mode, changes, thumbnail_size
+            )
+            log.info(f"Unchanged: {local_counts['unchanged']}, changed: {local_counts['changed']}, "
+                     f"renamed locally: {local_counts['renamed']}, copied locally: {local_counts['copied']}; "
+                     f"{len(to_download)} files to download with {max_concurrent} worker(s)")
+
+            # Display mode fetches thumbnails in batches; GIFs and full
+            # downloads go one file per job
+            batches = [[item] for item in to_download if not wants_thumbnail(item[0].name, thumbnail_size)]
+            thumbnail_items = [item for item in to_download if wants_thumbnail(item[0].name, thumbnail_size)]
+            batches.extend(
+                thumbnail_items[i:i + THUMBNAIL_BATCH_SIZE]
+                for i in range(0, len(thumbnail_items), THUMBNAIL_BATCH_SIZE)
+            )
+
+            # Rate limits are handled by the token bucket below, so the pool
+            # client should surface them instead of sleeping inside the SDK
+            download_dbx = dbx.clone(max_retries_on_rate_limit=0)
+            bucket = TokenBucket(requests_per_second, burst=max_concurrent)
+            download_start = time.monotonic()
+
+            with ThreadPoolExecutor(max_workers=max_concurrent) as pool:
+                futures = [
+                    pool.submit(
+                        download_batch, download_dbx, batch, bucket,
+                        thumbnail_size if wants_thumbnail(batch[0][0].name, thumbnail_size) else None
+                    )
+                    for batch in batches
+                ]
+                for future in as_completed(futures):
+                    for entry, size, content_hash, thumbnail in future.result():
+                        if size:
                             files_downloaded += 1
-                            print(f"    [OK] {filename} ({os.path.getsize(local_path):,} bytes)")
+                            bytes_downloaded += size
+                            manifest.record(entry.name, entry, content_hash, thumbnail)
+                            changes["modified" if entry.name in local_files else "added"].append(entry.name)
                         else:
                             files_failed += 1
-                            print(f"    [ERROR] File empty or missing")
-                            if os.path.exists(local_path):
-                                os.remove(local_path)
-                        
-                        if rate_limit_delay > 0:
-                            time.sleep(rate_limit_delay)
-                            
-                    except ApiError as e:
-                        files_failed += 1
-                        print(f"    [ERROR] API error: {e}")
-                        
-                    except Exception as e:
-                        files_failed += 1
-                        print(f"    [ERROR] {e}")
-            
-            print(f"\n  Download summary: {files_downloaded} successful, {files_failed} failed")
+
+            download_seconds = time.monotonic() - download_start
+            FILES_DOWNLOADED.inc(files_downloaded)
+            BYTES_DOWNLOADED.inc(bytes_downloaded)
+            FILES_FAILED.inc(files_failed)
             
             # Handle file removal based on sync mode
             files_removed = 0
-            if sync_mode == "two-way":
-                print(f"\n[STEP 6] Checking for files to remove (two-way sync)...")
-                
-                for local_file in local_files:
-                    if local_file.startswith('.') or not os.path.isfile(os.path.join(LOCAL_FOLDER, local_file)):
+            if removes_local_files(sync_mode):
+                for local_file in gone:
+                    local_path = os.path.join(LOCAL_FOLDER, local_file)
+                    if not os.path.isfile(local_path):
                         continue
-                    
-                    if not any(local_file.lower().endswith(ext) for ext in allowed_extensions):
+
+                    if not is_allowed_file(local_file, allowed_extensions):
                         continue
-                    
-                    if local_file not in dropbox_files:
-                        try:
-                            local_path = os.path.join(LOCAL_FOLDER, local_file)
-                            print(f"  Removing: {local_file}")
-                            os.remove(local_path)
-                            files_removed += 1
-                        except Exception as e:
-                            print(f"    [ERROR] {e}")
-                
-                print(f"  Removed {files_removed} files")
+
+                    try:
+                        log.debug(f"Removing: {local_file}")
+                        os.remove(local_path)
+                        manifest.remove(local_file)
+                        changes["removed"].append(local_file)
+                        files_removed += 1
+                    except Exception as e:
+                        log.error(f"Could not remove {local_file}: {e}")
+                FILES_REMOVED.inc(files_removed)
+
+            # Forget manifest entries for files that are neither in Dropbox nor on disk
+            if full_listing:
+                manifest.prune(set(dropbox_files) | set(os.listdir(LOCAL_FOLDER)))
+            manifest.save()
+
+            # Index the changes for node_helper.js (see media_catalog.py)
+            if changes["added"] or changes["modified"] or changes["removed"] or not PHOTO_INDEX_FILE.exists():
+                record_media("Pictures", changes["added"] + changes["modified"], changes["removed"])
+
+            # Screen-sized copies for the display (see renditions.py); thumbnails
+            # from display mode are already screen-sized
+            if sync_mode != "display":
+                try:
+                    local_images = {f for f in os.listdir(LOCAL_FOLDER) if is_allowed_file(f, allowed_extensions)}
+                    hashes = {name: (manifest.get(name) or {}).get("local_hash") for name in local_images}
+                    restyled = set()
+                    changes["renditions_pending"] = update_renditions(
+                        config, local_images, changes["added"] + changes["modified"], changes["removed"], hashes,
+                        LOCAL_FOLDER, restyled
+                    )
+                    changes["restyled"] = sorted(restyled & local_images)
+                except Exception as e:
+                    log.warning(f"Rendition update failed: {e}")
+
+            # Only advance the cursor once every change has been applied, so
+            # failed downloads are picked up again on the next run
+            changes["failed"] = files_failed
+            if files_failed == 0:
+                save_cursor(dropbox_folder, cursor)
             else:
-                print(f"\n[STEP 6] Skipping file removal (download-only mode)")
+                log.warning(f"Not saving cursor because {files_failed} download(s) failed; they will be retried")
             
             # Final verification
             final_files = os.listdir(LOCAL_FOLDER) if os.path.exists(LOCAL_FOLDER) else []
-            image_files = [f for f in final_files if any(f.lower().endswith(ext) for ext in allowed_extensions)]
+            image_files = [f for f in final_files if is_allowed_file(f, allowed_extensions)]
             
-            print(f"\n{'=' * 60}")
-            print(f"SYNC COMPLETE")
-            print(f"Time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"{'=' * 60}")
-            print(f"Summary:")
-            print(f"  - Downloaded: {files_downloaded} files")
-            print(f"  - Failed: {files_failed} files")
-            print(f"  - Removed: {files_removed} files")
-            print(f"  - Final count: {len(image_files)} images in local folder")
-            print(f"{'=' * 60}")
+            summary = {"downloaded": files_downloaded, "failed": files_failed, "removed": files_removed,
+                       "bytes": bytes_downloaded, "images": len(image_files)}
+            throughput = ""
+            if files_downloaded and download_seconds > 0:
+                summary["download_seconds"] = round(download_seconds, 1)
+                throughput = (f" ({files_downloaded / download_seconds:.2f} files/s, "
+                              f"{bytes_downloaded / download_seconds / (1024 * 1024):.2f} MB/s)")
+            log.info(f"Sync complete: {files_downloaded} downloaded, {files_failed} failed, "
+                     f"{files_removed} removed{throughput}; {len(image_files)} images in local folder",
+                     extra=summary)
             
+            succeeded = True
             return True  # Always return True if we got this far without exceptions
             
         except ApiError as e:
             error_message = str(e)
-            print(f"\n[ERROR] Dropbox API Error:")
             
             if "not_found" in error_message:
-                print(f"  Folder not found: '{dropbox_folder}'")
-                print(f"  Check that the folder exists in your Dropbox account")
+                log.error(f"Dropbox folder not found: '{dropbox_folder}'. "
+                          "Check that the folder exists in your Dropbox account")
             elif "invalid_access_token" in error_message:
-                print(f"  Invalid access token")
-                print(f"  Run: npm run setup-dropbox-oauth")
+                log.error("Invalid Dropbox access token. Run: npm run setup-dropbox-oauth")
             elif "rate_limit" in error_message.lower():
-                print(f"  API rate limit exceeded")
-                print(f"  Increase 'rate_limit_delay' in dropbox_config.json")
+                log.error("Dropbox API rate limit exceeded. Lower 'max_requests_per_second' "
+                          "or 'max_concurrent_downloads' in dropbox_config.json")
             else:
-                print(f"  {e}")
+                log.error(f"Dropbox API error: {e}")
                 
             return False
+
+        except AuthError as e:
+            log.error(f"Dropbox rejected our credentials: {e}")
+            # The next get_dropbox_client() refreshes the token and re-checks the account
+            reset_dropbox_client()
+            return False
             
         except Exception as e:
-            print(f"\n[ERROR] Unexpected error in download process:")
-            print(f"  {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"Unexpected error in download process: {e}")
             return False
             
     except Exception as e:
-        print(f"\n[ERROR] Fatal error:")
-        print(f"  {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"Fatal error: {e}")
         return False
+    finally:
+        SYNCS.inc(result="ok" if succeeded else "failed")
+
+def emit_event(event, **fields):
+    """
+    Print one machine-readable JSON line for node_helper.js.
+    Every event line starts with '{"event":'; stdout carries nothing else
+    (log output goes to stderr and logs/, see structured_logging.py).
+    """
+    payload = {"event": event, "time": time.time()}
+    payload.update(fields)
+    print(json.dumps(payload), flush=True)
+
+def wait_for_changes(dbx, cursor):
+    """
+    Block on files_list_folder_longpoll until the folder changes
+    Returns True if there are changes to fetch, False on timeout
+    """
+    # Longpoll holds the request open longer than the client's normal timeout
+    longpoll_dbx = dbx.clone(timeout=LONGPOLL_TIMEOUT + 120)
+    result = longpoll_dbx.files_list_folder_longpoll(cursor, timeout=LONGPOLL_TIMEOUT)
+
+    if result.backoff:
+        log.info(f"Dropbox asked us to back off for {result.backoff}s")
+        time.sleep(result.backoff)
+
+    return result.changes
+
+def run_daemon():
+    """
+    Long-running sync: keep one authenticated client (and its connection
+    pool) alive, sync once, then wait on files_list_folder_longpoll and sync
+    again whenever the folder changes. Each sync is reported on stdout as a
+    {"event": "sync", ...} JSON line.
+    """
+    log.info("Dropbox sync daemon started")
+
+    needs_sync = True
+    failure_delay = DAEMON_RETRY_DELAY
+
+    while True:
+        try:
+            # Cached by DropboxOAuth, which also refreshes its token in the background
+            dbx = get_dropbox_client()
+            if not dbx:
+                emit_event("error", message="Could not connect to Dropbox")
+                return False
+
+            if needs_sync:
+                changes = {}
+                started = time.monotonic()
+                ok = download_images(dbx, changes)
+                emit_event("sync", ok=ok, seconds=round(time.monotonic() - started, 2), **changes)
+
+                if not ok:
+                    time.sleep(DAEMON_RETRY_DELAY)
+                    continue
+
+                # The cursor isn't advanced past failed downloads, so a longpoll
+                # on the saved one would report changes straight away; retry
+                # with a growing delay instead of resyncing in a tight loop
+                if changes["failed"]:
+                    log.warning(f"{changes['failed']} download(s) failed, retrying in {failure_delay}s")
+                    time.sleep(failure_delay)
+                    failure_delay = min(failure_delay * 2, MAX_DAEMON_RETRY_DELAY)
+                    continue
+                failure_delay = DAEMON_RETRY_DELAY
+
+            cursor = load_cursor(load_config().get("dropbox_folder", ""))
+            if not cursor:
+                # No sync has saved a cursor yet
+                time.sleep(DAEMON_RETRY_DELAY)
+                needs_sync = True
+                continue
+
+            if changes.get("renditions_pending"):
+                # Keep working through the rendition backlog before waiting
+                log.info(f"{changes['renditions_pending']} photos still need renditions")
+                needs_sync = True
+                continue
+
+            log.debug(f"Waiting for Dropbox changes (longpoll {LONGPOLL_TIMEOUT}s)")
+            needs_sync = wait_for_changes(dbx, cursor)
+
+        except ApiError as e:
+            # A reset cursor is handled by the next sync doing a full listing
+            log.warning(f"Longpoll failed: {e}")
+            needs_sync = True
+
+        except AuthError as e:
+            log.error(f"Dropbox authentication failed: {e}")
+            reset_dropbox_client()
+            needs_sync = True
+            time.sleep(DAEMON_RETRY_DELAY)
+
+        except Exception as e:
+            log.error(f"Daemon loop error: {e}")
+            emit_event("error", message=str(e))
+            needs_sync = True
+            time.sleep(DAEMON_RETRY_DELAY)
 
 if __name__ == "__main__":
+    setup_logging("dropbox_sync")
+    start_exporter("dropbox_sync")
+
+    if "--daemon" in sys.argv:
+        try:
+            run_daemon()
+        except KeyboardInterrupt:
+            log.info("Dropbox sync daemon stopped")
+            sys.exit(0)
+        sys.exit(1)
+
     try:
-        success = download_images()
+        changes = {}
+        started = time.monotonic()
+        success = download_images(changes=changes)
+        # The same summary line as the daemon's, for node_helper.js
+        emit_event("sync", ok=success, seconds=round(time.monotonic() - started, 2), **changes)
         
         if success:
-            print("\n[OK] Script completed successfully")
+            log.info("Script completed successfully")
             sys.exit(0)
         else:
-            print("\n[ERROR] Script completed with errors")
+            log.error("Script completed with errors")
             sys.exit(1)
             
     except Exception as e:
-        print(f"\n[FATAL ERROR] Unhandled exception:")
-        print(f"  {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"Unhandled exception: {e}")
         sys.exit(1)
\ No newline at end of file
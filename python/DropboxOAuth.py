@@ -8,17 +8,31 @@ Dropbox OAuth2 Authentication Module
 import os
 import json
 import time
+import threading
 import webbrowser
 import requests
 import base64
 import urllib.parse
-from dropbox import Dropbox
+from dropbox import Dropbox, create_session
 from dropbox.exceptions import AuthError
 
-# Define paths
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-CONFIG_FILE = os.path.join(SCRIPT_DIR, "dropbox_config.json")
-TOKEN_FILE = os.path.join(SCRIPT_DIR, "dropbox_token.json")
+from dropbox_common import CONFIG_FILE, TOKEN_FILE, write_json_atomic
+from structured_logging import get_logger, setup_logging
+
+# The interactive setup prints; everything that can run inside the sync
+# daemon or on the refresh timer logs, keeping stdout for node_helper.js
+log = get_logger("dropbox_oauth")
+
+TOKEN_BUFFER = 600  # Refresh token 10 minutes before it expires
+SESSION_MAX_CONNECTIONS = 8
+
+# Process-wide client cache (see get_dropbox_client)
+_client = None
+_token_data = None
+_session = None
+_probe_next = False
+_refresh_timer = None
+_client_lock = threading.RLock()
 
 def setup_oauth():
     """
@@ -106,8 +120,7 @@ def setup_oauth():
         # Make sure the token file's directory exists
         os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
         
-        with open(TOKEN_FILE, "w") as f:
-            json.dump(token_data, f, indent=2)
+        save_token_data(token_data)
             
         print("OAuth2 setup complete! Token information saved.")
         
@@ -117,8 +130,7 @@ def setup_oauth():
             config["dropbox_folder"] = dropbox_folder
             
             # Save updated config
-            with open(CONFIG_FILE, "w") as f:
-                json.dump(config, f, indent=2)
+            write_json_atomic(CONFIG_FILE, config)
                 
         print(f"Configuration updated. Dropbox folder path: {config.get('dropbox_folder')}")
         return True
@@ -144,8 +156,7 @@ def refresh_access_token(app_key, app_secret, refresh_token):
         response = requests.post(token_url, data=data)
         
         if response.status_code != 200:
-            print(f"Error refreshing token: {response.status_code}")
-            print(f"Response: {response.text}")
+            log.error(f"Error refreshing token: {response.status_code}", extra={"response": response.text})
             return None, None
             
         result = response.json()
@@ -157,93 +168,165 @@ def refresh_access_token(app_key, app_secret, refresh_token):
         
         return new_access_token, expires_at
     except Exception as e:
-        print(f"Exception during token refresh: {e}")
+        log.error(f"Exception during token refresh: {e}")
         return None, None
 
-def get_dropbox_client():
+def load_token_data():
+    """Load the saved token data"""
+    with open(TOKEN_FILE, "r") as f:
+        return json.load(f)
+
+def save_token_data(token_data):
+    """Save token data atomically so concurrent syncs never see a partial file"""
+    write_json_atomic(TOKEN_FILE, token_data)
+
+def get_session():
+    """HTTP session (connection pool) shared by every client in this process"""
+    global _session
+    if _session is None:
+        _session = create_session(max_connections=SESSION_MAX_CONNECTIONS)
+    return _session
+
+def ensure_fresh_token(token_data):
     """
-    Get a valid Dropbox client, refreshing the access token if needed
+    Make sure token_data holds an access token that is valid for at least
+    TOKEN_BUFFER more seconds, refreshing and saving it if needed
+    Returns the (possibly updated) token data, or None if refreshing failed
     """
+    if token_data.get("expires_at") and time.time() + TOKEN_BUFFER < token_data["expires_at"]:
+        return token_data
+
+    # Another process may have refreshed the token since we last read it
     try:
-        # Check if token file exists
-        if not os.path.exists(TOKEN_FILE):
-            print(f"Token file not found at {TOKEN_FILE}")
-            print("Running OAuth2 setup...")
-            if setup_oauth():
-                print("OAuth2 setup completed successfully")
-            else:
-                print("OAuth2 setup failed")
-                return None
-        
-        # Load token data
-        with open(TOKEN_FILE, "r") as f:
-            token_data = json.load(f)
-        
-        access_token = token_data.get("access_token")
-        refresh_token = token_data.get("refresh_token")
-        expires_at = token_data.get("expires_at")
-        app_key = token_data.get("app_key")
-        app_secret = token_data.get("app_secret")
-        
-        current_time = time.time()
-        token_buffer = 600  # Refresh token 10 minutes before it expires
-        
-        # Check if token is expired or will expire soon
-        if not expires_at or current_time + token_buffer > expires_at:
-            print("Access token expired or will expire soon, refreshing...")
-            
-            new_access_token, new_expires_at = refresh_access_token(
-                app_key, app_secret, refresh_token
-            )
-            
-            if new_access_token and new_expires_at:
-                # Update token data
-                token_data["access_token"] = new_access_token
-                token_data["expires_at"] = new_expires_at
-                
-                # Save updated token data
-                with open(TOKEN_FILE, "w") as f:
-                    json.dump(token_data, f, indent=2)
-                
-                print("Access token refreshed successfully")
-                access_token = new_access_token
-            else:
-                print("Failed to refresh access token, attempting setup again...")
-                if setup_oauth():
-                    # Reload token data after setup
-                    with open(TOKEN_FILE, "r") as f:
-                        token_data = json.load(f)
-                    access_token = token_data.get("access_token")
-                else:
-                    print("OAuth setup failed again")
-                    return None
-        
-        # Initialize Dropbox client with the valid access token
-        dbx = Dropbox(access_token)
-        
-        # Test the connection
+        on_disk = load_token_data()
+        if (on_disk.get("access_token") != token_data.get("access_token")
+                and on_disk.get("expires_at") and time.time() + TOKEN_BUFFER < on_disk["expires_at"]):
+            return on_disk
+    except (OSError, ValueError):
+        pass
+
+    log.info("Access token expired or will expire soon, refreshing")
+    new_access_token, new_expires_at = refresh_access_token(
+        token_data.get("app_key"), token_data.get("app_secret"), token_data.get("refresh_token")
+    )
+    if not (new_access_token and new_expires_at):
+        return None
+
+    token_data["access_token"] = new_access_token
+    token_data["expires_at"] = new_expires_at
+    save_token_data(token_data)
+    log.info("Access token refreshed successfully")
+    return token_data
+
+def schedule_refresh(expires_at):
+    """Refresh the cached client's token in the background before it expires"""
+    global _refresh_timer
+    if _refresh_timer:
+        _refresh_timer.cancel()
+
+    delay = max(0, expires_at - TOKEN_BUFFER - time.time())
+    _refresh_timer = threading.Timer(delay, background_refresh)
+    _refresh_timer.daemon = True
+    _refresh_timer.start()
+
+def background_refresh():
+    """Timer callback: refresh the token and swap it into the cached client"""
+    global _client, _token_data
+    with _client_lock:
+        if _client is None or _token_data is None:
+            return
+
+        token_data = ensure_fresh_token(dict(_token_data))
+        if not token_data:
+            # Try again in a minute; callers still hold a working token until expiry
+            log.warning("Background token refresh failed, retrying in 60s")
+            schedule_refresh(time.time() + TOKEN_BUFFER + 60)
+            return
+
+        _token_data = token_data
+        _client = _client.clone(oauth2_access_token=token_data["access_token"])
+
+    schedule_refresh(token_data["expires_at"])
+
+def reset_dropbox_client():
+    """
+    Forget the cached client after an AuthError. The next
+    get_dropbox_client() call refreshes the token and checks the account.
+    """
+    global _client, _probe_next
+    with _client_lock:
+        _client = None
+        if _token_data:
+            _token_data["expires_at"] = 0  # Force a refresh
+        _probe_next = True
+
+def build_client(probe):
+    """Create a new client from the token file (caller holds _client_lock)"""
+    global _client, _token_data, _probe_next
+
+    # Check if token file exists
+    if not os.path.exists(TOKEN_FILE):
+        log.warning(f"Token file not found at {TOKEN_FILE}, running OAuth2 setup")
+        if setup_oauth():
+            log.info("OAuth2 setup completed successfully")
+        else:
+            log.error("OAuth2 setup failed")
+            return None
+
+    token_data = _token_data or load_token_data()
+    token_data = ensure_fresh_token(token_data)
+
+    if not token_data:
+        log.warning("Failed to refresh access token, attempting setup again")
+        if not setup_oauth():
+            log.error("OAuth setup failed again")
+            return None
+        token_data = load_token_data()
+
+    dbx = Dropbox(token_data["access_token"], session=get_session())
+
+    # Only check the account when asked to, or after an AuthError
+    if probe or _probe_next:
         try:
             account = dbx.users_get_current_account()
-            print(f"Connected to Dropbox as: {account.email}")
-            return dbx
+            log.info(f"Connected to Dropbox as: {account.email}")
         except AuthError as e:
-            print(f"AuthError: {e}")
-            print("Trying OAuth setup again...")
+            log.error(f"AuthError: {e}, trying OAuth setup again")
             if setup_oauth():
-                # Recursively try again with new credentials
-                return get_dropbox_client()
+                _token_data = None
+                return build_client(probe=True)
             return None
+
+    _client = dbx
+    _token_data = token_data
+    _probe_next = False
+    schedule_refresh(token_data["expires_at"])
+    return dbx
+
+def get_dropbox_client(probe=False):
+    """
+    Get a valid Dropbox client.
+
+    The client is created once per process and cached, so every caller shares
+    one connection pool. Its access token is refreshed in the background
+    before it expires. The account is only checked with
+    users_get_current_account() when probe is True or after
+    reset_dropbox_client() was called because of an AuthError.
+    """
+    with _client_lock:
+        if _client is not None and not probe:
+            return _client
+
+        try:
+            return build_client(probe)
         except Exception as e:
-            print(f"Error testing Dropbox connection: {e}")
+            log.error(f"Error in get_dropbox_client: {e}")
             return None
-            
-    except Exception as e:
-        print(f"Error in get_dropbox_client: {e}")
-        return None
 
 if __name__ == "__main__":
     import sys
-    
+
+    setup_logging("dropbox_oauth")
     if len(sys.argv) > 1 and sys.argv[1] == "setup":
         setup_oauth()
     else:
@@ -252,7 +335,7 @@ if __name__ == "__main__":
         print("  python DropboxOAuth.py         - Test the Dropbox connection")
         
         # Test the connection
-        dbx = get_dropbox_client()
+        dbx = get_dropbox_client(probe=True)
         if dbx:
             print("Successfully connected to Dropbox!")
             print("OAuth2 is set up correctly with automatic token refresh.")
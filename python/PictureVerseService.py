@@ -0,0 +1,232 @@
+"""
+PictureVerse service - one Python process for all background work
+
+Runs the Blink motion monitor, the Dropbox sync daemon and the Blink media
+cleanup as tasks on one asyncio loop, instead of BlinkMonitor.py,
+Dropbox.py --daemon and CleanUpMedia.py --watch each starting their own
+interpreter on the Pi. Each task is supervised: if it fails it is restarted
+after a delay that doubles up to MAX_RESTART_DELAY. All of them log to
+logs/pictureverse_service.jsonl (see structured_logging.py) and export
+metrics to metrics/pictureverse_service.prom (see metrics.py).
+
+Blink snapshot requests share the monitor's aiohttp session and Blink auth.
+The Dropbox SDK does its own blocking HTTP (through one requests session per
+client), so the sync daemon runs in a thread; its {"event": "sync", ...}
+lines are printed on stdout exactly as with Dropbox.py --daemon.
+
+node_helper.js talks to the service over the control socket in
+blink_common.CONTROL_SOCKET (also used by Blink.py), one JSON object per line:
+
+    {"command": "capture"}   snapshot (and cached clip) from every camera
+    {"command": "cleanup"}   apply the media retention policy now
+    {"command": "status"}    state and restart count of each task
+    {"command": "io"}        I/O allocation per priority class (see io_scheduler.py)
+    {"command": "log_level", "level": "debug"}   (see structured_logging.py)
+    {"command": "ping"}
+"""
+
+import asyncio
+import signal
+import sys
+import threading
+import time
+
+from aiohttp import ClientSession
+
+from blink_common import CONTROL_SOCKET, start_control_server
+from BlinkMonitor import Config, MotionMonitor, initialize_blink
+from CleanUpMedia import WATCH_INTERVAL, CleanupTrigger, cleanup_blink_media
+from io_scheduler import scheduler
+from media_catalog import record_media
+from metrics import Counter, start_exporter
+from structured_logging import get_logger, set_level, setup_logging
+
+log = get_logger("service")
+
+# Supervision: a failed task is restarted after RESTART_DELAY seconds,
+# doubling on each failure up to MAX_RESTART_DELAY. A task that ran for
+# STABLE_AFTER seconds before failing starts again from RESTART_DELAY.
+RESTART_DELAY = 5
+MAX_RESTART_DELAY = 600
+STABLE_AFTER = 300
+
+TASK_FAILURES = Counter("pictureverse_service_task_failures_total",
+                        "Supervised tasks that failed and were restarted", ["task"])
+
+
+def run_in_thread(func, *args):
+    """
+    Await a blocking function run in its own daemon thread, for loops that
+    never return (so they can't hold up shutdown the way the default
+    executor would)
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def target():
+        try:
+            result = func(*args)
+        except Exception as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(settle, future.set_result, result)
+
+    threading.Thread(target=target, name=func.__name__, daemon=True).start()
+    return future
+
+
+class Supervisor:
+    """Runs tasks, restarting each with exponential backoff when it fails"""
+
+    def __init__(self):
+        self.status = {}
+
+    async def supervise(self, name: str, run):
+        """Await run() until it returns; restart it whenever it raises"""
+        state = self.status[name] = {"state": "starting", "restarts": 0, "last_error": None}
+        delay = RESTART_DELAY
+
+        while True:
+            started = time.monotonic()
+            state["state"] = "running"
+            try:
+                await run()
+                state["state"] = "finished"
+                log.info(f"[{name}] finished", extra={"task": name})
+                return
+            except asyncio.CancelledError:
+                state["state"] = "stopped"
+                raise
+            except Exception as e:
+                TASK_FAILURES.inc(task=name)
+                state["last_error"] = str(e)
+                log.error(f"[{name}] failed: {e}", extra={"task": name})
+
+            if time.monotonic() - started >= STABLE_AFTER:
+                delay = RESTART_DELAY
+            state["state"] = "restarting"
+            state["restarts"] += 1
+            log.info(f"[{name}] restarting in {delay}s", extra={"task": name})
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+
+
+class PictureVerseService:
+    """The supervised tasks and the control socket that reaches them"""
+
+    def __init__(self, session: ClientSession):
+        self.session = session
+        self.supervisor = Supervisor()
+        self.monitor = None
+        self.cleanup = CleanupTrigger()
+
+    async def run_blink(self):
+        """Motion monitor; capture requests use its session"""
+        if not Config.CREDS_FILE.exists():
+            log.warning(f"Blink credentials not found ({Config.CREDS_FILE}), motion monitor disabled")
+            return
+
+        blink = await initialize_blink(self.session)
+        monitor = MotionMonitor(blink)
+        monitor.initialize_cameras()
+        self.monitor = monitor
+        try:
+            await monitor.monitor_loop()
+        finally:
+            self.monitor = None
+
+    async def run_dropbox(self):
+        """Dropbox sync daemon (blocking SDK, so in a thread)"""
+        try:
+            import Dropbox
+        except SystemExit:
+            raise RuntimeError("the dropbox package could not be imported")
+
+        if not await run_in_thread(Dropbox.run_daemon):
+            raise RuntimeError("Dropbox sync daemon stopped")
+
+    async def run_cleanup(self):
+        """Media retention, run when CleanupTrigger says so"""
+        await asyncio.to_thread(cleanup_blink_media)
+        self.cleanup.done()
+
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            due = self.cleanup.check()
+            if due:
+                await asyncio.to_thread(cleanup_blink_media, free_bytes_needed=due[1])
+                self.cleanup.done()
+
+    async def control_command(self, request: dict) -> dict:
+        """Answer one request on the control socket"""
+        command = request.get("command")
+        if command == "capture":
+            if not self.monitor:
+                # Blink.py and node_helper.js fall back to a login of their own
+                return {"ok": False, "unavailable": True, "error": "Blink monitor is not running"}
+            return await self.monitor.capture_all()
+        if command == "cleanup":
+            self.cleanup.requested = True
+            return {"ok": True}
+        if command == "status":
+            return {"ok": True, "tasks": self.supervisor.status, "io": scheduler.allocation()}
+        if command == "io":
+            return {"ok": True, "classes": scheduler.allocation()}
+        if command == "log_level":
+            try:
+                return {"ok": True, "level": set_level(request.get("level", "INFO"))}
+            except ValueError as e:
+                return {"ok": False, "error": str(e)}
+        if command == "ping":
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown command: {command}"}
+
+    async def run(self):
+        server = await start_control_server(self.control_command)
+        if server:
+            log.info(f"Listening for control requests on {CONTROL_SOCKET}")
+
+        try:
+            await asyncio.gather(
+                self.supervisor.supervise("blink", self.run_blink),
+                self.supervisor.supervise("dropbox", self.run_dropbox),
+                self.supervisor.supervise("cleanup", self.run_cleanup),
+            )
+        finally:
+            if server:
+                server.close()
+                CONTROL_SOCKET.unlink(missing_ok=True)
+
+
+async def main():
+    log_file = setup_logging("pictureverse_service")
+    start_exporter("pictureverse_service")
+    log.info(f"PictureVerse service started (log: {log_file})")
+
+    Config.MEDIA_FOLDER.mkdir(exist_ok=True)
+    # Make sure media_index.json exists (the catalog rebuilds itself if missing)
+    record_media("media")
+
+    # Stop cleanly (closing the control socket) when node_helper.js kills us
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, task.cancel)
+
+    async with ClientSession() as session:
+        try:
+            await PictureVerseService(session).run()
+        except asyncio.CancelledError:
+            log.info("PictureVerse service stopped")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        log.exception(f"Unexpected error: {e}")
+        sys.exit(1)
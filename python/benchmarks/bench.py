@@ -0,0 +1,384 @@
+"""
+Offline benchmarks for the Dropbox sync, Blink capture, motion monitor and
+media cleanup code, run against the fakes in fakes.py instead of live
+accounts.
+
+Each scenario runs in its own Python process (so peak RSS is per scenario)
+and reports wall time, requests made to the fake backend, peak RSS, bytes
+written and files deleted.
+
+    python benchmarks/bench.py                        # all scenarios
+    python benchmarks/bench.py dropbox-full cleanup   # just these
+    python benchmarks/bench.py --latency 0.05 --error-rate 0.02
+    python benchmarks/bench.py dropbox-full --error-rate 0.02 --error-kind rate-limit
+    python benchmarks/bench.py --json results.json
+    python benchmarks/bench.py --baseline results.json  # exit 1 on regressions
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent.absolute()
+SCRIPT_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+SCENARIOS = [
+    "dropbox-full",
+    "dropbox-incremental",
+    "dropbox-display",
+    "blink-capture",
+    "monitor-motion",
+    "cleanup",
+]
+
+
+# ==================== MEASUREMENT ====================
+def scan(folder: Path) -> dict:
+    """{path: (size, mtime)} for every file under folder"""
+    files = {}
+    for root, dirs, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[path] = (stat.st_size, stat.st_mtime)
+    return files
+
+
+@contextlib.contextmanager
+def measure(folder: Path, backend=None):
+    """Time the enclosed block and collect its I/O and request counts into the yielded dict"""
+    result = {}
+    before = scan(folder)
+    requests_before = backend.requests if backend else 0
+    start_wall = time.time()
+    start = time.perf_counter()
+
+    yield result
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    after = scan(folder)
+    result["requests"] = (backend.requests - requests_before) if backend else 0
+    result["bytes_written"] = sum(
+        size for path, (size, mtime) in after.items()
+        if path not in before or mtime >= start_wall
+    )
+    result["files_deleted"] = len(set(before) - set(after))
+
+
+# ==================== SCENARIOS ====================
+def setup_catalog(tmp: Path):
+    """Keep the media catalog and its JSON index in tmp"""
+    import media_catalog
+
+    media_catalog.CATALOG_FILE = tmp / "media_catalog.db"
+    media_catalog.INDEX_FILE = tmp / "media_index.json"
+    media_catalog.PHOTO_INDEX_FILE = tmp / "photo_index.json"
+
+
+def setup_dropbox(tmp: Path, args, sync_mode="download-only"):
+    """Import Dropbox.py with its files redirected into tmp and return (module, fake client)"""
+    import Dropbox
+    import dropbox_common
+    import renditions
+    from fakes import FakeDropbox
+
+    setup_catalog(tmp)
+
+    config_file = tmp / "dropbox_config.json"
+    with open(config_file, "w") as f:
+        json.dump({
+            "dropbox_folder": "/photos",
+            "sync_mode": sync_mode,
+            "max_concurrent_downloads": args.workers,
+            "max_requests_per_second": args.rps,
+            "renditions": {"enabled": False},
+        }, f)
+
+    Dropbox.CONFIG_FILE = str(config_file)
+    Dropbox.LOCAL_FOLDER = dropbox_common.LOCAL_FOLDER = str(tmp / "Pictures")
+    Dropbox.CURSOR_FILE = str(tmp / "dropbox_cursor.json")
+    Dropbox.MANIFEST_FILE = str(tmp / "dropbox_manifest.json")
+    renditions.RENDITION_FOLDER = str(tmp / "Renditions")
+
+    dbx = FakeDropbox(
+        files=args.files, file_size=args.file_kb * 1024, page_size=args.page_size,
+        latency=args.latency, error_rate=args.error_rate,
+        error_kind=args.error_kind, retry_after=args.retry_after,
+    )
+    return Dropbox, dbx
+
+
+def run_dropbox_full(tmp: Path, args) -> dict:
+    Dropbox, dbx = setup_dropbox(tmp, args)
+    with measure(tmp, dbx) as result:
+        result["ok"] = Dropbox.download_images(dbx=dbx)
+    return result
+
+
+def run_dropbox_incremental(tmp: Path, args) -> dict:
+    Dropbox, dbx = setup_dropbox(tmp, args)
+    Dropbox.download_images(dbx=dbx)
+
+    changed = max(1, args.files // 10)
+    for i in range(changed):
+        dbx.put(f"new_{i:06d}.jpg")
+
+    with measure(tmp, dbx) as result:
+        result["ok"] = Dropbox.download_images(dbx=dbx)
+    return result
+
+
+def run_dropbox_display(tmp: Path, args) -> dict:
+    Dropbox, dbx = setup_dropbox(tmp, args, sync_mode="display")
+    with measure(tmp, dbx) as result:
+        result["ok"] = Dropbox.download_images(dbx=dbx)
+    return result
+
+
+def setup_blink(tmp: Path, args):
+    """Point the Blink scripts at tmp and shorten their waits; returns a fake Blink"""
+    import blink_common
+    from fakes import FakeBlink
+
+    setup_catalog(tmp)
+    media = tmp / "media"
+    media.mkdir()
+    blink_common.MEDIA_FOLDER = media
+    blink_common.CREDS_FILE = tmp / "creds.json"
+
+    return FakeBlink(
+        cameras=args.cameras, image_size=args.image_kb * 1024, video_size=args.video_kb * 1024,
+        latency=args.latency, error_rate=args.error_rate,
+    )
+
+
+def run_blink_capture(tmp: Path, args) -> dict:
+    fake = setup_blink(tmp, args)
+    import Blink
+
+    Blink.MEDIA_FOLDER = tmp / "media"
+    Blink.CREDS_FILE = tmp / "creds.json"
+    Blink.CONTROL_SOCKET = tmp / "no.sock"
+    Blink.WAIT_TIME_WIRED = args.capture_wait
+    Blink.WAIT_TIME_WIRELESS = args.capture_wait / 2
+    Blink.Blink = lambda session=None: fake
+    Blink.Auth = lambda *args, **kwargs: fake.auth
+    with open(Blink.CREDS_FILE, "w") as f:
+        json.dump({}, f)
+
+    with measure(tmp, fake) as result:
+        result["ok"] = asyncio.run(Blink.fetch_blink_media(None)) and not fake.stale_reads
+    return result
+
+
+def run_monitor_motion(tmp: Path, args) -> dict:
+    fake = setup_blink(tmp, args)
+    import BlinkMonitor
+    import motion_latency
+
+    motion_latency.LATENCY_LOG = tmp / "motion_latency.jsonl"
+    BlinkMonitor.Config.CAPTURE_WAIT_WIRED = args.capture_wait
+    BlinkMonitor.Config.CAPTURE_WAIT_WIRELESS = args.capture_wait / 2
+    BlinkMonitor.Config.REFRESH_BATCH_WINDOW = min(0.1, args.capture_wait)
+    BlinkMonitor.Config.RETRY_DELAY = 0.1
+
+    async def run():
+        monitor = BlinkMonitor.MotionMonitor(fake)
+        monitor.initialize_cameras()
+        fake.trigger_motion()
+        await monitor.check_motion()
+        while monitor.in_flight:
+            await asyncio.wait(list(monitor.in_flight.values()))
+        return True
+
+    with measure(tmp, fake) as result:
+        result["ok"] = asyncio.run(run()) and not fake.stale_reads
+    return result
+
+
+def run_cleanup(tmp: Path, args) -> dict:
+    # CleanUpMedia logs every deletion; keep that out of its real log file
+    logging.basicConfig(handlers=[logging.NullHandler()])
+    import CleanUpMedia
+    import blink_common
+
+    setup_catalog(tmp)
+    media = tmp / "media"
+    media.mkdir()
+    CleanUpMedia.MEDIA_DIR = str(media)
+    CleanUpMedia.DELETE_PAUSE = 0  # Measure the engine, not its deliberate pacing
+    blink_common.MEDIA_FOLDER = media
+
+    # Spread the files over cameras, hours and kinds like an outage backlog
+    rng = random.Random(1)
+    now = datetime.now()
+    payload = b"\0" * args.media_kb * 1024
+    for i in range(args.media_files):
+        taken = now - timedelta(seconds=rng.randrange(7 * 24 * 3600))
+        camera = f"Camera_{rng.randrange(args.cameras)}"
+        ext = "mp4" if rng.random() < 0.3 else "jpg"
+        with open(media / f"{camera}_{taken:%Y%m%d_%H%M%S}.{ext}", "wb") as f:
+            f.write(payload)
+
+    with measure(tmp) as result:
+        result["ok"] = CleanUpMedia.cleanup_blink_media()
+    return result
+
+
+RUNNERS = {
+    "dropbox-full": run_dropbox_full,
+    "dropbox-incremental": run_dropbox_incremental,
+    "dropbox-display": run_dropbox_display,
+    "blink-capture": run_blink_capture,
+    "monitor-motion": run_monitor_motion,
+    "cleanup": run_cleanup,
+}
+
+
+# ==================== RUNNER ====================
+def run_child(scenario: str, args):
+    """Run one scenario in this process and print its result as JSON"""
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory(prefix="pictureverse-bench-") as tmp:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = RUNNERS[scenario](Path(tmp), args)
+
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    stdout.write(json.dumps(result) + "\n")
+
+
+def run_scenario(scenario: str, argv) -> dict:
+    """Run one scenario in a fresh interpreter"""
+    process = subprocess.run(
+        [sys.executable, __file__, "--child", scenario] + argv,
+        capture_output=True, text=True,
+    )
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        return {"ok": False, "error": (process.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(lines[-1])
+
+
+def print_results(results: dict, baseline: dict = None):
+    print(f"{'scenario':<22}{'ok':>4}{'seconds':>10}{'requests':>10}{'peak MB':>9}"
+          f"{'written MB':>12}{'deleted':>9}")
+    print("-" * 76)
+    for scenario, r in results.items():
+        if "seconds" not in r:
+            print(f"{scenario:<22}  [ERROR] {r.get('error')}")
+            continue
+        change = ""
+        if baseline and scenario in baseline and baseline[scenario].get("seconds"):
+            change = f"  ({(r['seconds'] / baseline[scenario]['seconds'] - 1) * 100:+.0f}%)"
+        print(f"{scenario:<22}{'yes' if r['ok'] else 'no':>4}{r['seconds']:>10.2f}{r['requests']:>10}"
+              f"{r['peak_rss_mb']:>9.1f}{r['bytes_written'] / 1024 / 1024:>12.1f}"
+              f"{r['files_deleted']:>9}{change}")
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios that got slower than baseline by more than tolerance, or started failing"""
+    regressions = []
+    for scenario, r in results.items():
+        base = baseline.get(scenario)
+        if not base or "seconds" not in base:
+            continue
+        if "seconds" not in r or (base.get("ok") and not r.get("ok")):
+            regressions.append(f"{scenario}: failed")
+        elif r["seconds"] > base["seconds"] * (1 + tolerance):
+            regressions.append(f"{scenario}: {base['seconds']:.2f}s -> {r['seconds']:.2f}s")
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", choices=SCENARIOS + [[]], default=[],
+                        help="Scenarios to run (default: all)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per fake API request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake requests that fail")
+    parser.add_argument("--error-kind", choices=["server", "rate-limit"], default="server",
+                        help="Injected Dropbox download errors: server errors or rate limiting")
+    parser.add_argument("--retry-after", type=float, default=1,
+                        help="retry_after sent with injected rate limit errors")
+    parser.add_argument("--files", type=int, default=500, help="Photos in the fake Dropbox folder")
+    parser.add_argument("--file-kb", type=int, default=200, help="Size of each Dropbox photo")
+    parser.add_argument("--page-size", type=int, default=500, help="Entries per Dropbox listing page")
+    parser.add_argument("--workers", type=int, default=4, help="max_concurrent_downloads")
+    parser.add_argument("--rps", type=float, default=0, help="max_requests_per_second (0 = unlimited)")
+    parser.add_argument("--cameras", type=int, default=8, help="Fake Blink cameras")
+    parser.add_argument("--image-kb", type=int, default=150, help="Size of each Blink snapshot")
+    parser.add_argument("--video-kb", type=int, default=2048, help="Size of each Blink clip")
+    parser.add_argument("--capture-wait", type=float, default=0.5,
+                        help="Wired capture wait in seconds (wireless is half)")
+    parser.add_argument("--media-files", type=int, default=20000, help="Files in media/ for cleanup")
+    parser.add_argument("--media-kb", type=int, default=1, help="Size of each media file for cleanup")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare with results from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    argv = sys.argv[1:]
+    args = parse_args(argv)
+
+    if args.child:
+        run_child(args.child, args)
+        return 0
+
+    # Options passed on to each scenario process
+    child_argv = [a for a in argv if a not in SCENARIOS]
+    for flag in ("--json", "--baseline"):
+        if flag in child_argv:
+            i = child_argv.index(flag)
+            del child_argv[i:i + 2]
+
+    results = {}
+    for scenario in args.scenarios or SCENARIOS:
+        print(f"Running {scenario}...", flush=True)
+        results[scenario] = run_scenario(scenario, child_argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    print()
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print("\n[ERROR] Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\n[OK] No regressions against baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
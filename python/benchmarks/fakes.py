@@ -0,0 +1,336 @@
+"""
+Local stand-ins for the Dropbox SDK client and blinkpy's Blink/camera
+objects, used by bench.py to measure sync and capture throughput without
+live accounts. Every fake has configurable latency, error rate and file
+sizes, and counts the requests it serves.
+"""
+
+import asyncio
+import base64
+import datetime
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from aiohttp import ClientPayloadError, ClientResponseError
+from dropbox.exceptions import InternalServerError, RateLimitError
+from dropbox.files import (
+    FileMetadata,
+    GetThumbnailBatchResult,
+    GetThumbnailBatchResultData,
+    GetThumbnailBatchResultEntry,
+    ListFolderLongpollResult,
+    ListFolderResult,
+)
+
+from dropbox_common import ContentHasher
+
+
+class Backend:
+    """Shared latency / error injection and request counting"""
+
+    def __init__(self, latency=0.02, error_rate=0.0, seed=1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.requests += 1
+            return self.random.random() < self.error_rate
+
+    def request(self):
+        """Simulate one blocking API call; returns True if it should fail"""
+        failed = self._count()
+        if self.latency:
+            time.sleep(self.latency)
+        return failed
+
+    async def async_request(self):
+        """Simulate one async API call; returns True if it should fail"""
+        failed = self._count()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return failed
+
+
+# ==================== DROPBOX ====================
+class FakeResponse:
+    """Enough of requests.Response for Dropbox.stream_to_file"""
+
+    def __init__(self, data, bandwidth=None):
+        self.data = data
+        self.bandwidth = bandwidth  # bytes per second, None = unlimited
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.data), chunk_size):
+            chunk = self.data[i:i + chunk_size]
+            if self.bandwidth:
+                time.sleep(len(chunk) / self.bandwidth)
+            yield chunk
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class FakeDropbox(Backend):
+    """
+    In-memory dropbox.Dropbox: one folder of generated photos with paging,
+    cursors, longpoll, downloads and batch thumbnails. File contents are
+    generated from a per-file seed on demand, so large libraries don't sit
+    in memory.
+    """
+
+    def __init__(self, files=500, file_size=200 * 1024, page_size=500, thumbnail_size=100 * 1024,
+                 bandwidth=None, folder="/photos", error_kind="server", retry_after=1, **kwargs):
+        super().__init__(**kwargs)
+        self.error_kind = error_kind  # "server" (500) or "rate-limit" (429 with retry_after)
+        self.retry_after = retry_after
+        self.folder = folder
+        self.page_size = page_size
+        self.file_size = file_size
+        self.thumbnail_size = thumbnail_size
+        self.bandwidth = bandwidth
+        self.entries = {}  # name -> FileMetadata
+        self.by_path = {}  # path_lower -> FileMetadata
+        self.seeds = {}  # path_lower -> content seed
+        self.log = []  # names in change order, for cursors
+        for i in range(files):
+            self.put(f"photo_{i:06d}.jpg", seed=i)
+
+    def data_for(self, seed, size):
+        return random.Random(seed).randbytes(size)
+
+    def put(self, name, seed=None, size=None):
+        """Add or replace a file"""
+        seed = seed if seed is not None else self.random.randrange(1 << 30)
+        size = size or self.file_size
+        hasher = ContentHasher()
+        hasher.update(self.data_for(seed, size))
+        modified = datetime.datetime(2024, 1, 1)
+        self.entries[name] = FileMetadata(
+            name=name, id=f"id:{seed}", rev=f"{seed:09x}", size=size,
+            path_lower=f"{self.folder}/{name}".lower(), path_display=f"{self.folder}/{name}",
+            content_hash=hasher.hexdigest(), client_modified=modified, server_modified=modified,
+        )
+        self.by_path[self.entries[name].path_lower] = self.entries[name]
+        self.seeds[self.entries[name].path_lower] = seed
+        self.log.append(name)
+
+    def _fail(self):
+        if self.request():
+            raise InternalServerError("fake", 500, "injected error")
+
+    def _fail_transfer(self):
+        if self.request():
+            if self.error_kind == "rate-limit":
+                raise RateLimitError("fake", backoff=self.retry_after)
+            raise InternalServerError("fake", 500, "injected error")
+
+    def _page(self, names, start):
+        page = names[start:start + self.page_size]
+        more = start + self.page_size < len(names)
+        cursor = f"page:{start + self.page_size}" if more else f"log:{len(self.log)}"
+        return ListFolderResult(entries=[self.entries[n] for n in page], cursor=cursor, has_more=more)
+
+    def files_list_folder(self, path, **kwargs):
+        self._fail()
+        self._listing = sorted(self.entries)
+        return self._page(self._listing, 0)
+
+    def files_list_folder_continue(self, cursor):
+        self._fail()
+        kind, position = cursor.split(":")
+        if kind == "page":
+            return self._page(self._listing, int(position))
+        changed = list(dict.fromkeys(n for n in self.log[int(position):] if n in self.entries))
+        return ListFolderResult(entries=[self.entries[n] for n in changed],
+                                cursor=f"log:{len(self.log)}", has_more=False)
+
+    def files_list_folder_longpoll(self, cursor, timeout=30):
+        self.request()
+        changes = cursor.startswith("log:") and int(cursor.split(":")[1]) < len(self.log)
+        return ListFolderLongpollResult(changes=changes, backoff=None)
+
+    def files_download(self, path):
+        self._fail_transfer()
+        entry = self.by_path[path]
+        return entry, FakeResponse(self.data_for(self.seeds[path], entry.size), self.bandwidth)
+
+    def files_get_thumbnail_batch(self, entries):
+        self._fail_transfer()
+        results = []
+        for arg in entries:
+            entry = self.by_path[arg.path]
+            data = self.data_for(self.seeds[arg.path], min(entry.size, self.thumbnail_size))
+            results.append(GetThumbnailBatchResultEntry.success(GetThumbnailBatchResultData(
+                metadata=entry, thumbnail=base64.b64encode(data).decode()
+            )))
+        return GetThumbnailBatchResult(entries=results)
+
+    def clone(self, **kwargs):
+        return self
+
+
+# ==================== BLINK ====================
+def make_mp4(size, seed):
+    """A structurally valid MP4 (ftyp, mdat, moov) of exactly size bytes"""
+    ftyp = (16).to_bytes(4, "big") + b"ftypisom" + b"\0\0\0\0"
+    moov = (16).to_bytes(4, "big") + b"moov" + b"\0" * 8
+    mdat_size = max(8, size - len(ftyp) - len(moov))
+    mdat = mdat_size.to_bytes(4, "big") + b"mdat" + random.Random(seed).randbytes(mdat_size - 8)
+    return ftyp + mdat + moov
+
+
+class FakeClipResponse:
+    """Enough of aiohttp's response for blink_common.download_clip"""
+
+    def __init__(self, backend, status, data, fail):
+        self.backend = backend
+        self.status = status
+        self.data = data
+        self.fail = fail  # Drop the connection halfway through
+        self.content = self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise ClientResponseError(None, (), status=self.status)
+
+    async def iter_chunked(self, size):
+        end = len(self.data) // 2 if self.fail else len(self.data)
+        for i in range(0, end, size):
+            chunk = self.data[i:min(i + size, end)]
+            self.backend.bytes_served += len(chunk)
+            yield chunk
+        if self.fail:
+            raise ClientPayloadError("injected connection drop")
+
+
+class FakeSession:
+    """aiohttp session serving the fake cameras' clips, with Range support"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, url, headers=None, **kwargs):
+        failed = self.backend._count()
+        data = self.backend.clips[url]
+        start = 0
+        range_header = (headers or {}).get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            if start >= len(data):
+                return FakeClipResponse(self.backend, 416, b"", False)
+        return FakeClipResponse(self.backend, 206 if start else 200, data[start:], failed)
+
+
+class FakeAuth:
+    """Auth with a still-valid token, so start_blink() takes the short path"""
+
+    def __init__(self, *args, **kwargs):
+        self.token = "fake-token"
+        self.region_id = "fake"
+        self.host = "fake.example.com"
+        self.login_attributes = {"token": self.token, "region_id": self.region_id, "host": self.host}
+        self.header = {"Authorization": f"Bearer {self.token}"}
+        self.session = None
+
+    def need_refresh(self):
+        return False
+
+
+class FakeCamera:
+    """blinkpy camera: snap_picture, image_to_file and a clip URL"""
+
+    def __init__(self, backend, name, wired, image_size, video_size):
+        self.backend = backend
+        self.sync = SimpleNamespace(blink=backend)
+        self.name = name
+        self.camera_type = "wired" if wired else "catalina"
+        self.image_size = image_size
+        self.snap_pending = False  # Thumbnail is stale until the next real refresh
+        self.motion_detected = False
+        self.video_from_cache = b"cached" if video_size else None
+        self.clip = f"https://fake.example.com/{name}.mp4" if video_size else None
+        if self.clip:
+            backend.clips[self.clip] = make_mp4(video_size, name)
+
+    async def snap_picture(self):
+        if await self.backend.async_request():
+            raise RuntimeError("injected snapshot error")
+        self.snap_pending = True
+
+    async def _write(self, path, size):
+        if await self.backend.async_request():
+            raise RuntimeError("injected download error")
+        with open(path, "wb") as f:
+            f.write(random.Random(self.name).randbytes(size))
+
+    async def image_to_file(self, path):
+        if self.snap_pending:
+            self.backend.stale_reads += 1  # blinkpy would save the previous thumbnail
+        await self._write(path, self.image_size)
+
+
+class FakeBlink(Backend):
+    """blinkpy Blink with a set of fake cameras"""
+
+    def __init__(self, cameras=8, wired_ratio=0.5, image_size=150 * 1024, video_size=2 * 1024 * 1024,
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.auth = FakeAuth()
+        self.auth.session = FakeSession(self)
+        self.clips = {}  # clip URL -> MP4 bytes
+        self.bytes_served = 0  # Clip bytes sent, including resent ones
+        self.stale_reads = 0  # Snapshots saved before a refresh picked them up
+        self.homescreen = {"networks": []}
+        self.last_refresh = None
+        self.refresh_rate = 30
+        self.cameras = {}
+        wired = int(cameras * wired_ratio)
+        for i in range(cameras):
+            name = f"Camera {i}"
+            self.cameras[name] = FakeCamera(self, name, i < wired, image_size, video_size)
+
+    def setup_urls(self):
+        pass
+
+    async def setup_post_verify(self):
+        await self.async_request()
+        return True
+
+    async def start(self):
+        return await self.setup_post_verify()
+
+    def check_if_ok_to_update(self):
+        return self.last_refresh is None or time.time() >= self.last_refresh + self.refresh_rate
+
+    async def refresh(self, force=False, force_cache=False):
+        # Like blinkpy, skip refreshes closer together than refresh_rate
+        if not (force or force_cache or self.check_if_ok_to_update()):
+            return False
+        await self.async_request()
+        self.last_refresh = int(time.time())
+        for camera in self.cameras.values():
+            camera.snap_pending = False
+        return True
+
+    def trigger_motion(self, count=None):
+        """Flag motion on the first count cameras (all by default)"""
+        for camera in list(self.cameras.values())[:count]:
+            camera.motion_detected = True
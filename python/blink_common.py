@@ -1,15 +1,34 @@
 """
 Shared helpers for the Blink camera scripts (Blink.py, BlinkMonitor.py).
-Keeps camera-type detection, file validation, and media path conventions
-in one place instead of duplicated across both scripts.
+Keeps camera-type detection, file validation, media path conventions,
+clip downloads and session start/save in one place instead of duplicated
+across both scripts.
 """
 
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
 from pathlib import Path
 
+from aiohttp import ClientError
+
+from io_scheduler import MOTION, scheduler
+from structured_logging import get_logger
+
+log = get_logger("blink")
+
 SCRIPT_DIR = Path(__file__).parent.absolute()
 MEDIA_FOLDER = SCRIPT_DIR / "media"
 CREDS_FILE = SCRIPT_DIR / "creds.json"
 
+# BlinkMonitor (or PictureVerseService) listens here so Blink.py can use its
+# session instead of logging in
+CONTROL_SOCKET = SCRIPT_DIR / ".blink_monitor.sock"
+CONTROL_TIMEOUT = 120  # Seconds Blink.py waits for the monitor to finish a capture
+
 # Camera-specific timing: wired cameras take longer to process a capture
 WAIT_TIME_WIRED = 8
 WAIT_TIME_WIRELESS = 3
@@ -17,8 +36,12 @@ WAIT_TIME_WIRELESS = 3
 DOWNLOAD_TIMEOUT_WIRED = 45
 DOWNLOAD_TIMEOUT_WIRELESS = 30
 
+MAX_CONCURRENT_CAMERAS = 4  # Cameras talking to the Blink API at the same time
+
 MIN_FILE_SIZE = 1000  # 1KB minimum for a valid snapshot/video file
 
+CLIP_CHUNK_SIZE = 64 * 1024  # Clips are streamed to disk in chunks this size
+
 
 def is_wired_camera(camera) -> bool:
     """Check whether a blinkpy camera object is a wired camera"""
@@ -35,7 +58,206 @@ def validate_file(filepath: Path, min_size: int = MIN_FILE_SIZE) -> bool:
     return filepath.stat().st_size >= min_size
 
 
+# Hidden names (a leading ".") are clips still being processed (see
+# clip_processing.staging_path), not media
+MEDIA_NAME_PATTERN = re.compile(r'^([^.][^/]*?)_(\d{8}_\d{6})\.(jpg|jpeg|mp4)$', re.I)
+
+
+def is_complete_mp4(filepath: Path) -> bool:
+    """
+    Check an MP4's top-level atoms: it must start with ftyp, contain moov,
+    and the atoms must cover the file exactly (a cut-off download doesn't)
+    """
+    try:
+        size = os.path.getsize(filepath)
+        atoms = []
+        offset = 0
+        with open(filepath, "rb") as f:
+            while offset < size:
+                f.seek(offset)
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                atom_size = int.from_bytes(header[:4], "big")
+                if atom_size == 1:  # 64-bit size follows the type
+                    extended = f.read(8)
+                    if len(extended) < 8:
+                        return False
+                    atom_size = int.from_bytes(extended, "big")
+                elif atom_size == 0:  # Runs to the end of the file
+                    atom_size = size - offset
+                if atom_size < 8:
+                    return False
+                atoms.append(header[4:8])
+                offset += atom_size
+    except OSError:
+        return False
+    return offset == size and atoms[:1] == [b"ftyp"] and b"moov" in atoms
+
+
+def parse_media_name(filename: str):
+    """
+    Split a media file name (CameraName_YYYYMMDD_HHMMSS.ext) into
+    (camera, timestamp, kind), where kind is "image" or "video"
+    Returns None for names that don't follow the convention
+    """
+    match = MEDIA_NAME_PATTERN.match(filename)
+    if not match:
+        return None
+    camera, timestamp, ext = match.groups()
+    return camera, timestamp, "video" if ext.lower() == "mp4" else "image"
+
+
 def get_media_path(camera_name: str, timestamp: str, extension: str) -> Path:
     """Build the media file path for a camera capture"""
     safe_name = camera_name.replace(" ", "_")
     return MEDIA_FOLDER / f"{safe_name}_{timestamp}.{extension}"
+
+
+async def _fetch_clip(auth, url: str, part_path: Path, priority: int):
+    """Download url into part_path, continuing from what it already holds"""
+    have = part_path.stat().st_size if part_path.exists() else 0
+    if auth.need_refresh():
+        await auth.refresh_tokens(refresh=True)
+
+    headers = dict(auth.header or {})
+    if have:
+        headers["Range"] = f"bytes={have}-"
+
+    async with auth.session.get(url, headers=headers) as response:
+        if have and response.status == 416:
+            return  # Already have all of it
+        response.raise_for_status()
+
+        # 206 continues the partial file; a 200 is the whole clip again
+        with open(part_path, "ab" if response.status == 206 else "wb") as f:
+            async for chunk in response.content.iter_chunked(CLIP_CHUNK_SIZE):
+                f.write(chunk)
+                await scheduler.async_throttle(priority, len(chunk))
+
+
+async def download_clip(camera, filepath: Path, timeout: float, attempts: int = 1,
+                        retry_delay: float = 2, on_attempt=None, priority: int = MOTION) -> bool:
+    """
+    Stream a camera's latest clip (camera.clip) through the Blink session
+    into filepath, a chunk at a time so the clip is never held in memory.
+    A retry resumes with an HTTP Range request from what is already on
+    disk instead of starting over. The clip is written to a hidden .part
+    file and only renamed into place once it is a complete MP4.
+    on_attempt(attempt, seconds) is called after each attempt. priority is
+    the io_scheduler class the download runs in.
+    """
+    url = camera.clip
+    if not url:
+        log.error(f"No clip URL for {filepath.name}")
+        return False
+
+    auth = camera.sync.blink.auth
+    part_path = filepath.with_name(f".{filepath.name}.part")
+    part_path.unlink(missing_ok=True)
+
+    # Counts as a running transfer of its class for the whole download
+    with scheduler.transfer(priority):
+        for attempt in range(1, attempts + 1):
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(_fetch_clip(auth, url, part_path, priority), timeout=timeout)
+                if is_complete_mp4(part_path):
+                    os.replace(part_path, filepath)
+                    return True
+                # The server finished sending, so resuming won't fix it
+                log.error(f"{filepath.name}: downloaded clip is not a complete MP4 (attempt {attempt})")
+                part_path.unlink(missing_ok=True)
+            except asyncio.TimeoutError:
+                log.error(f"{filepath.name}: clip download timeout after {timeout}s (attempt {attempt})")
+            except (ClientError, OSError) as e:
+                log.error(f"{filepath.name}: clip download error (attempt {attempt}): {e}")
+            finally:
+                if on_attempt:
+                    on_attempt(attempt, time.monotonic() - started)
+
+            if attempt < attempts:
+                if part_path.exists():
+                    log.info(f"{filepath.name}: resuming from {part_path.stat().st_size:,} bytes")
+                await asyncio.sleep(retry_delay)
+
+    part_path.unlink(missing_ok=True)
+    return False
+
+
+async def start_blink(blink) -> bool:
+    """
+    Start a Blink session. When creds.json holds an access token that is
+    still valid, the login/token handshake in blink.start() is skipped and
+    only the camera list is loaded; otherwise (or if that fails) a full
+    start is done.
+    """
+    auth = blink.auth
+    if auth.token and auth.region_id and auth.host and not auth.need_refresh():
+        try:
+            blink.setup_urls()
+            if not blink.last_refresh:
+                blink.last_refresh = int(time.time() - blink.refresh_rate * 1.05)
+            if await blink.setup_post_verify():
+                return True
+        except Exception as e:
+            log.warning(f"Saved session could not be reused, logging in again: {e}")
+
+    return await blink.start()
+
+
+async def start_control_server(respond):
+    """
+    Listen on CONTROL_SOCKET for requests of one JSON object per line;
+    await respond(request) gives the response object. Returns the server,
+    or None where Unix sockets aren't available.
+    """
+    if not hasattr(asyncio, "start_unix_server"):
+        return None
+
+    async def handle(reader, writer):
+        try:
+            request = json.loads(await reader.readline() or b"{}")
+            response = await respond(request)
+        except Exception as e:
+            log.error(f"Control request failed: {e}")
+            response = {"ok": False, "error": str(e)}
+
+        try:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    CONTROL_SOCKET.unlink(missing_ok=True)
+    return await asyncio.start_unix_server(handle, path=str(CONTROL_SOCKET))
+
+
+def save_creds(auth) -> bool:
+    """
+    Write the (possibly refreshed) auth tokens back to creds.json so the next
+    start can reuse them. Returns True if the file was updated.
+    """
+    data = auth.login_attributes
+    try:
+        with open(CREDS_FILE, "r") as f:
+            if json.load(f) == data:
+                return False
+    except (OSError, ValueError):
+        pass
+
+    # A temp file per writer: Blink.py, the monitor and the service may all
+    # save at once. mkstemp creates it readable by the owner only
+    fd, tmp_path = tempfile.mkstemp(dir=CREDS_FILE.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, CREDS_FILE)
+    except OSError as e:
+        log.warning(f"Could not save Blink credentials: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
@@ -0,0 +1,186 @@
+"""
+Display-ready copies of Blink motion clips.
+
+Some cameras record MP4s with the moov atom at the end and at resolutions
+Chromium on a Pi decodes in software, so clips stutter and start late on
+the mirror. Before BlinkMonitor publishes a new clip it is passed through
+ffmpeg: a faststart remux (moov first, no re-encode), or a downscaled H.264
+re-encode when max_width/max_height are set, plus a poster JPEG of the
+first frame for the mirror to show while the video loads. The outputs are
+cached in media/display/ under the clip's name (poster: same name, .jpg)
+and node_helper.js serves them instead of the original when present.
+
+Requires ffmpeg on the PATH; without it clips are shown as downloaded.
+"""
+
+import asyncio
+import os
+import shutil
+from pathlib import Path
+
+from structured_logging import get_logger
+
+log = get_logger("clips")
+
+DISPLAY_SUBFOLDER = "display"
+
+
+def display_paths(video_path: Path):
+    """(display video, poster) for a clip in media/"""
+    video_path = Path(video_path)
+    folder = video_path.parent / DISPLAY_SUBFOLDER
+    return folder / video_path.name, folder / f"{video_path.stem}.jpg"
+
+
+def staging_path(video_path: Path) -> Path:
+    """Hidden name a clip is downloaded to until its display copies are ready"""
+    video_path = Path(video_path)
+    return video_path.with_name(f".{video_path.name}")
+
+
+class ClipProcessor:
+    """
+    Bounded ffmpeg worker queue: at most `workers` ffmpeg processes run at
+    once and at most `max_queue` clips wait, so a burst of motion can't pile
+    up encodes on the Pi. Callers wait up to `timeout` seconds for a clip;
+    after that it finishes in the background, and ffmpeg is killed if it is
+    still running after `kill_timeout` seconds so a hung run can't hold its
+    worker slot.
+    """
+
+    def __init__(self, workers=1, max_queue=4, max_width=0, max_height=0,
+                 video_codec="libx264", timeout=15, kill_timeout=300):
+        self.ffmpeg = shutil.which("ffmpeg")
+        self.slots = asyncio.Semaphore(workers)
+        self.max_queue = max_queue
+        self.max_width = max_width
+        self.max_height = max_height
+        self.video_codec = video_codec
+        self.timeout = timeout
+        self.kill_timeout = kill_timeout
+        self.queued = 0
+        self.tasks = set()  # Keeps background jobs referenced until they finish
+        self.busy = set()  # Sources queued or being read by ffmpeg
+        self.published = set()  # Busy sources already published; removed when their job ends
+
+    @property
+    def enabled(self) -> bool:
+        return self.ffmpeg is not None
+
+    def scale_filter(self):
+        if not (self.max_width and self.max_height):
+            return None
+        # Only ever shrink, keep the aspect ratio, and keep sizes even for H.264
+        return (f"scale='min({self.max_width},iw)':'min({self.max_height},ih)'"
+                ":force_original_aspect_ratio=decrease,scale=trunc(iw/2)*2:trunc(ih/2)*2")
+
+    def command(self, source: Path, video_out: Path, poster_out: Path) -> list:
+        """One ffmpeg run writing both the display video and the poster"""
+        scale = self.scale_filter()
+        command = [self.ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-i", str(source),
+                   "-map", "0:v:0", "-map", "0:a?"]
+
+        if scale:
+            command += ["-vf", scale, "-c:v", self.video_codec, "-pix_fmt", "yuv420p", "-c:a", "copy"]
+            if self.video_codec == "libx264":
+                command += ["-preset", "veryfast", "-crf", "23"]
+        else:
+            command += ["-c", "copy"]
+        command += ["-movflags", "+faststart", str(video_out)]
+
+        command += ["-map", "0:v:0", "-frames:v", "1", "-q:v", "3"]
+        if scale:
+            command += ["-vf", scale]
+        command.append(str(poster_out))
+        return command
+
+    async def _run(self, source: Path, video_path: Path) -> bool:
+        try:
+            async with self.slots:
+                video_out, poster_out = display_paths(video_path)
+                video_out.parent.mkdir(exist_ok=True)
+                tmp_video = video_out.with_name(f".{video_out.stem}.tmp.mp4")
+                tmp_poster = poster_out.with_name(f".{poster_out.stem}.tmp.jpg")
+
+                process = await asyncio.create_subprocess_exec(
+                    *self.command(source, tmp_video, tmp_poster),
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                try:
+                    _, stderr = await asyncio.wait_for(process.communicate(), self.kill_timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    log.warning(f"ffmpeg still running for {video_path.name} after "
+                                f"{self.kill_timeout}s, killed it")
+                    for path in (tmp_video, tmp_poster):
+                        path.unlink(missing_ok=True)
+                    return False
+
+                if process.returncode != 0 or not tmp_video.exists():
+                    message = stderr.decode(errors="replace").strip().splitlines()
+                    log.warning(f"ffmpeg failed for {video_path.name}: "
+                                f"{message[-1] if message else process.returncode}")
+                    for path in (tmp_video, tmp_poster):
+                        path.unlink(missing_ok=True)
+                    return False
+
+                os.replace(tmp_video, video_out)
+                if tmp_poster.exists():
+                    os.replace(tmp_poster, poster_out)
+                return True
+        except OSError as e:
+            log.warning(f"Could not process {video_path.name}: {e}")
+            return False
+        finally:
+            self.queued -= 1
+            self.busy.discard(source)
+            if source in self.published:
+                self.published.discard(source)
+                source.unlink(missing_ok=True)
+
+    async def process(self, source: Path, video_path: Path) -> bool:
+        """
+        Make display copies of the clip downloaded to source, which will be
+        published as video_path. Returns True if they are ready; False if
+        ffmpeg is missing, the queue is full, it failed, or it is still
+        running after timeout seconds.
+        """
+        if not self.enabled:
+            return False
+        if self.queued >= self.max_queue:
+            log.warning(f"Clip processing queue full, showing {video_path.name} as downloaded")
+            return False
+
+        self.queued += 1
+        self.busy.add(Path(source))
+        task = asyncio.ensure_future(self._run(Path(source), Path(video_path)))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            log.warning(f"{video_path.name} still processing after {self.timeout}s, "
+                        f"publishing it as downloaded")
+            return False
+
+    def publish(self, source: Path, video_path: Path):
+        """
+        Move a downloaded clip from its staging name to video_path. If ffmpeg
+        is still working on it, video_path is a hard link instead and the
+        staging name goes when the job ends.
+        """
+        source = Path(source)
+        if source not in self.busy:
+            os.replace(source, video_path)
+            return
+
+        tmp_path = video_path.with_name(f".{video_path.stem}.link")
+        tmp_path.unlink(missing_ok=True)
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, video_path)
+        self.published.add(source)
@@ -0,0 +1,216 @@
+"""
+Shared helpers for the Dropbox scripts (Dropbox.py, DropboxOAuth.py).
+Keeps file locations, atomic JSON writes, Dropbox's content hash and the
+local sync manifest in one place.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from structured_logging import get_logger
+
+log = get_logger("dropbox")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_FILE = os.path.join(SCRIPT_DIR, "dropbox_config.json")
+TOKEN_FILE = os.path.join(SCRIPT_DIR, "dropbox_token.json")
+CURSOR_FILE = os.path.join(SCRIPT_DIR, "dropbox_cursor.json")
+MANIFEST_FILE = os.path.join(SCRIPT_DIR, "dropbox_manifest.json")
+LOCAL_FOLDER = os.path.join(SCRIPT_DIR, "Pictures")
+
+HASH_BLOCK_SIZE = 4 * 1024 * 1024  # Dropbox hashes files in 4 MB blocks
+HASH_READ_SIZE = 64 * 1024
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file in the same folder, then rename it over path"""
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ContentHasher:
+    """
+    Incremental implementation of Dropbox's content_hash: the SHA-256 of the
+    concatenated SHA-256 digests of each 4 MB block of the file
+    """
+
+    def __init__(self):
+        self._overall = hashlib.sha256()
+        self._block = hashlib.sha256()
+        self._block_pos = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while len(view):
+            if self._block_pos == HASH_BLOCK_SIZE:
+                self._overall.update(self._block.digest())
+                self._block = hashlib.sha256()
+                self._block_pos = 0
+
+            part = view[:HASH_BLOCK_SIZE - self._block_pos]
+            self._block.update(part)
+            self._block_pos += len(part)
+            view = view[len(part):]
+
+    def hexdigest(self):
+        overall = self._overall.copy()
+        if self._block_pos > 0:
+            overall.update(self._block.digest())
+        return overall.hexdigest()
+
+
+def content_hash_file(path):
+    """Compute the Dropbox content_hash of a local file"""
+    hasher = ContentHasher()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Manifest:
+    """
+    Local index of synced files, stored as JSON in dropbox_manifest.json:
+
+        {"files": {"<name>": {"id", "rev", "content_hash", "size",
+                              "server_modified", "local_hash",
+                              "local_size", "local_mtime", "thumbnail"}}}
+
+    local_hash is the content hash of the file on disk and is only recomputed
+    when its size or mtime changes, so unchanged photos are hashed once.
+    thumbnail is the Dropbox thumbnail size when the local file is a
+    thumbnail (display sync mode) rather than the original.
+    """
+
+    def __init__(self, path=MANIFEST_FILE, folder=LOCAL_FOLDER):
+        self.path = path
+        self.folder = folder
+        self.files = {}
+        self.dirty = False
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.files = json.load(f).get("files", {})
+            except (OSError, ValueError) as e:
+                log.warning(f"Could not read manifest, rebuilding it: {e}")
+
+        # local_hash -> names, for spotting renames and duplicates without a scan
+        self.by_hash = {}
+        for name, record in self.files.items():
+            self._index(name, None, record.get("local_hash"))
+
+    def _index(self, name, old_hash, new_hash):
+        if old_hash and old_hash in self.by_hash:
+            self.by_hash[old_hash].discard(name)
+        if new_hash:
+            self.by_hash.setdefault(new_hash, set()).add(name)
+
+    def _set_local(self, name, record, local_hash, stat):
+        self._index(name, record.get("local_hash"), local_hash)
+        record["local_hash"] = local_hash
+        record["local_size"] = stat.st_size
+        record["local_mtime"] = stat.st_mtime
+        self.dirty = True
+
+    def local_path(self, name):
+        return os.path.join(self.folder, name)
+
+    def get(self, name):
+        return self.files.get(name)
+
+    def local_hash(self, name):
+        """Content hash of the local copy of name, using the cached value if the file is unchanged"""
+        path = self.local_path(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        record = self.files.setdefault(name, {})
+        if (record.get("local_hash") and record.get("local_size") == stat.st_size
+                and record.get("local_mtime") == stat.st_mtime):
+            return record["local_hash"]
+
+        self._set_local(name, record, content_hash_file(path), stat)
+        return record["local_hash"]
+
+    def find_local_copy(self, content_hash):
+        """Name of a local file whose cached hash matches content_hash, if any"""
+        if not content_hash:
+            return None
+
+        for name in self.by_hash.get(content_hash, ()):
+            record = self.files[name]
+            try:
+                stat = os.stat(self.local_path(name))
+            except OSError:
+                continue
+            if stat.st_size == record.get("local_size") and stat.st_mtime == record.get("local_mtime"):
+                return name
+        return None
+
+    def record(self, name, entry, local_hash=None, thumbnail=None):
+        """
+        Store Dropbox metadata for name and, when local_hash is given, the
+        state of the local copy that was just written (and whether it is a
+        thumbnail)
+        """
+        record = self.files.setdefault(name, {})
+        remote = {
+            "id": entry.id,
+            "rev": entry.rev,
+            "content_hash": entry.content_hash,
+            "size": entry.size,
+            "server_modified": entry.server_modified.isoformat() if entry.server_modified else None,
+        }
+        if any(record.get(key) != value for key, value in remote.items()):
+            record.update(remote)
+            self.dirty = True
+
+        if local_hash:
+            if thumbnail:
+                record["thumbnail"] = thumbnail
+            else:
+                record.pop("thumbnail", None)
+            try:
+                self._set_local(name, record, local_hash, os.stat(self.local_path(name)))
+            except OSError:
+                pass
+
+    def rename(self, old_name, new_name):
+        if old_name in self.files:
+            self.remove(new_name)
+            record = self.files.pop(old_name)
+            self.files[new_name] = record
+            self._index(old_name, record.get("local_hash"), None)
+            self._index(new_name, None, record.get("local_hash"))
+            self.dirty = True
+
+    def remove(self, name):
+        record = self.files.pop(name, None)
+        if record is not None:
+            self._index(name, record.get("local_hash"), None)
+            self.dirty = True
+
+    def prune(self, keep):
+        """Drop entries for names not in keep"""
+        for name in [n for n in self.files if n not in keep]:
+            self.remove(name)
+
+    def save(self):
+        if self.dirty:
+            write_json_atomic(self.path, {"files": self.files})
+            self.dirty = False
@@ -0,0 +1,134 @@
+"""
+Priority I/O scheduling between the Blink capture, Dropbox sync and media
+cleanup running in one process (see PictureVerseService.py).
+
+A motion clip competing with a large Dropbox sync for the uplink and the SD
+card often hit its download timeout. Every transfer now belongs to a
+priority class:
+
+    MOTION    live motion snapshots and clips (never held back)
+    SNAPSHOT  on-demand camera snapshots from the mirror
+    SYNC      Dropbox photo downloads and renditions
+    CLEANUP   media retention deletes
+
+While a transfer of a higher class is running, a lower class does not start
+new work (wait_turn, for at most MAX_PAUSE seconds so its connections don't
+time out), and work already under way is slowed to THROTTLED_RATE
+(throttle). allocation() reports what each class is getting.
+
+Blocking code (the Dropbox threads, cleanup) uses wait_turn/throttle;
+asyncio code (Blink) uses async_throttle. Scheduling only covers work in the
+same process, so separate scripts don't hold each other back.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+MOTION, SNAPSHOT, SYNC, CLEANUP = range(4)
+CLASS_NAMES = ("motion", "snapshot", "sync", "cleanup")
+
+MAX_PAUSE = 30  # Longest a lower class waits for higher ones before going on throttled
+THROTTLED_RATE = 128 * 1024  # Bytes/second for a lower class while a higher one runs
+RATE_WINDOW = 10  # Seconds of history behind the reported rates
+
+
+class IOScheduler:
+    """Shared by every thread and task in the process (see `scheduler` below)"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.active = [0] * len(CLASS_NAMES)  # Transfers running per class
+        self.waiting = [0] * len(CLASS_NAMES)  # Paused in wait_turn or throttle
+        self.total_bytes = [0] * len(CLASS_NAMES)
+        self.history = deque()  # (time, class, bytes) within RATE_WINDOW
+
+    def higher_active(self, priority: int) -> bool:
+        """Whether a class above priority has a transfer running"""
+        return any(self.active[:priority])
+
+    @contextmanager
+    def transfer(self, priority: int):
+        """Mark a transfer of priority as running for the duration"""
+        with self.condition:
+            self.active[priority] += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active[priority] -= 1
+                self.condition.notify_all()
+
+    def record(self, priority: int, nbytes: int):
+        """Count bytes moved by priority (for allocation())"""
+        if not nbytes:
+            return
+        now = time.monotonic()
+        with self.condition:
+            self.total_bytes[priority] += nbytes
+            self.history.append((now, priority, nbytes))
+            while self.history and now - self.history[0][0] > RATE_WINDOW:
+                self.history.popleft()
+
+    def wait_turn(self, priority: int):
+        """Block before starting new work while a higher class is running"""
+        with self.condition:
+            if not self.higher_active(priority):
+                return
+            self.waiting[priority] += 1
+            deadline = time.monotonic() + MAX_PAUSE
+            while self.higher_active(priority):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            self.waiting[priority] -= 1
+
+    def throttle(self, priority: int, nbytes: int):
+        """Count a chunk of a running transfer, slowing down while a higher class runs"""
+        self.record(priority, nbytes)
+        if nbytes and self.higher_active(priority):
+            time.sleep(nbytes / THROTTLED_RATE)
+
+    async def async_throttle(self, priority: int, nbytes: int):
+        """throttle() for asyncio code"""
+        self.record(priority, nbytes)
+        if nbytes and self.higher_active(priority):
+            await asyncio.sleep(nbytes / THROTTLED_RATE)
+
+    def allocation(self) -> dict:
+        """
+        Per class: running transfers, paused ones, state (idle, running or
+        throttled), bytes/second over the last RATE_WINDOW seconds, share of
+        all bytes moved in that window, and bytes moved since start
+        """
+        now = time.monotonic()
+        with self.condition:
+            recent = [0] * len(CLASS_NAMES)
+            for at, priority, nbytes in self.history:
+                if now - at <= RATE_WINDOW:
+                    recent[priority] += nbytes
+            total_recent = sum(recent)
+
+            classes = {}
+            for priority, name in enumerate(CLASS_NAMES):
+                if not self.active[priority]:
+                    state = "idle"
+                elif self.higher_active(priority):
+                    state = "throttled"
+                else:
+                    state = "running"
+                classes[name] = {
+                    "active": self.active[priority],
+                    "waiting": self.waiting[priority],
+                    "state": state,
+                    "bytes_per_second": round(recent[priority] / RATE_WINDOW, 1),
+                    "share": round(recent[priority] / total_recent, 3) if total_recent else 0.0,
+                    "total_bytes": self.total_bytes[priority],
+                }
+            return classes
+
+
+scheduler = IOScheduler()
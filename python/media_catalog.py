@@ -0,0 +1,269 @@
+"""
+Media catalog: an SQLite index (WAL mode, so the monitor, Blink.py, the
+Dropbox daemon and cleanup can use it at the same time) of the Blink
+captures in media/ and the family photos in Pictures/.
+
+The scripts record files here as they write or delete them, so cleanup and
+listing are index queries instead of directory rescans. After a change the
+catalog also writes that folder's index for node_helper.js, so it doesn't
+stat every file: media_index.json (newest snapshot per camera, newest
+videos) for media/ and photo_index.json (photos newest first) for
+Pictures/. A missing catalog is rebuilt from disk.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import blink_common
+import dropbox_common
+from blink_common import parse_media_name
+from media_events import announce, removed_event, saved_event
+from structured_logging import get_logger
+
+log = get_logger("catalog")
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+CATALOG_FILE = SCRIPT_DIR / "media_catalog.db"
+INDEX_FILE = SCRIPT_DIR / "media_index.json"
+PHOTO_INDEX_FILE = SCRIPT_DIR / "photo_index.json"
+
+NEWEST_VIDEOS = 50  # Videos listed in media_index.json
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    folder TEXT NOT NULL,   -- "media" (Blink) or "Pictures" (Dropbox)
+    name TEXT NOT NULL,
+    camera TEXT,            -- Blink captures only
+    taken TEXT,             -- YYYYMMDD_HHMMSS from the Blink file name
+    kind TEXT NOT NULL,     -- "image", "video" or "photo"
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (folder, name)
+);
+CREATE INDEX IF NOT EXISTS media_camera ON media (folder, camera, kind, taken);
+CREATE INDEX IF NOT EXISTS media_kind ON media (folder, kind, taken);
+CREATE INDEX IF NOT EXISTS media_mtime ON media (folder, mtime);
+CREATE TABLE IF NOT EXISTS rebuilds (
+    folder TEXT PRIMARY KEY,
+    at REAL NOT NULL        -- When the folder was last rebuilt from disk
+);
+"""
+
+
+def folder_path(folder: str) -> Path:
+    """Location on disk of a catalog folder"""
+    if folder == "media":
+        return Path(blink_common.MEDIA_FOLDER)
+    return Path(dropbox_common.LOCAL_FOLDER)
+
+
+def describe(folder: str, name: str, stat) -> tuple:
+    """Catalog row for a file, or None if it isn't media we track"""
+    if folder == "media":
+        parts = parse_media_name(name)
+        if not parts:
+            return None
+        camera, taken, kind = parts
+    else:
+        if not name.lower().endswith(PHOTO_EXTENSIONS):
+            return None
+        camera, taken, kind = None, None, "photo"
+    return (folder, name, camera, taken, kind, stat.st_size, stat.st_mtime)
+
+
+class MediaCatalog:
+    """Connection to the catalog database; rebuilds it from disk when it is new"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or CATALOG_FILE)
+        is_new = not self.path.exists()
+
+        self.conn = sqlite3.connect(str(self.path), timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        if is_new:
+            self.rebuild()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # ---------- updates ----------
+    def rebuild(self, folders=("media", "Pictures")):
+        """Replace the catalog entries for folders with what is on disk"""
+        for folder in folders:
+            rows = []
+            path = folder_path(folder)
+            if path.exists():
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            row = describe(folder, entry.name, entry.stat())
+                            if row:
+                                rows.append(row)
+
+            with self.conn:
+                self.conn.execute("DELETE FROM media WHERE folder = ?", (folder,))
+                self.conn.executemany("INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self.conn.execute("INSERT OR REPLACE INTO rebuilds VALUES (?, ?)", (folder, time.time()))
+            log.info(f"Media catalog rebuilt for {folder}/: {len(rows)} files")
+
+    def rebuild_if_stale(self, folder: str, max_age: float) -> bool:
+        """
+        Rebuild folder if it hasn't been rebuilt for max_age seconds, to pick
+        up files added or deleted behind the catalog's back
+        """
+        row = self.conn.execute("SELECT at FROM rebuilds WHERE folder = ?", (folder,)).fetchone()
+        if row and time.time() - row[0] < max_age:
+            return False
+        self.rebuild((folder,))
+        return True
+
+    def sync(self, folder: str):
+        """
+        Catch up with files added or deleted behind the catalog's back.
+        Lists the folder's names but only stats the ones it doesn't know.
+        """
+        path = folder_path(folder)
+        on_disk = set(os.listdir(path)) if path.exists() else set()
+        known = {name for (name,) in self.conn.execute("SELECT name FROM media WHERE folder = ?", (folder,))}
+
+        if known - on_disk:
+            self.remove(folder, known - on_disk)
+        if on_disk - known:
+            self.add(folder, on_disk - known)
+
+    def add(self, folder: str, names) -> list:
+        """Record files that were just written to folder; returns their rows"""
+        rows = []
+        path = folder_path(folder)
+        for name in names:
+            try:
+                row = describe(folder, name, os.stat(path / name))
+            except OSError:
+                continue
+            if row:
+                rows.append(row)
+
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return rows
+
+    def remove(self, folder: str, names):
+        """Forget files that were deleted from folder"""
+        with self.conn:
+            self.conn.executemany("DELETE FROM media WHERE folder = ? AND name = ?",
+                                  [(folder, name) for name in names])
+
+    # ---------- queries ----------
+    def newest_per_camera(self, kind: str = "image") -> dict:
+        """{camera: name} of the newest Blink capture of kind for each camera"""
+        # SQLite returns the row holding MAX() for the bare column
+        rows = self.conn.execute(
+            "SELECT camera, name, MAX(taken) FROM media WHERE folder = 'media' AND kind = ? GROUP BY camera",
+            (kind,),
+        )
+        return {camera: name for camera, name, taken in rows}
+
+    def newest(self, kind: str, limit: int) -> list:
+        """Names of the newest limit Blink captures of kind"""
+        rows = self.conn.execute(
+            "SELECT name FROM media WHERE folder = 'media' AND kind = ? ORDER BY taken DESC LIMIT ?",
+            (kind, limit),
+        )
+        return [name for (name,) in rows]
+
+    def blink_media(self) -> list:
+        """(name, camera, taken, kind, size) for every Blink capture, for retention"""
+        return self.conn.execute(
+            "SELECT name, camera, taken, kind, size FROM media WHERE folder = 'media'"
+        ).fetchall()
+
+    def total_size(self, folder: str) -> int:
+        """Bytes of the files recorded in folder"""
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM media WHERE folder = ?",
+                                 (folder,)).fetchone()[0]
+
+    def older_than(self, taken: str) -> list:
+        """Names of Blink captures taken before taken (YYYYMMDD_HHMMSS)"""
+        rows = self.conn.execute(
+            "SELECT name FROM media WHERE folder = 'media' AND taken < ?", (taken,)
+        )
+        return [name for (name,) in rows]
+
+    def photos(self) -> list:
+        """Family photo names, most recently written first"""
+        rows = self.conn.execute(
+            "SELECT name FROM media WHERE folder = 'Pictures' ORDER BY mtime DESC"
+        )
+        return [name for (name,) in rows]
+
+    def export_index(self, folders=("media", "Pictures")):
+        """Write the index of each of folders for node_helper.js"""
+        for folder in folders:
+            if folder == "media":
+                images = self.newest_per_camera("image")
+                write_index(INDEX_FILE, {
+                    "images": sorted(images.values(), key=lambda n: parse_media_name(n)[1], reverse=True),
+                    "videos": self.newest("video", NEWEST_VIDEOS),
+                })
+            else:
+                write_index(PHOTO_INDEX_FILE, {"photos": self.photos()})
+
+
+def write_index(path: Path, index: dict):
+    """Replace an index file in one step, so node_helper.js never reads half of it"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"updated": time.time(), **index}, f)
+    os.replace(tmp_path, path)
+
+
+def announce_media(rows=(), removed=()):
+    """Push catalog rows of new Blink files and removed names to node_helper.js"""
+    path = folder_path("media")
+    events = [removed_event("media", name) for name in removed]
+    events += [saved_event(folder, path / name, camera, kind, taken, size)
+               for folder, name, camera, taken, kind, size, mtime in rows if folder == "media"]
+    announce(events)
+
+
+def record_media(folder: str, added=(), removed=()):
+    """
+    Record written and deleted files in the catalog, refresh the folder's
+    index and announce Blink media to node_helper.js (see media_events.py).
+    Never raises: a catalog problem must not fail a capture or sync.
+    Blocks on SQLite and the disk, so async code runs it in a thread.
+    """
+    removed = [Path(p).name for p in removed]
+    rows = []
+    try:
+        with MediaCatalog() as catalog:
+            if removed:
+                catalog.remove(folder, removed)
+            if added:
+                rows = catalog.add(folder, [Path(p).name for p in added if p])
+            catalog.export_index((folder,))
+    except (sqlite3.Error, OSError) as e:
+        log.warning(f"Could not update media catalog: {e}")
+
+    if folder == "media":
+        announce_media(rows, removed)
+
+
+if __name__ == "__main__":
+    with MediaCatalog() as catalog:
+        catalog.rebuild()
+        catalog.export_index()
+    print(f"[OK] Wrote {INDEX_FILE} and {PHOTO_INDEX_FILE}")
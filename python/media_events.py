@@ -0,0 +1,62 @@
+"""
+Media events: JSON lines pushed to node_helper.js over a Unix socket
+(python/media_events.sock) whenever Blink media is saved or deleted, so the
+mirror hears about a new capture the moment it is written instead of
+node_helper.js running Blink.py and rescanning media/ afterwards.
+
+node_helper.js listens on the socket and reads one event per line until the
+connection closes, so the files from one capture arrive as one batch:
+
+    {"event": "media_saved", "folder": "media", "file": "Garage_20240101_120000.mp4",
+     "path": "/.../media/Garage_20240101_120000.mp4", "camera": "Garage",
+     "kind": "video", "taken": "20240101_120000", "size": 1048576, "time": 1704110400.0}
+    {"event": "media_removed", "folder": "media", "file": "...", "time": ...}
+
+If the mirror isn't running nothing is sent; its media watcher and the
+media index cover anything it missed.
+"""
+
+import json
+import socket
+import time
+from pathlib import Path
+
+from structured_logging import get_logger
+
+log = get_logger("events")
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+EVENTS_SOCKET = SCRIPT_DIR / "media_events.sock"
+SEND_TIMEOUT = 1  # Seconds; node_helper.js only has to accept the connection
+
+
+def saved_event(folder: str, path, camera, kind: str, taken, size: int) -> dict:
+    path = Path(path)
+    return {"event": "media_saved", "folder": folder, "file": path.name, "path": str(path),
+            "camera": camera, "kind": kind, "taken": taken, "size": size, "time": time.time()}
+
+
+def removed_event(folder: str, name: str) -> dict:
+    return {"event": "media_removed", "folder": folder, "file": name, "time": time.time()}
+
+
+def announce(events) -> bool:
+    """
+    Send events to node_helper.js as one batch. Never raises: a mirror that
+    isn't listening must not fail a capture or cleanup.
+    """
+    if not events or not EVENTS_SOCKET.exists():
+        return False
+
+    payload = "".join(json.dumps(event) + "\n" for event in events).encode()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(SEND_TIMEOUT)
+            sock.connect(str(EVENTS_SOCKET))
+            sock.sendall(payload)
+        return True
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False  # Stale socket from a mirror that has stopped
+    except OSError as e:
+        log.warning(f"Could not announce media events: {e}")
+        return False
@@ -0,0 +1,204 @@
+"""
+Metrics in the Prometheus text exposition format.
+
+Each script defines its counters, gauges and histograms at module level and
+calls start_exporter(name) from its main; every EXPORT_INTERVAL seconds (and
+at exit) the values are written to metrics/<name>.prom. node_helper.js
+serves all of those files together at /pictureverse/metrics. Every sample
+carries a process="<name>" label, so separately run scripts never clash.
+
+    pictureverse_dropbox_files_downloaded_total{process="pictureverse_service"} 42
+
+Process RSS and start time are added to every file. node_helper.js skips
+files not written for a few EXPORT_INTERVALs, so a process that stopped
+stops being reported.
+"""
+
+import atexit
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+from structured_logging import get_logger
+
+log = get_logger("metrics")
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+METRICS_DIR = SCRIPT_DIR / "metrics"
+
+EXPORT_INTERVAL = 15  # Seconds between writes of metrics/<name>.prom
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+_registry = []
+_registry_lock = threading.Lock()
+_started_at = time.time()
+_exporter = None
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    A metric family; samples are kept per label set. Without labelnames
+    the single sample is exported (as zero) before anything is recorded.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}  # sorted label tuple -> value
+        if not self.labelnames:
+            self.values[()] = self.initial()
+        with _registry_lock:
+            _registry.append(self)
+
+    def samples(self):
+        """(name suffix, labels, value) for every sample"""
+        with self.lock:
+            return [("", labels, value) for labels, value in self.values.items()]
+
+    def render(self, extra_labels) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_label_text(tuple(extra_labels) + labels)} {_number(value)}")
+        return "\n".join(lines)
+
+    def initial(self):
+        return 0
+
+
+class Counter(Metric):
+    """A total that only goes up (resets when the process restarts)"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that is set, or read from func() at export time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, func=None, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.func = func
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def samples(self):
+        if self.func:
+            value = self.func()
+            return [] if value is None else [("", (), value)]
+        return super().samples()
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, help_text, labelnames)
+
+    def initial(self):
+        return [0] * len(self.buckets), 0.0
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total = self.values.get(key) or self.initial()
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        samples = []
+        for labels, counts, total in items:
+            for bound, count in zip(self.buckets, counts):
+                samples.append(("_bucket", labels + (("le", _number(bound)),), count))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, counts[-1]))
+        return samples
+
+
+def process_rss():
+    """Resident memory of this process in bytes (Linux), or None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+Gauge("pictureverse_process_resident_memory_bytes", "Resident memory of the process", process_rss)
+Gauge("pictureverse_process_start_time_seconds", "Unix time the process started", lambda: _started_at)
+
+
+def render(process: str) -> str:
+    """All metrics of this process in the text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    extra = (("process", process),)
+    return "\n".join(metric.render(extra) for metric in metrics) + "\n"
+
+
+def write_metrics(process: str) -> Path:
+    """Write metrics/<process>.prom atomically; returns its path"""
+    METRICS_DIR.mkdir(exist_ok=True)
+    path = METRICS_DIR / f"{process}.prom"
+    part_path = path.with_name(path.name + ".part")
+    part_path.write_text(render(process))
+    os.replace(part_path, path)
+    return path
+
+
+def start_exporter(process: str):
+    """Write this process's metrics every EXPORT_INTERVAL seconds and at exit"""
+    global _exporter
+    if _exporter:
+        return
+
+    def export():
+        try:
+            write_metrics(process)
+        except OSError as e:
+            log.warning(f"Could not write metrics: {e}")
+
+    def loop():
+        while True:
+            export()
+            time.sleep(EXPORT_INTERVAL)
+
+    _exporter = threading.Thread(target=loop, name="metrics", daemon=True)
+    _exporter.start()
+    atexit.register(export)
@@ -0,0 +1,158 @@
+"""
+Motion-to-screen latency tracing.
+
+BlinkMonitor.py records one trace per motion capture (detection, snapshot
+trigger, capture wait, refresh, snapshot download and each video attempt)
+as a JSON line in logs/motion_latency.jsonl. node_helper.js appends its own
+lines for the same files when the media watcher sees them ("watcher_add")
+and when BLINK_MEDIA_READY is sent ("media_ready").
+
+Run this script to print p50/p95 summaries of every span, which is what
+CAPTURE_WAIT_* and the download timeouts should be tuned from:
+
+    python motion_latency.py [--hours 24]
+"""
+
+import json
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from structured_logging import get_logger
+
+log = get_logger("latency")
+
+LATENCY_LOG = Path(__file__).parent.absolute() / "logs" / "motion_latency.jsonl"
+MAX_LOG_BYTES = 5 * 1024 * 1024  # Rotated to motion_latency.jsonl.1 beyond this
+
+
+class MotionTrace:
+    """Timing spans for one motion capture on one camera"""
+
+    def __init__(self, camera: str, detected_at: float = None):
+        self.camera = camera
+        self.detected_at = detected_at or time.time()
+        self.spans = {}
+        self.files = []
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block as span name"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.spans[name] = round(time.monotonic() - start, 3)
+
+    def add_span(self, name: str, seconds: float):
+        """Record a span that was timed elsewhere"""
+        if seconds is not None:
+            self.spans[name] = round(seconds, 3)
+
+    def add_file(self, path):
+        """Remember a file this capture produced, to match node_helper events"""
+        if path:
+            self.files.append(Path(path).name)
+
+    def write(self, ok: bool, path: Path = None):
+        """Append the trace to the latency log"""
+        record = {
+            "source": "monitor",
+            "camera": self.camera,
+            "detected_at": round(self.detected_at, 3),
+            "ok": ok,
+            "total": round(time.time() - self.detected_at, 3),
+            "spans": self.spans,
+            "files": self.files,
+        }
+        append_record(record, path)
+
+
+def append_record(record: dict, path: Path = None):
+    """Append one JSON line to the latency log, rotating it when it gets large"""
+    path = path or LATENCY_LOG
+    try:
+        path.parent.mkdir(exist_ok=True)
+        if path.exists() and path.stat().st_size > MAX_LOG_BYTES:
+            os.replace(path, path.with_name(path.name + ".1"))
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        log.warning(f"Could not write latency log: {e}")
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def load_samples(path: Path = None, since: float = 0) -> dict:
+    """
+    Read the latency log and return {span name: [seconds, ...]}, including
+    end-to-end spans joined from node_helper events by file name
+    """
+    path = path or LATENCY_LOG
+    traces = []
+    node_events = {}  # (file, event) -> earliest time
+
+    if not path.exists():
+        return {}
+
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+
+            if record.get("source") == "monitor":
+                if record.get("detected_at", 0) >= since:
+                    traces.append(record)
+            elif record.get("source") == "node":
+                key = (record.get("file"), record.get("event"))
+                if key not in node_events or record["at"] < node_events[key]:
+                    node_events[key] = record["at"]
+
+    samples = {}
+    for trace in traces:
+        for name, seconds in trace.get("spans", {}).items():
+            samples.setdefault(name, []).append(seconds)
+        samples.setdefault("capture_total", []).append(trace["total"])
+
+        for event in ("watcher_add", "media_ready"):
+            times = [node_events[(name, event)] for name in trace.get("files", [])
+                     if (name, event) in node_events]
+            if times:
+                samples.setdefault(f"detected_to_{event}", []).append(
+                    round(min(times) - trace["detected_at"], 3)
+                )
+
+    return samples
+
+
+def print_report(samples: dict):
+    """Print count/p50/p95/max per span"""
+    if not samples:
+        print("No latency data yet")
+        return
+
+    print(f"{'span':<28}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}")
+    print("-" * 62)
+    for name in sorted(samples):
+        values = samples[name]
+        print(f"{name:<28}{len(values):>7}{percentile(values, 50):>9.2f}"
+              f"{percentile(values, 95):>9.2f}{max(values):>9.2f}")
+
+
+if __name__ == "__main__":
+    hours = None
+    if "--hours" in sys.argv:
+        hours = float(sys.argv[sys.argv.index("--hours") + 1])
+
+    since = time.time() - hours * 3600 if hours else 0
+    print_report(load_samples(since=since))
@@ -0,0 +1,287 @@
+"""
+Display-size renditions of family photos.
+
+Decoding full-resolution phone photos on every slide makes transitions
+stutter on a Pi, so the Dropbox sync writes a screen-sized JPEG/WebP copy of
+each photo into Renditions/ and node_helper.js serves those instead of the
+originals (see Renditions/index.json). Renditions are keyed by the source's
+content hash and mtime. When the cache grows past max_cache_mb the oldest
+renditions are deleted first (first in, first out: the sync can't tell when
+a photo is shown); their photos are served as originals until a later sync
+finds room to render them again.
+
+Requires Pillow; without it the originals are served as before.
+"""
+
+import hashlib
+import json
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+from dropbox_common import SCRIPT_DIR, LOCAL_FOLDER, write_json_atomic
+from io_scheduler import SYNC, scheduler
+from structured_logging import get_logger, limited
+
+log = get_logger("renditions")
+
+RENDITION_FOLDER = os.path.join(SCRIPT_DIR, "Renditions")
+INDEX_NAME = "index.json"
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "max_width": 1920,
+    "max_height": 1080,
+    "format": "jpeg",  # "jpeg" or "webp"
+    "quality": 85,
+    "max_cache_mb": 512,
+    "max_per_run": 100,  # Backfill limit per sync so a first run doesn't block for hours
+}
+
+FORMAT_EXTENSIONS = {"jpeg": "jpg", "webp": "webp"}
+
+
+def get_settings(config):
+    """Rendition settings from the "renditions" block of dropbox_config.json"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(config.get("renditions") or {})
+    if settings["format"] not in FORMAT_EXTENSIONS:
+        log.warning(f"Unknown rendition format '{settings['format']}', using jpeg")
+        settings["format"] = "jpeg"
+    return settings
+
+
+class RenditionCache:
+    """
+    Maintains Renditions/ and its index.json, which maps each source photo
+    name to {"file": rendition file name, "key": cache key}. "file" is null
+    for photos that are served as-is (already screen-sized, animated GIFs,
+    or not decodable) and for evicted ones, which also have "evicted": true.
+    """
+
+    def __init__(self, settings, source_folder=None, folder=None):
+        self.settings = settings
+        self.source_folder = source_folder or LOCAL_FOLDER
+        self.folder = folder or RENDITION_FOLDER
+        self.index_path = os.path.join(self.folder, INDEX_NAME)
+        self.extension = FORMAT_EXTENSIONS[settings["format"]]
+        self.signature = "{max_width}x{max_height}:{format}:{quality}".format(**settings)
+        self.index = {}
+        self.dirty = False
+        self.restyled = set()  # Names whose served file changed in this run
+
+        os.makedirs(self.folder, exist_ok=True)
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    data = json.load(f)
+                # Renditions made with different settings are rebuilt
+                if data.get("signature") == self.signature:
+                    self.index = data.get("files", {})
+            except (OSError, ValueError) as e:
+                log.warning(f"Could not read rendition index, rebuilding it: {e}")
+
+    def cache_key(self, content_hash, mtime):
+        raw = f"{content_hash}:{mtime}:{self.signature}"
+        return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+    def ensure(self, name, content_hash=None):
+        """Make sure name has an up-to-date rendition (or is marked as not needing one)"""
+        source_path = os.path.join(self.source_folder, name)
+        try:
+            mtime = os.stat(source_path).st_mtime
+        except OSError:
+            self.forget(name)
+            return
+
+        key = self.cache_key(content_hash or name, mtime)
+        entry = self.index.get(name)
+        if entry and entry.get("key") == key:
+            if not entry["file"]:
+                return
+            if os.path.exists(os.path.join(self.folder, entry["file"])):
+                return
+
+        self.forget(name)
+        stem = os.path.splitext(name)[0]
+        filename = f"{stem}_{key}.{self.extension}"
+
+        if not self.render(source_path, os.path.join(self.folder, filename)):
+            filename = None
+        self.index[name] = {"file": filename, "key": key}
+        self.dirty = True
+        if filename:
+            self.restyled.add(name)
+
+    def render(self, source_path, target_path):
+        """
+        Write a scaled copy of source_path to target_path
+        Returns False when the original should be served instead
+        """
+        max_size = (self.settings["max_width"], self.settings["max_height"])
+        part_path = target_path + ".part"
+
+        # Decoding and writing photos competes with Blink captures for the SD card
+        scheduler.wait_turn(SYNC)
+        try:
+            with scheduler.transfer(SYNC), Image.open(source_path) as img:
+                # Keep animated GIFs as they are
+                if getattr(img, "is_animated", False):
+                    return False
+
+                # Nothing to gain for photos that already fit the screen
+                if img.width <= max_size[0] and img.height <= max_size[1]:
+                    return False
+
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail(max_size, Image.LANCZOS)
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+
+                img.save(part_path, format=self.settings["format"].upper(),
+                         quality=self.settings["quality"])
+
+            os.replace(part_path, target_path)
+            return True
+        except Exception as e:
+            log.warning(f"Could not create rendition for {os.path.basename(source_path)}: {e}")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return False
+
+    def forget(self, name):
+        """Drop name from the index and delete its rendition"""
+        entry = self.index.pop(name, None)
+        if entry:
+            self.dirty = True
+            if not entry["file"]:
+                return
+            self.restyled.add(name)
+            try:
+                os.remove(os.path.join(self.folder, entry["file"]))
+            except OSError:
+                pass
+
+    def files(self):
+        """(mtime, size, file name) of every rendition on disk"""
+        files = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name == INDEX_NAME or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.name))
+        return files
+
+    def restore(self, names, hashes, limit):
+        """
+        Render evicted photos among names again, at most limit of them, while
+        the cache has room for another rendition of average size.
+        Returns the number rendered.
+        """
+        evicted = [name for name in names if (self.index.get(name) or {}).get("evicted")]
+        if not evicted:
+            return 0
+
+        max_bytes = self.settings["max_cache_mb"] * 1024 * 1024
+        sizes = [size for mtime, size, filename in self.files()]
+        total = sum(sizes)
+        average = total / len(sizes) if sizes else 0
+        restored = 0
+        for name in evicted[:limit]:
+            if total + average > max_bytes:
+                break
+            del self.index[name]
+            self.ensure(name, hashes.get(name))
+            filename = (self.index.get(name) or {}).get("file")
+            if filename:
+                total += os.path.getsize(os.path.join(self.folder, filename))
+                restored += 1
+        return restored
+
+    def evict(self):
+        """Delete the oldest renditions until the cache fits max_cache_mb"""
+        max_bytes = self.settings["max_cache_mb"] * 1024 * 1024
+        files = self.files()
+        total = sum(size for mtime, size, filename in files)
+
+        if total <= max_bytes:
+            return 0
+
+        referenced = {entry["file"]: name for name, entry in self.index.items() if entry["file"]}
+        removed = 0
+        for mtime, size, filename in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.folder, filename))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            if filename in referenced:
+                # Serve the original until restore() finds room for it again
+                name = referenced[filename]
+                self.index[name] = {"file": None, "key": self.index[name]["key"], "evicted": True}
+                self.restyled.add(name)
+                self.dirty = True
+
+        return removed
+
+    def save(self):
+        if self.dirty:
+            write_json_atomic(self.index_path, {"signature": self.signature, "files": self.index})
+            self.dirty = False
+
+
+def update_renditions(config, local_names, changed, removed, hashes, source_folder=None, restyled=None):
+    """
+    Bring the rendition cache up to date after a sync.
+
+    local_names - image names currently in Pictures/
+    changed     - names added or modified by this sync (always processed)
+    removed     - names removed by this sync
+    hashes      - {name: content hash} for cache keys
+    source_folder - folder holding the originals (defaults to Pictures/)
+    restyled    - optional set that receives the names whose served file
+                  changed (new rendition, or back to the original)
+
+    Photos without a rendition yet are backfilled, up to max_per_run per call,
+    and evicted ones are rendered again while the cache has room. Returns the
+    number of photos still waiting for a first rendition.
+    """
+    settings = get_settings(config)
+    if not settings["enabled"]:
+        return 0
+    if Image is None:
+        log.warning("Pillow is not installed, serving original photos", extra=limited("no-pillow", 24 * 3600))
+        return 0
+
+    cache = RenditionCache(settings, source_folder)
+
+    for name in removed:
+        cache.forget(name)
+    for name in [n for n in cache.index if n not in local_names]:
+        cache.forget(name)
+
+    for name in changed:
+        cache.ensure(name, hashes.get(name))
+
+    # Photos that haven't been looked at yet
+    backlog = [n for n in local_names if n not in cache.index and n not in changed]
+    for name in backlog[:settings["max_per_run"]]:
+        cache.ensure(name, hashes.get(name))
+    cache.restore(sorted(local_names), hashes, max(0, settings["max_per_run"] - len(backlog)))
+
+    evicted = cache.evict()
+    cache.save()
+    if restyled is not None:
+        restyled.update(cache.restyled)
+
+    if evicted:
+        log.info(f"Evicted {evicted} old renditions")
+
+    return max(0, len(backlog) - settings["max_per_run"])
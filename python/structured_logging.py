@@ -0,0 +1,229 @@
+"""
+Logging for the background scripts (PictureVerseService.py, BlinkMonitor.py,
+Dropbox.py, CleanUpMedia.py, Blink.py).
+
+Records are written as JSON lines to logs/<name>.jsonl, rotated past
+MAX_LOG_BYTES, by a listener thread: logging calls only put the record on a
+queue (dropped if QUEUE_SIZE records are already waiting), so a slow SD card
+never holds up a motion capture.
+
+    {"time": "2024-01-01T12:00:00.123", "level": "INFO", "logger": "pictureverse.monitor",
+     "msg": "Motion detected: Garage", "camera": "Garage"}
+
+Fields passed with extra= are added to the record. Messages that repeat on
+every poll ("No motion on Garage") pass extra=limited(key) and are written
+at most once per RATE_LIMIT_INTERVAL seconds per key, with the number
+skipped in between as "suppressed".
+
+The console (stderr) gets plain text: everything when run from a terminal,
+only warnings and errors otherwise, so the >> redirects in the start scripts
+no longer grow without limit.
+
+The level starts at LOG_LEVEL, or the level written in LEVEL_FILE, and can
+be changed at runtime:
+
+    echo debug > python/log_level && kill -USR2 <pid>   # apply the file
+    kill -USR2 <pid>                                    # no file: toggle debug
+    echo '{"command": "log_level", "level": "debug"}' | nc -U python/.blink_monitor.sock
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+LOG_DIR = SCRIPT_DIR / "logs"
+LEVEL_FILE = SCRIPT_DIR / "log_level"
+
+ROOT_LOGGER = "pictureverse"
+LOG_LEVEL = "INFO"
+MAX_LOG_BYTES = 2 * 1024 * 1024
+LOG_BACKUPS = 3  # <name>.jsonl.1 ... .3
+QUEUE_SIZE = 10000
+RATE_LIMIT_INTERVAL = 300  # Seconds between repeats of a rate-limited message
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+_INTERNAL_FIELDS = {"rate_key", "rate_interval"}
+
+_listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for one part of PictureVerse (level set by setup_logging/set_level)"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def limited(key: str, interval: float = RATE_LIMIT_INTERVAL) -> dict:
+    """extra= for a message to log at most once per interval seconds per key"""
+    return {"rate_key": key, "rate_interval": interval}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                    + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key not in _INTERNAL_FIELDS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """The [WARNING]/[ERROR] style the scripts always printed"""
+
+    def format(self, record):
+        message = record.getMessage()
+        if record.levelno != logging.INFO:
+            message = f"[{record.levelname}] {message}"
+        if record.exc_text:
+            message += "\n" + record.exc_text
+        return message
+
+
+class RateLimitFilter(logging.Filter):
+    """Drops records with a rate_key seen less than rate_interval seconds ago"""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.last = {}  # key -> (time written, records suppressed since)
+
+    def filter(self, record):
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            return True
+
+        now = time.monotonic()
+        with self.lock:
+            written, suppressed = self.last.get(key, (None, 0))
+            if written is not None and now - written < record.rate_interval:
+                self.last[key] = (written, suppressed + 1)
+                return False
+            self.last[key] = (now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """
+        Make the record safe to hand to another thread, keeping the message
+        and the traceback (exc_text) apart for the JSON log
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+
+def read_level_file():
+    """Level named in LEVEL_FILE, or None"""
+    try:
+        name = LEVEL_FILE.read_text().strip().upper()
+    except OSError:
+        return None
+    return name if isinstance(logging.getLevelName(name), int) else None
+
+
+def set_level(level) -> str:
+    """Set the PictureVerse log level (name or number); returns the level name"""
+    if isinstance(level, str):
+        level = level.strip().upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level: {level}")
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    name = logging.getLevelName(logger.level)
+    logger.info(f"Log level set to {name}")
+    return name
+
+
+def _on_level_signal(signum, frame):
+    """SIGUSR2: apply LEVEL_FILE, or toggle between DEBUG and LOG_LEVEL"""
+    level = read_level_file()
+    if level is None:
+        current = logging.getLogger(ROOT_LOGGER).level
+        level = LOG_LEVEL if current == logging.DEBUG else "DEBUG"
+    set_level(level)
+
+
+def setup_logging(name: str) -> Path:
+    """
+    Send PictureVerse logging to logs/<name>.jsonl and the console for the
+    rest of the process; call once from a script's main. Returns the log path.
+    """
+    global _listener
+    if _listener:
+        return Path(_listener.handlers[0].baseFilename)
+
+    LOG_DIR.mkdir(exist_ok=True)
+    log_file = LOG_DIR / f"{name}.jsonl"
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(ConsoleFormatter())
+    if not sys.stderr.isatty():
+        console_handler.setLevel(logging.WARNING)
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+
+    # Other libraries (blinkpy, aiohttp, dropbox) only get their warnings through
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(logging.WARNING)
+    logging.getLogger(ROOT_LOGGER).setLevel(read_level_file() or LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    if hasattr(signal, "SIGUSR2") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR2, _on_level_signal)
+
+    return log_file
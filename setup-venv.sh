@@ -33,7 +33,7 @@ fi
 # Activate the virtual environment and install dependencies
 echo "Installing Python dependencies..."
 python/venv/bin/pip install --upgrade pip
-python/venv/bin/pip install dropbox blinkpy aiohttp
+python/venv/bin/pip install dropbox blinkpy aiohttp pillow schedule
 
 echo "Setup complete!"
 echo "You can now use 'npm run setup-blink' to configure Blink cameras"